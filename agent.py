@@ -1,74 +1,793 @@
 import sqlite3
 import logging
 import os
+import base64
+import bisect
+import contextvars
+import csv
+import functools
+import json
+import re
+import sys
+import threading
+import copy
+import hashlib
+import ipaddress
+import queue
+import random
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
 from uuid import uuid4
-from typing import Callable, List, Dict, Any, Optional
-from dotenv import load_dotenv
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Iterable, Iterator, List, Dict, Any, Optional, Sequence, Tuple, Union
 
-#Genai libraries
-from google.genai import types
+# Reports live in reporting.py (standard library only). Imported relatively when
+# this directory is loaded as a package (as `adk web` does), directly otherwise.
+try:
+    from . import reporting
+except ImportError:
+    import reporting
 
-#ADK libraries
-from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
-from google.adk.sessions import InMemorySessionService
-from google.adk.sessions import Session
-from google.adk.runners import Runner
-from google.adk.apps.app import App
+# The ADK and genai stacks are slow to import, so they are only imported where
+# they are used: importing this module must stay cheap and free of side effects
+# (no model, runner or database is created until first use).
+if TYPE_CHECKING:
+    from google.adk.agents import LlmAgent
+    from google.adk.agents.readonly_context import ReadonlyContext
+    from google.adk.models.base_llm import BaseLlm
+    from google.adk.runners import Runner
+    from google.adk.sessions import BaseSessionService, Session
+    from google.adk.tools import ToolContext
+
+APP_NAME = "default"  # Application
+USER_ID = "default"  # User
+SESSION = "default"  # Session
+
+MODEL_NAME = "gemini-2.5-flash-lite"
+# "gemini" calls the Gemini API; "local" uses the offline LocalModel (no network, deterministic).
+MODEL_BACKEND = os.getenv("TIMESHEET_MODEL_BACKEND", "gemini")
 
 # --- Logging Configuration ---
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler() # Log to console
-    ]
-)
+# Messages use %-style arguments, so a record is only formatted if it passes the
+# level checks. Records are written by a background thread. The calling thread
+# only applies sampling, renders the message and puts the record on a queue.
+# JSON encoding, tracebacks and console I/O happen on the writer thread, in
+# batches. Nothing is configured on import. The entry point calls
+# configure_logging().
 
-# Load environment variables
-load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+LOG_LEVEL = os.getenv("TIMESHEET_LOG_LEVEL", "INFO")  # Root level
+LOG_LEVELS = os.getenv("TIMESHEET_LOG_LEVELS", "")  # Per-logger levels, e.g. "timesheet.tools=WARNING,google_adk=ERROR"
+LOG_SAMPLE = os.getenv("TIMESHEET_LOG_SAMPLE", "")  # Share of DEBUG/INFO records kept per logger, e.g. "timesheet.tools=0.05"
+LOG_FORMAT = os.getenv("TIMESHEET_LOG_FORMAT", "json")  # "json" (one object per line) or "text"
+LOG_QUEUE_SIZE = 10_000  # Records waiting for the writer thread; further records are dropped and counted
+LOG_FLUSH_INTERVAL_MS = float(os.getenv("TIMESHEET_LOG_FLUSH_MS", "50"))  # How long the writer collects records before writing them
 
-# Get API keys from environment variables
-GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
+LOG = logging.getLogger("timesheet")
+TOOL_LOG = logging.getLogger("timesheet.tools")  # Two records per tool call: the high-volume logger
+DB_LOG = logging.getLogger("timesheet.db")
+MODEL_LOG = logging.getLogger("timesheet.model")
+HTTP_LOG = logging.getLogger("timesheet.http")
 
-# Set the Gemini API key in the environment
-os.environ["GOOGLE_API_KEY"] = GEMINI_API_KEY
+_LOG_WRITER: Optional["LogWriter"] = None
+# Updated by every logging thread and by the writer thread, so only under _LOG_COUNTERS_LOCK (see _count_log).
+_LOG_COUNTERS = {"written": 0, "dropped": 0, "sampled_out": 0}
+_LOG_COUNTERS_LOCK = threading.Lock()
+# The logging module's record-collection settings from before configure_logging changed them, for stop_logging.
+_LOG_RECORD_SETTINGS: Optional[Dict[str, Any]] = None
+# Attributes every LogRecord has; any others were passed with `extra=` and are written as fields.
+_LOG_RECORD_FIELDS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
 
-APP_NAME = "default"  # Application
-USER_ID = "default"  # User
-SESSION = "default"  # Session
 
-MODEL_NAME = "gemini-2.5-flash-lite"
+def _count_log(counter: str, records: int = 1) -> None:
+    with _LOG_COUNTERS_LOCK:
+        _LOG_COUNTERS[counter] += records
+
+
+def parse_log_settings(spec: str, convert: Callable[[str], Any]) -> Dict[str, Any]:
+    """Parses 'logger=value,logger=value' into {logger: convert(value)}. 'root' names the root logger."""
+    settings = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, separator, value = item.partition("=")
+        if not separator:
+            raise ValueError(f"Expected 'logger=value', got '{item}'.")
+        settings["" if name.strip() == "root" else name.strip()] = convert(value.strip())
+    return settings
+
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, any `extra=` fields and the traceback."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+                 "level": record.levelname, "logger": record.name, "message": record.getMessage()}
+        entry.update((key, value) for key, value in vars(record).items() if key not in _LOG_RECORD_FIELDS)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        if record.stack_info:
+            entry["stack_info"] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+class QueueLogHandler(logging.Handler):
+    """Samples records and hands them to a LogWriter's queue; never blocks, and drops records when the queue is full.
+
+    `sample` maps logger names to the share of their DEBUG and INFO records to keep.
+    A name also covers its child loggers, and the longest matching name applies.
+    Sampling is deterministic: a share of 0.1 keeps every tenth record.
+    Warnings and errors are always kept. The per-rule counters are updated under
+    the handler's lock, which `Handler.handle` already holds around `emit`.
+    """
+
+    def __init__(self, writer: "LogWriter", sample: Optional[Dict[str, float]] = None, max_queued: int = LOG_QUEUE_SIZE):
+        super().__init__()
+        self.writer = writer
+        self.max_queued = max_queued
+        self.sample = sorted(([name, rate, 0.0] for name, rate in (sample or {}).items()), key=lambda rule: -len(rule[0]))
+
+    def _keep(self, record: logging.LogRecord) -> bool:
+        for rule in self.sample:
+            name = rule[0]
+            if not name or record.name == name or record.name.startswith(name + "."):
+                with self.lock:  # Re-entrant: a no-op wait when called from handle()
+                    rule[2] += rule[1]
+                    if rule[2] < 1:
+                        return False
+                    rule[2] -= 1
+                    return True
+        return True
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.levelno < logging.WARNING and self.sample and not self._keep(record):
+            _count_log("sampled_out")
+            return
+        if self.writer.queue.qsize() >= self.max_queued:
+            _count_log("dropped")
+            return
+        try:
+            # Render the message now, as its arguments may change once the call returns. Everything else is
+            # left to the writer thread.
+            record.msg, record.args = record.getMessage(), None
+            self.writer.queue.put(record)
+        except Exception:
+            self.handleError(record)
+
+
+class LogWriter:
+    """
+    Formats and writes queued log records on a background thread, a batch at a time.
+
+    The thread wakes on the first queued record and waits `flush_interval_ms`
+    for more. It then formats the whole batch, writes it and flushes once. A
+    burst of records therefore costs the threads that log one wake-up, not one
+    per record.
+    """
+
+    def __init__(self, stream=None, formatter: Optional[logging.Formatter] = None,
+                 flush_interval_ms: float = LOG_FLUSH_INTERVAL_MS):
+        self.stream = stream if stream is not None else sys.stderr
+        self.formatter = formatter or JsonLogFormatter()
+        self.flush_interval = flush_interval_ms / 1000
+        self.queue: "queue.SimpleQueue[Optional[logging.LogRecord]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="timesheet-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Writes the records already queued, then stops the thread."""
+        self.queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            if batch[0] is not None:
+                time.sleep(self.flush_interval)
+                while True:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+            stop = None in batch
+            self._write([record for record in batch if record is not None])
+            if stop:
+                return
+
+    def _write(self, batch: List[logging.LogRecord]) -> None:
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.formatter.format(record))
+            except Exception as e:
+                lines.append(f"{record.levelname} {record.name}: {record.msg!r} (could not be formatted: {e})")
+        if not lines:
+            return
+        try:
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+            _count_log("written", len(lines))
+        except (OSError, ValueError):
+            _count_log("dropped", len(lines))  # The stream is closed or broken
+
+
+def configure_logging(level: str = LOG_LEVEL, levels: str = LOG_LEVELS, sample: str = LOG_SAMPLE,
+                      fmt: str = LOG_FORMAT, stream=None) -> None:
+    """Routes all logging through a LogWriter that writes to `stream` (stderr by default).
+
+    Called by the entry point, never on import. Calling it again replaces the previous set-up.
+    Queued records are written out at exit.
+
+    It also turns off the logging module's collection of the caller's file and
+    line, thread and process for every record (`logging._srcfile`,
+    `logThreads`, `logProcesses`, `logMultiprocessing`). These are process-wide,
+    so they affect handlers added by other code too; stop_logging restores them.
+    """
+    global _LOG_WRITER, _LOG_RECORD_SETTINGS
+    import atexit
+
+    if fmt not in ("json", "text"):
+        raise ValueError(f"Unknown log format '{fmt}'. Must be 'json' or 'text'.")
+    per_logger = parse_log_settings(levels, str.upper)
+    rates = parse_log_settings(sample, float)
+    stop_logging()
+    # Neither format shows the caller's file and line, thread or process, so records skip collecting them
+    # (the knobs from the "Optimization" section of the logging HOWTO).
+    _LOG_RECORD_SETTINGS = {name: getattr(logging, name)
+                            for name in ("_srcfile", "logThreads", "logProcesses", "logMultiprocessing")}
+    logging._srcfile = None
+    logging.logThreads = logging.logProcesses = logging.logMultiprocessing = False
+    formatter = JsonLogFormatter() if fmt == "json" else logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+    _LOG_WRITER = LogWriter(stream, formatter)
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueLogHandler(_LOG_WRITER, rates))
+    root.setLevel(level.upper())
+    for name, logger_level in per_logger.items():
+        logging.getLogger(name).setLevel(logger_level)
+    atexit.register(stop_logging)  # Harmless if registered twice: stopping is idempotent
+
+
+def stop_logging() -> None:
+    """
+    Writes out the queued records and stops the writer thread, if it is running.
+
+    Restores the record-collection settings that configure_logging turned off.
+    """
+    global _LOG_WRITER, _LOG_RECORD_SETTINGS
+    if _LOG_WRITER is not None:
+        _LOG_WRITER.stop()
+        _LOG_WRITER = None
+    if _LOG_RECORD_SETTINGS is not None:
+        for name, value in _LOG_RECORD_SETTINGS.items():
+            setattr(logging, name, value)
+        _LOG_RECORD_SETTINGS = None
+
+
+def logging_stats() -> Dict[str, int]:
+    """Records written, dropped and sampled out since start-up, and records still queued."""
+    with _LOG_COUNTERS_LOCK:
+        counters = dict(_LOG_COUNTERS)
+    return {**counters, "queued": _LOG_WRITER.queue.qsize() if _LOG_WRITER is not None else 0}
+
+# --- Instrumentation ---
+# Optional timing of the hot path: agent turns, model calls, tool invocations and,
+# if asked for, SQL statements. Each is recorded as a span. Spans feed latency
+# histograms, exported in Prometheus text format (over HTTP and/or to a file).
+# Spans inside a turn are also collected into a per-turn trace, which can be
+# appended to a JSONL file. When the layer is off, spans are a shared no-op,
+# connections are plain sqlite3 connections and no model callbacks are
+# registered. A tool call runs a few statements of tens of microseconds each, so
+# a span per statement costs more than the statements it would explain; SQL
+# spans are therefore off unless TIMESHEET_INSTRUMENT_SQL=1.
+
+METRICS_PORT = int(os.getenv("TIMESHEET_METRICS_PORT", "0"))  # Serves /metrics on this port when set
+METRICS_FILE = os.getenv("TIMESHEET_METRICS_FILE")  # Prometheus text file, rewritten after every turn
+TRACE_FILE = os.getenv("TIMESHEET_TRACE_FILE")  # Appends one JSON line per turn with all of its spans
+INSTRUMENTATION_ENABLED = os.getenv("TIMESHEET_INSTRUMENTATION") == "1" or bool(METRICS_PORT or METRICS_FILE or TRACE_FILE)
+INSTRUMENT_SQL = INSTRUMENTATION_ENABLED and os.getenv("TIMESHEET_INSTRUMENT_SQL") == "1"  # A span per SQL statement
+TRACE_SPAN_LIMIT = 1000  # Spans kept per turn trace; further spans are only counted
+# Histogram bucket upper bounds, in seconds for timings and in items for argument cardinality.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CARDINALITY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_METRICS: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[Any]] = {}  # (name, labels) -> [bucket counts, sum, count]
+_METRICS_LOCK = threading.Lock()
+_METRIC_HELP = {
+    "timesheet_turn_seconds": "Duration of a turn, by path (agent or fast_path).",
+    "timesheet_first_token_seconds": "Time from the start of a turn to the first reply text, by path.",
+    "timesheet_model_call_seconds": "Duration of a model call, from request to final response.",
+    "timesheet_model_first_response_seconds": "Time from a model request to its first (possibly partial) response.",
+    "timesheet_tool_seconds": "Duration of a tool invocation, by tool and result status.",
+    "timesheet_tool_items": "Cardinality of a tool invocation's arguments (list lengths, page size).",
+    "timesheet_sql_seconds": "Duration of a SQL statement up to its first row, by statement kind and table.",
+    "timesheet_write_batch_size": "Writes committed together by the group-commit writer.",
+    "timesheet_write_wait_seconds": "Time from queuing a write to its batch being committed.",
+    "timesheet_model_queue_wait_seconds": "Time a model call waited in the scheduler's queue, per attempt.",
+    "timesheet_model_retries": "Retries the model-call scheduler made for one call.",
+}
+_CURRENT_TRACE: "contextvars.ContextVar[Optional[Dict[str, Any]]]" = contextvars.ContextVar("timesheet_trace", default=None)
+_MODEL_CALLS: Dict[str, List[Any]] = {}  # invocation ID -> [start, first response seen]
+_METRICS_SERVER = None
+
+def observe(name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS, **labels: str) -> None:
+    """Adds one observation to the histogram `name` with `labels`."""
+    key = (name, tuple(sorted(labels.items())))
+    with _METRICS_LOCK:
+        histogram = _METRICS.get(key)
+        if histogram is None:
+            histogram = _METRICS[key] = [[0] * len(buckets), 0.0, 0, tuple(buckets)]
+        index = bisect.bisect_left(buckets, value)  # The first bound >= value
+        if index < len(buckets):
+            histogram[0][index] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+class Span:
+    """A timed operation. Entering starts the clock; leaving records it in its histogram and the current trace."""
+
+    __slots__ = ("name", "metric", "labels", "attrs", "start")
+
+    def __init__(self, name: str, metric: str, labels: Dict[str, str], attrs: Dict[str, Any]):
+        self.name, self.metric, self.labels, self.attrs = name, metric, labels, attrs
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        elapsed = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.labels["status"] = "exception"
+        observe(self.metric, elapsed, **self.labels)
+        if _CURRENT_TRACE.get() is not None:  # The span's fields are only copied for a trace
+            record_span(self.name, self.start, elapsed, {**self.labels, **self.attrs})
+
+class _NoSpan:
+    """The span handed out while instrumentation is off."""
+
+    __slots__ = ()
+    labels: Dict[str, str] = {}
+    attrs: Dict[str, Any] = {}
+
+    def __enter__(self) -> "_NoSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+_NO_SPAN = _NoSpan()
+
+def span(name: str, metric: str, attrs: Optional[Dict[str, Any]] = None, **labels: str) -> Any:
+    """Returns a context manager timing `name` into the histogram `metric`; a no-op while instrumentation is off."""
+    if not INSTRUMENTATION_ENABLED:
+        return _NO_SPAN
+    return Span(name, metric, labels, attrs if attrs is not None else {})
+
+def record_span(name: str, start: float, seconds: float, attrs: Dict[str, Any]) -> None:
+    """Adds a finished span to the trace of the current turn, if there is one."""
+    trace = _CURRENT_TRACE.get()
+    if trace is None:
+        return
+    if len(trace["spans"]) >= TRACE_SPAN_LIMIT:
+        trace["dropped_spans"] += 1
+        return
+    trace["spans"].append({"name": name, "start_ms": round((start - trace["start"]) * 1000, 3),
+                           "ms": round(seconds * 1000, 3), **attrs})
+
+def start_trace(user_id: str, query: str) -> Optional[Tuple["contextvars.Token", Dict[str, Any]]]:
+    """Starts collecting the spans of a turn in the current context. Returns the handle for finish_trace."""
+    if not INSTRUMENTATION_ENABLED:
+        return None
+    trace = {"user_id": user_id, "query": query, "time": datetime.now().isoformat(timespec="seconds"),
+             "start": time.perf_counter(), "spans": [], "dropped_spans": 0}
+    return _CURRENT_TRACE.set(trace), trace
+
+def finish_trace(handle: Optional[Tuple["contextvars.Token", Dict[str, Any]]], path: str) -> None:
+    """Ends the turn started by start_trace: records its duration, then writes the trace and metrics files if configured."""
+    if handle is None:
+        return
+    token, trace = handle
+    try:
+        _CURRENT_TRACE.reset(token)
+    except ValueError:
+        pass  # A streamed turn abandoned by its consumer may be closed from another context.
+    elapsed = time.perf_counter() - trace.pop("start")
+    observe("timesheet_turn_seconds", elapsed, path=path)
+    if TRACE_FILE:
+        trace.update(path=path, ms=round(elapsed * 1000, 3))
+        with open(TRACE_FILE, "a") as f:
+            f.write(json.dumps(trace, default=str) + "\n")
+    if METRICS_FILE:
+        write_metrics_file(METRICS_FILE)
+
+def instrumented_tool(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Times every call of a tool function, recording its arguments' cardinality and result status."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not INSTRUMENTATION_ENABLED:
+            return func(*args, **kwargs)
+        items = {name: len(value) for name, value in kwargs.items() if isinstance(value, (list, tuple, dict))}
+        if isinstance(kwargs.get('page_size'), int):
+            items['page_size'] = kwargs['page_size']
+        observe("timesheet_tool_items", sum(items.values()) or 1, CARDINALITY_BUCKETS, tool=func.__name__)
+        with span(func.__name__, "timesheet_tool_seconds", attrs=items, tool=func.__name__) as timer:
+            result = func(*args, **kwargs)
+            timer.labels["status"] = str(result.get("status", "unknown")) if isinstance(result, dict) else "unknown"
+            return result
+    return wrapper
+
+def before_model_call(callback_context: Any, llm_request: Any) -> None:
+    """Agent callback: notes when a model request is sent."""
+    _MODEL_CALLS[callback_context.invocation_id] = [time.perf_counter(), False]
+    return None
+
+def after_model_call(callback_context: Any, llm_response: Any) -> None:
+    """Agent callback, run for every (partial or final) response: records time to first response and call duration."""
+    call = _MODEL_CALLS.get(callback_context.invocation_id)
+    if call is None:
+        return None
+    now = time.perf_counter()
+    if not call[1]:
+        call[1] = True
+        observe("timesheet_model_first_response_seconds", now - call[0], model=MODEL_BACKEND)
+    if not llm_response.partial:
+        del _MODEL_CALLS[callback_context.invocation_id]
+        observe("timesheet_model_call_seconds", now - call[0], model=MODEL_BACKEND)
+        usage = llm_response.usage_metadata
+        record_span("model_call", call[0], now - call[0], {
+            "model": MODEL_BACKEND,
+            "prompt_tokens": usage.prompt_token_count if usage else None,
+            "function_calls": [part.function_call.name for part in (llm_response.content.parts or [])
+                               if part.function_call] if llm_response.content else [],
+        })
+    return None
+
+def model_call_failed(callback_context: Any, llm_request: Any, error: Exception) -> None:
+    """Agent callback: records a failed model call."""
+    call = _MODEL_CALLS.pop(callback_context.invocation_id, None)
+    if call is not None:
+        observe("timesheet_model_call_seconds", time.perf_counter() - call[0], model=MODEL_BACKEND, status="error")
+    return None
+
+def model_callbacks() -> Dict[str, Callable[..., Any]]:
+    """Returns the LlmAgent callback arguments that time model calls, or none while instrumentation is off."""
+    if not INSTRUMENTATION_ENABLED:
+        return {}
+    return {"before_model_callback": before_model_call, "after_model_callback": after_model_call,
+            "on_model_error_callback": model_call_failed}
+
+@functools.lru_cache(maxsize=1024)
+def sql_kind(sql: str) -> str:
+    """Labels a statement by its verb and main table, e.g. 'SELECT timesheets'. Schema statements get the verb only."""
+    words = _SQL_COMMENTS.sub(" ", sql).split(None, 1)
+    verb = words[0].upper() if words else ""
+    target = None
+    if len(words) > 1 and verb in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+        target = (_SQL_FIRST_WORD if verb == "UPDATE" else _SQL_TARGET).search(words[1])
+    return f"{verb} {target.group(1)}" if target else verb
+
+_SQL_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_SQL_TARGET = re.compile(r"\b(?:FROM|INTO)\s+(\w+)", re.IGNORECASE)
+_SQL_FIRST_WORD = re.compile(r"(\w+)")
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times each statement (up to its first row) as a span."""
+
+    def execute(self, sql, parameters=()):
+        with span("sql", "timesheet_sql_seconds", statement=sql_kind(sql)):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        with span("sql", "timesheet_sql_seconds", statement=sql_kind(sql)):
+            return super().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        with span("sql", "timesheet_sql_seconds", statement="SCRIPT"):
+            return super().executescript(sql_script)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose statements, including the Connection.execute shortcuts, run on an InstrumentedCursor."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+def metrics_text() -> str:
+    """Returns all histograms in the Prometheus text exposition format."""
+    with _METRICS_LOCK:
+        snapshot = [(name, labels, list(h[0]), h[1], h[2], h[3]) for (name, labels), h in sorted(_METRICS.items())]
+    lines, described = [], set()
+    for name, labels, counts, total, count, buckets in snapshot:
+        if name not in described:
+            described.add(name)
+            lines += [f"# HELP {name} {_METRIC_HELP.get(name, name)}", f"# TYPE {name} histogram"]
+        label_text = ",".join(f'{key}="{value}"' for key, value in labels)
+        prefix = label_text + "," if label_text else ""
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {count}')
+        lines.append(f"{name}_sum{{{label_text}}} {total:.6f}" if label_text else f"{name}_sum {total:.6f}")
+        lines.append(f"{name}_count{{{label_text}}} {count}" if label_text else f"{name}_count {count}")
+    return "\n".join(lines) + "\n"
+
+def write_metrics_file(path: str) -> None:
+    """Writes metrics_text() to `path` atomically, for node_exporter's textfile collector or similar."""
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        f.write(metrics_text())
+    os.replace(temporary, path)
+
+def start_metrics_server(port: int = METRICS_PORT) -> Any:
+    """Serves metrics_text() at http://localhost:<port>/metrics from a daemon thread. Returns the server."""
+    global _METRICS_SERVER
+    if _METRICS_SERVER is not None:
+        return _METRICS_SERVER
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    _METRICS_SERVER = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    threading.Thread(target=_METRICS_SERVER.serve_forever, name="timesheet-metrics", daemon=True).start()
+    LOG.info("Serving metrics at http://127.0.0.1:%s/metrics", _METRICS_SERVER.server_port)
+    return _METRICS_SERVER
+
+def reset_metrics() -> None:
+    """Clears all histograms."""
+    with _METRICS_LOCK:
+        _METRICS.clear()
 
 # Define helper functions
+def event_text(event: Any) -> str:
+    """Returns the text an event shows the user: all of its text parts, without model thoughts."""
+    if not event.content or not event.content.parts:
+        return ""
+    return "".join(part.text for part in event.content.parts if part.text and part.text != "None" and not part.thought)
+
+async def stream_turn(
+    runner_instance: "Runner",
+    user_id: str,
+    session: "Session",
+    user_query: str,
+) -> AsyncIterator[str]:
+    """
+    Runs a single query in a session and yields the reply text as it is produced.
+
+    Unambiguous commands are answered by the local intent fast path in one piece,
+    without a model call. Everything else goes to the agent, which streams with
+    SSE: each partial model response is yielded as soon as it arrives, and the
+    final aggregated response is skipped because its text was already yielded.
+    """
+    from google.genai import types
+    from google.adk.agents.run_config import RunConfig, StreamingMode
+
+    start = time.perf_counter()
+    trace = start_trace(user_id, user_query)
+    # Model calls of this turn queue under its session (see ModelScheduler). The
+    # key is reset on exit, so it does not outlive the turn in the caller's context.
+    queue_key_token = _MODEL_QUEUE_KEY.set(f"{user_id}/{session.id}")
+    path = "agent"
+    first_chunk = True
+    try:
+        if FAST_PATH_ENABLED:
+            reply = await run_fast_path(runner_instance, user_id, session, user_query)
+            if reply is not None:
+                path = "fast_path"
+                if INSTRUMENTATION_ENABLED:
+                    observe("timesheet_first_token_seconds", time.perf_counter() - start, path=path)
+                yield reply
+                return
+
+        query_content = types.Content(role="user", parts=[types.Part(text=user_query)])
+        streamed = False  # Whether the current model response already arrived in partial chunks
+        async for event in runner_instance.run_async(
+            user_id=user_id, session_id=session.id, new_message=query_content,
+            run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+        ):
+            text = event_text(event)
+            if event.partial:
+                streamed = True
+            elif streamed:
+                streamed, text = False, ""
+            if text:
+                if first_chunk and INSTRUMENTATION_ENABLED:
+                    observe("timesheet_first_token_seconds", time.perf_counter() - start, path=path)
+                first_chunk = False
+                yield text
+        record_agent_turn(time.perf_counter() - start)
+    finally:
+        try:
+            _MODEL_QUEUE_KEY.reset(queue_key_token)
+        except ValueError:
+            pass  # A streamed turn abandoned by its consumer may be closed from another context.
+        finish_trace(trace, path)
+
 async def run_session( # type: ignore
-    runner_instance: Runner,
+    runner_instance: "Runner",
     user_id: str,
-    session: Session,
+    session: "Session",
     user_query: str,
 ):
-    """Runs a single query in a session and streams the response."""
-    query_content = types.Content(role="user", parts=[types.Part(text=user_query)])
-
+    """Runs a single query in a session and prints the response as it streams in (see stream_turn)."""
     print(f"\n🤖 AGENT: ", end="", flush=True)
-    async for event in runner_instance.run_async(
-        user_id=user_id, session_id=session.id, new_message=query_content
-    ):
-        if event.content and event.content.parts:
-            text_part = event.content.parts[0].text
-            if text_part and text_part != "None":
-                print(text_part, end="", flush=True)
+    async for chunk in stream_turn(runner_instance, user_id, session, user_query):
+        print(chunk, end="", flush=True)
     print()  # For the newline after the streamed response
 
-print("✅ Helper functions defined.")
+# --- Local Intent Fast Path ---
+# The commonly typed commands ("view status", "submit 7.5 hours for Project X",
+# "review approvals", "approve ts-12") name their tool unambiguously. They are
+# parsed locally and dispatched straight to the tool, with the reply rendered
+# from a template, saving one or two model round-trips. The tools run their own
+# role checks. Anything the parser is not sure about goes to the agent.
+
+FAST_PATH_ENABLED = os.getenv("TIMESHEET_FAST_PATH", "1") != "0"
+FAST_PATH_LIST_LIMIT = 10  # Pending sheets or recent submissions listed in a fast-path reply
 
-retry_config = types.HttpRetryOptions(
-    attempts=5,  # Maximum retry attempts
-    exp_base=7,  # Delay multiplier
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504],  # Retry on these HTTP errors
+_FAST_STATUS = re.compile(r"(?:view|show|check|see|get)?\s*(?:my\s+)?(?:status|dashboard|summary|timesheet status)")
+_FAST_REVIEW = re.compile(r"(?:review|show|list|view|see|check|get)?\s*(?:my\s+)?(?:pending\s+)?(approvals|pending timesheets|pending)")
+_FAST_SUBMIT = re.compile(
+    r"(?:submit|log|add|record)\s+(\d+(?:\.\d+)?)\s*(?:h|hrs?|hours?)(?:\s+(?:for|on|working on)\s+(.+?))?",
+    re.IGNORECASE,  # Matched against the text as typed, so the task keeps its case
 )
+_FAST_DECIDE = re.compile(r"(approve|reject)\s+(?:timesheet\s+)?([\w-]*\d[\w-]*)")  # IDs contain a digit
+# Words that make a submission ambiguous (other dates, several entries): left to the agent.
+_FAST_SUBMIT_AMBIGUOUS = re.compile(
+    r"\b(yesterday|today|tomorrow|last|next|(?:mon|tues?|wed(?:nes)?|thu(?:rs)?|fri|sat(?:ur)?|sun)(?:day)?"
+    r"|each|every|and|per|daily|weekly|week|\d{4}-\d{2}-\d{2})\b"
+)
+
+_FAST_PATH_STATS = {"turns": 0, "hits": 0, "fast_seconds": 0.0, "agent_turns": 0, "agent_seconds": 0.0, "saved_seconds": 0.0}
+_FAST_PATH_LOCK = threading.Lock()
+
+def parse_fast_intent(text: str, user_id: str, role: str = 'Employee') -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    Returns the (tool name, arguments) a command unambiguously asks for, or None.
+
+    Only whole-command matches count: extra words, other dates or several
+    entries make the command ambiguous. `role` is the user's 'user:role': for
+    anyone but a Manager, "pending" means their own pending sheets, and
+    "approvals" is left to the agent.
+    """
+    command = " ".join(text.lower().strip().rstrip(".!?").split())
+    if _FAST_STATUS.fullmatch(command):
+        return "tool_view_queries", {"user_id": user_id}
+    match = _FAST_REVIEW.fullmatch(command)
+    if match:
+        if role == 'Manager':
+            return "tool_manager_approval", {"manager_id": user_id}
+        return ("tool_view_queries", {"user_id": user_id}) if match.group(1) != "approvals" else None
+    match = _FAST_SUBMIT.fullmatch(" ".join(text.strip().rstrip(".!?").split()))
+    if match and not _FAST_SUBMIT_AMBIGUOUS.search(command):
+        args: Dict[str, Any] = {"user_id": user_id, "hours": float(match.group(1))}
+        if match.group(2):
+            args["task"] = match.group(2)
+        return "tool_submit_timesheet", args
+    match = _FAST_DECIDE.fullmatch(command)
+    if match:
+        original_id = " ".join(text.strip().rstrip(".!?").split()).split()[-1]
+        new_status = 'Approved' if match.group(1) == 'approve' else 'Rejected'
+        return "tool_update_timesheet_status", {"manager_id": user_id, "timesheet_id": original_id, "new_status": new_status}
+    return None
+
+def render_tool_result(tool_name: str, response: Dict[str, Any]) -> str:
+    """Renders a tool response as the reply text shown to the user."""
+    if response.get('status') == 'error':
+        return f"Sorry, that did not work: {response.get('error_message')}"
+    if tool_name == 'tool_view_queries':
+        lines = [f"You have {response.get('pending_count')} pending timesheets and {response.get('monthly_hours')} "
+                 f"approved hours in the last 30 days. Your manager is {response.get('manager_name')}."]
+        recent = response.get('recent_submissions')
+        if recent is None:  # Compact encoding: rows of [date, hours, status, task]
+            recent = [dict(zip(('date', 'hours', 'status', 'task'), row)) for row in response.get('recent') or []]
+        for sheet in recent[:FAST_PATH_LIST_LIMIT]:
+            lines.append(f"  - {sheet.get('date')}: {sheet.get('hours')}h, {sheet.get('status')} ({sheet.get('task')})")
+        return "\n".join(lines)
+    if tool_name == 'tool_manager_approval':
+        sheets = response.get('pending_sheets')
+        if sheets is None:  # Compact encoding: sheets grouped by employee, rows of [ref, date, hours, task]
+            sheets = [{'id': row[0], 'employee_name': group['employee'], 'date': row[1], 'hours': row[2], 'task': row[3]}
+                      for group in response.get('by_employee') or [] for row in group['sheets']]
+        total = response.get('total_pending', len(sheets))
+        if not total:
+            return "There are no timesheets awaiting your approval."
+        lines = [f"There are {total} timesheets awaiting your approval:"]
+        for sheet in sheets[:FAST_PATH_LIST_LIMIT]:
+            lines.append(f"  - {sheet.get('id')}: {sheet.get('employee_name', sheet.get('employeeId'))}, "
+                         f"{sheet.get('date')}, {sheet.get('hours')}h ({sheet.get('task')})")
+        if total > len(lines) - 1:
+            lines.append(f"  ... and {total - (len(lines) - 1)} more.")
+        return "\n".join(lines)
+    return response.get('message') or json.dumps(response, sort_keys=True, default=str)
+
+async def run_fast_path(runner_instance: "Runner", user_id: str, session: "Session", user_query: str) -> Optional[str]:
+    """
+    Answers `user_query` without the model if parse_fast_intent recognises it; returns None otherwise.
+
+    The command and the reply are appended to the session as ordinary events, so
+    later agent turns still see them in the conversation history.
+    """
+    start = time.perf_counter()
+    # The caller's session object may predate earlier agent turns or a role change; read the stored one.
+    session = await runner_instance.session_service.get_session(
+        app_name=session.app_name, user_id=session.user_id, session_id=session.id
+    ) or session
+    intent = parse_fast_intent(user_query, user_id, session.state.get('user:role', 'Employee'))
+    if intent is None:
+        with _FAST_PATH_LOCK:
+            _FAST_PATH_STATS["turns"] += 1
+        return None
+    tool_name, args = intent
+    if 'timesheet_id' in args:
+        # The agent may have shown this sheet by its session reference (see compact_tool_result).
+        refs = session.state.get(TIMESHEET_REFS_KEY) or {}
+        args['timesheet_id'] = refs.get(args['timesheet_id'].lower(), args['timesheet_id'])
+    LOG.info("Fast path: '%s' -> %s(%s)", user_query, tool_name, args)
+    response = await FAST_PATH_TOOLS[tool_name](**args)
+    reply = render_tool_result(tool_name, response)
+
+    from google.adk.events import Event
+    from google.genai import types
+
+    invocation_id = f"fast-{uuid4()}"
+    for author, role, text in (("user", "user", user_query), (runner_instance.agent.name, "model", reply)):
+        event = Event(invocation_id=invocation_id, author=author,
+                      content=types.Content(role=role, parts=[types.Part(text=text)]))
+        await runner_instance.session_service.append_event(session, event)
+
+    elapsed = time.perf_counter() - start
+    with _FAST_PATH_LOCK:
+        _FAST_PATH_STATS["turns"] += 1
+        _FAST_PATH_STATS["hits"] += 1
+        _FAST_PATH_STATS["fast_seconds"] += elapsed
+        if _FAST_PATH_STATS["agent_turns"]:
+            # Saved time is estimated against the average agent turn seen so far.
+            average_agent = _FAST_PATH_STATS["agent_seconds"] / _FAST_PATH_STATS["agent_turns"]
+            _FAST_PATH_STATS["saved_seconds"] += max(0.0, average_agent - elapsed)
+    return reply
+
+def record_agent_turn(seconds: float) -> None:
+    """Records the duration of a turn answered by the agent, the baseline for the fast path's savings."""
+    with _FAST_PATH_LOCK:
+        _FAST_PATH_STATS["agent_turns"] += 1
+        _FAST_PATH_STATS["agent_seconds"] += seconds
+
+def fast_path_stats() -> Dict[str, Any]:
+    """Returns fast-path hit rate, average latencies and the estimated time saved."""
+    with _FAST_PATH_LOCK:
+        stats = dict(_FAST_PATH_STATS)
+    return {
+        "turns": stats["turns"],
+        "hits": stats["hits"],
+        "hit_rate": round(stats["hits"] / stats["turns"], 3) if stats["turns"] else 0.0,
+        "fast_path_ms_avg": round(stats["fast_seconds"] / stats["hits"] * 1000, 2) if stats["hits"] else None,
+        "agent_turn_ms_avg": round(stats["agent_seconds"] / stats["agent_turns"] * 1000, 2) if stats["agent_turns"] else None,
+        "estimated_saved_ms": round(stats["saved_seconds"] * 1000, 1),
+    }
 
 
 # Step 1: Create the LLM Agent
@@ -92,55 +811,256 @@ Your primary role is to help users manage their timesheets using the available t
     - After calling `tool_view_queries`, **ALWAYS respond to the user** with the information you retrieved.
 2.  **For an `Employee` asking to submit, log, or add hours:**
     - Use `tool_submit_timesheet`. You must have the number of hours to proceed.
+    - If the request covers several days or tasks (e.g. "8 hours Mon-Fri on Project X"), use `tool_submit_timesheet_batch` once with one entry per day/task instead of calling `tool_submit_timesheet` repeatedly. Report any per-entry errors it returns.
 3.  **For a `Manager` asking to review, see pending items, or check approvals:**
     - This is the **FIRST** step of the approval process.
     - Use `tool_manager_approval`. This tool only *lists* pending timesheets and their IDs.
+    - Results are paged. `total_pending` is the full count; if `next_page_token` is set and the user wants more, call the tool again with it as `page_token`.
+    - If the manager asks about their whole org or organization (including their managers' teams), pass `scope` 'org'. Those sheets can only be approved by the manager each one is waiting on.
 4.  **For a `Manager` asking to `approve` or `reject` a specific timesheet:**
     - This is the **SECOND** step of the approval process.
     - You MUST have a timesheet ID to do this. If you don't have one, use `tool_manager_approval` first to get a list.
     - Use `tool_update_timesheet_status` with the `timesheet_id` and the desired `new_status` ('Approved' or 'Rejected').
+    - Tool results may list timesheets by short references such as `t3`. Pass the reference as the timesheet ID; never invent one.
+    - To approve or reject several sheets at once (a list of IDs, or e.g. "all pending for employee X before date D"), use `tool_update_timesheet_status_batch` in a single call.
+5.  **For a `Manager` asking how many hours their team worked over a period (per person, per day or per week):**
+    - Use `tool_team_hours_report` with the range as `start_date` and `end_date` (YYYY-MM-DD) and `group_by` 'employee', 'day' or 'week'. It counts approved hours only.
+    - Pass `scope` 'org' to cover everyone below the manager at any depth instead of only direct reports.
 
 **Error Handling:**
 - If a tool returns a status of "error", inform the user of the error message clearly."""
 
+def session_instruction(context: "ReadonlyContext") -> str:
+    """Derives the system instruction for each invocation from the session's user context."""
+    return get_agent_instruction(context.user_id, context.state.get('user:role', 'Employee'))
+
+# --- Per-Session User Context ---
+# The user ID is the Runner's user_id for the invocation; the rest of the profile
+# lives in 'user:'-scoped session state so every session of that user shares it.
+
+def profile_state(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the session state entries that carry a user's profile."""
+    return {
+        'user:name': profile['name'],
+        'user:role': profile['role'],
+        'user:reports_to': profile['reportsTo'],
+    }
+
+def resolve_profile(user_id: str, tool_context: Optional["ToolContext"]) -> Optional[Dict[str, Any]]:
+    """
+    Returns the profile of the user a tool call acts for.
+
+    Inside an agent invocation the identity comes from the session, never from
+    the model-supplied ID. Direct calls (batch jobs, scripts) load the profile
+    for `user_id` from the database.
+    """
+    if tool_context is None:
+        return get_user_profile(user_id)
+    if user_id != tool_context.user_id:
+        TOOL_LOG.warning("Tool called with ID '%s' in a session owned by '%s'. Using the session user.", user_id, tool_context.user_id)
+    state = tool_context.state
+    if 'user:role' not in state:
+        return get_user_profile(tool_context.user_id)
+    return {
+        'id': tool_context.user_id,
+        'name': state.get('user:name'),
+        'role': state.get('user:role'),
+        'reportsTo': state.get('user:reports_to'),
+    }
+
+# --- Paging ---
+
+DEFAULT_PAGE_SIZE = 50  # Rows per page when the caller does not ask for a size
+MAX_PAGE_SIZE = 200  # Upper bound on rows per page, whatever the caller asks for
+
+# Columns get_timesheets may project; the first seven are the default projection.
+TIMESHEET_COLUMNS = ('id', 'date', 'hours', 'task', 'status', 'employeeId', 'submittedAt', 'managerId', 'approvedAt')
+DEFAULT_TIMESHEET_COLUMNS = TIMESHEET_COLUMNS[:7]
+# The manager's pending list omits the status (always 'Pending').
+PENDING_SHEET_COLUMNS = ('id', 'date', 'hours', 'task', 'employeeId', 'submittedAt')
+# The org-wide list also shows which manager each sheet is waiting on.
+ORG_PENDING_SHEET_COLUMNS = PENDING_SHEET_COLUMNS + ('managerId',)
+
+def encode_page_token(*position: str) -> str:
+    """Encodes the keyset position of the last row on a page, e.g. (submittedAt, id), as an opaque token."""
+    return base64.urlsafe_b64encode(json.dumps(list(position)).encode()).decode()
+
+def decode_page_token(page_token: str, size: int = 2) -> Tuple[str, ...]:
+    """Decodes a token from encode_page_token holding `size` values. Raises ValueError if it is malformed."""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(page_token.encode()))
+        if isinstance(position, list) and len(position) == size and all(isinstance(value, str) for value in position):
+            return tuple(position)
+    except Exception:
+        pass
+    raise ValueError(f"Invalid page token '{page_token}'.")
+
+# --- Compact Tool Results ---
+# Everything a tool returns to the model becomes prompt tokens on the next turn.
+# In compact mode, the agent-facing tool variants replace timesheet UUIDs with
+# short per-session references ("t1", "t2", ...), truncate task text, send rows as
+# arrays under a single column header, and group the pending list by employee,
+# listing at most COMPACT_DETAIL_LIMIT sheets. Tools accept the references wherever
+# they take a timesheet ID. Direct callers (scripts, the fast path) still get the
+# full payloads.
+
+TOOL_RESULT_FORMAT = os.getenv("TIMESHEET_TOOL_RESULT_FORMAT", "compact")  # "compact" or "full"
+COMPACT_DETAIL_LIMIT = int(os.getenv("TIMESHEET_COMPACT_DETAIL_LIMIT", "10"))  # Sheets listed individually per result
+COMPACT_TASK_CHARS = 40  # Task text is cut to this many characters
+TIMESHEET_REF_LIMIT = 500  # References remembered per session; the oldest are forgotten first
+TIMESHEET_REFS_KEY = 'timesheet_refs'  # Session state: {reference: timesheet ID}
+TIMESHEET_REF_SEQ_KEY = 'timesheet_ref_seq'  # Session state: the last reference number handed out
+
+def shorten(text: Optional[str], limit: int = COMPACT_TASK_CHARS) -> Optional[str]:
+    """Cuts `text` to `limit` characters, marking the cut with an ellipsis."""
+    if text is None or len(text) <= limit:
+        return text
+    return text[:limit - 1].rstrip() + "…"
+
+def assign_timesheet_refs(timesheet_ids: Sequence[str], state: Any) -> List[str]:
+    """
+    Returns a short session reference for each timesheet ID, reusing existing ones.
+
+    `state` is the session state (or any mutable mapping). New references are
+    written back to it, so they stay valid for the rest of the conversation.
+    """
+    refs: Dict[str, str] = dict(state.get(TIMESHEET_REFS_KEY) or {})
+    by_id = {timesheet_id: ref for ref, timesheet_id in refs.items()}
+    seq = state.get(TIMESHEET_REF_SEQ_KEY) or 0
+    result = []
+    for timesheet_id in timesheet_ids:
+        ref = by_id.get(timesheet_id)
+        if ref is None:
+            seq += 1
+            ref = f"t{seq}"
+            refs[ref] = by_id[timesheet_id] = timesheet_id
+        result.append(ref)
+    if seq != (state.get(TIMESHEET_REF_SEQ_KEY) or 0):
+        while len(refs) > TIMESHEET_REF_LIMIT:
+            refs.pop(next(iter(refs)))
+        state[TIMESHEET_REFS_KEY] = refs
+        state[TIMESHEET_REF_SEQ_KEY] = seq
+    return result
+
+def resolve_timesheet_refs(timesheet_ids: Sequence[str], tool_context: Optional["ToolContext"]) -> List[str]:
+    """Maps session references (e.g. 't3') back to timesheet IDs; anything else passes through unchanged."""
+    if tool_context is None:
+        return list(timesheet_ids)
+    refs = tool_context.state.get(TIMESHEET_REFS_KEY) or {}
+    return [refs.get(timesheet_id, timesheet_id) for timesheet_id in timesheet_ids]
+
+def compact_tool_result(tool_name: str, result: Dict[str, Any], state: Any,
+                        detail_limit: int = COMPACT_DETAIL_LIMIT) -> Dict[str, Any]:
+    """Returns the compact encoding of a tool result for the model. Errors and unknown tools pass through."""
+    if result.get('status') != 'success':
+        return result
+    if tool_name == 'tool_manager_approval':
+        sheets = result.get('pending_sheets') or []
+        refs = assign_timesheet_refs([sheet['id'] for sheet in sheets[:detail_limit]], state)
+        groups: Dict[str, Dict[str, Any]] = {}
+        for index, sheet in enumerate(sheets):
+            group = groups.setdefault(sheet['employeeId'], {
+                "employee": sheet.get('employee_name'), "employee_id": sheet['employeeId'],
+                "pending": 0, "hours": 0.0, "sheets": [],
+            })
+            if 'managerId' in sheet:
+                group["waiting_on"] = sheet['managerId']
+            group["pending"] += 1
+            group["hours"] = round(group["hours"] + (sheet.get('hours') or 0), 2)
+            if index < detail_limit:
+                group["sheets"].append([refs[index], sheet.get('date'), sheet.get('hours'), shorten(sheet.get('task'))])
+        compact = {
+            "status": "success",
+            "total_pending": result.get('total_pending'),
+            "sheet_columns": ["ref", "date", "hours", "task"],
+            "by_employee": list(groups.values()),
+        }
+        if len(sheets) > detail_limit:
+            compact["not_listed"] = len(sheets) - detail_limit
+        if result.get('next_page_token'):
+            compact["next_page_token"] = result['next_page_token']
+        return compact
+    if tool_name == 'tool_view_queries':
+        compact = {key: value for key, value in result.items() if key not in ('recent_submissions', 'next_page_token')}
+        compact["recent_columns"] = ["date", "hours", "status", "task"]
+        compact["recent"] = [[sheet.get('date'), sheet.get('hours'), sheet.get('status'), shorten(sheet.get('task'))]
+                             for sheet in (result.get('recent_submissions') or [])[:detail_limit]]
+        if result.get('next_page_token'):
+            compact["next_page_token"] = result['next_page_token']
+        return compact
+    if tool_name == 'tool_update_timesheet_status_batch':
+        # Report the sheets by the references the model used, where it has them.
+        refs = state.get(TIMESHEET_REFS_KEY) or {}
+        by_id = {timesheet_id: ref for ref, timesheet_id in refs.items()}
+        compact = dict(result)
+        for key in ('updated', 'not_found', 'not_owned', 'not_pending'):
+            compact[key] = [by_id.get(timesheet_id, timesheet_id) for timesheet_id in result.get(key) or []]
+        return compact
+    if tool_name == 'tool_team_hours_report':
+        columns = reporting.REPORT_COLUMNS[result['group_by']]
+        compact = {key: value for key, value in result.items() if key != 'rows'}
+        compact["columns"] = list(columns)
+        compact["rows"] = [[row[column] for column in columns] for row in result.get('rows') or []]
+        return compact
+    return result
+
 # --- TOOL 1: View/Read Only Queries (Employee Role) ---
 
-def tool_view_queries(user_id: str) -> dict:
+# Served from the trigger-maintained daily aggregate: at most one row per day.
+MONTHLY_HOURS_QUERY = """
+    SELECT SUM(hours) FROM hours_daily
+    WHERE employeeId = ? AND status = 'Approved' AND date >= ?
+"""
+
+@instrumented_tool
+def tool_view_queries(user_id: str, page_size: int = 3, page_token: str = None, tool_context: Optional["ToolContext"] = None) -> dict:
     """
     Provides read-only information for the employee dashboard.
 
     Args:
         user_id: The unique ID of the employee querying the data.
+        page_size: How many recent submissions to return. Defaults to 3.
+        page_token: The `next_page_token` of a previous call, to page further back through submissions.
+        tool_context: Injected by ADK; supplies the session's user context.
 
     Returns:
         Dictionary with status and dashboard information.
-        Success: {"status": "success", "pending_count": int, "monthly_hours": float, "manager_name": str, "recent_submissions": list}
+        Success: {"status": "success", "pending_count": int, "monthly_hours": float, "manager_name": str, "recent_submissions": list, "next_page_token": str | None}
         Error: {"status": "error", "error_message": str}
     """
-    logging.info(f"Executing tool: tool_view_queries for user_id: {user_id}")
-    if not CONN:
-        logging.error("tool_view_queries failed: Database connection not available.")
+    TOOL_LOG.info("Executing tool: tool_view_queries for user_id: %s", user_id)
+    conn = get_conn()
+    if not conn:
+        TOOL_LOG.error("tool_view_queries failed: Database connection not available.")
         return {"status": "error", "error_message": "Database connection not available"}
 
+    profile = resolve_profile(user_id, tool_context)
+    if not profile:
+        TOOL_LOG.warning("tool_view_queries failed: Unknown user '%s'.", user_id)
+        return {"status": "error", "error_message": f"Unknown user '{user_id}'."}
+    user_id = profile['id']
+
+    cache_group = ('tool_view_queries', user_id)
+    cached = RESULT_CACHE.get(cache_group + (page_size, page_token))
+    if cached is not None:
+        TOOL_LOG.info("tool_view_queries served from the result cache.")
+        return copy.deepcopy(cached)
+    generation = RESULT_CACHE.generation
+
     try:
-        pending_count = len(get_timesheets(user_id=user_id, status='Pending'))
+        pending_count = get_status_count('Pending', user_id=user_id)
 
         thirty_days_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-        cursor = CONN.cursor()
-        cursor.execute(
-            """
-            SELECT SUM(hours) FROM timesheets
-            WHERE employeeId = ? AND status = 'Approved' AND date >= ?
-            """,
-            (user_id, thirty_days_ago)
-        )
+        cursor = conn.cursor()
+        cursor.execute(MONTHLY_HOURS_QUERY, (user_id, thirty_days_ago))
 
         monthly_hours_result = cursor.fetchone()
         monthly_hours = (monthly_hours_result[0] or 0.0) if monthly_hours_result else 0.0
 
-        manager_name = get_user_name(CURRENT_PROFILE['reportsTo'])
+        # Top-level users (e.g. a manager with no manager of their own) have no reportsTo.
+        manager_name = get_user_name(profile['reportsTo']) if profile['reportsTo'] else "No manager assigned"
 
-        recent_sheets = get_timesheets(user_id=user_id, limit=3)
+        recent_sheets, next_page_token = get_timesheets_page(user_id=user_id, page_size=page_size, page_token=page_token)
 
         result = {
             "status": "success",
@@ -148,18 +1068,51 @@ def tool_view_queries(user_id: str) -> dict:
             "monthly_hours": round(monthly_hours, 1),
             "manager_name": manager_name,
             "recent_submissions": recent_sheets,
+            "next_page_token": next_page_token,
         }
-        logging.info("tool_view_queries executed successfully.")
+        RESULT_CACHE.put(cache_group + (page_size, page_token), copy.deepcopy(result), generation, group=cache_group)
+        TOOL_LOG.info("tool_view_queries executed successfully.")
         return result
+    except ValueError as e:
+        TOOL_LOG.warning("tool_view_queries rejected its paging arguments: %s", e)
+        return {"status": "error", "error_message": str(e)}
     except Exception as e:
-        logging.error(f"tool_view_queries failed with exception: {e}", exc_info=True)
+        TOOL_LOG.error("tool_view_queries failed with exception: %s", e, exc_info=True)
         return {
             "status": "error",
             "error_message": f"An error occurred while fetching dashboard data: {e}",
         }
 
 # --- TOOL 2: Submit Timesheet (Employee Role) ---
-def tool_submit_timesheet(user_id: str, hours: float, date: str = None, task: str = "Unspecified project work.") -> dict:
+
+INSERT_TIMESHEET_SQL = """
+    INSERT INTO timesheets (id, employeeId, managerId, date, hours, task, status, submittedAt)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def insert_timesheets(conn: sqlite3.Connection, rows: Sequence[tuple]) -> None:
+    """Inserts INSERT_TIMESHEET_SQL rows without committing; pass it to run_write."""
+    conn.executemany(INSERT_TIMESHEET_SQL, rows)
+
+def validate_timesheet_entry(hours: Any, task: Any) -> Tuple[Optional[float], Optional[str]]:
+    """
+    Applies the submission rules (0.5 to 24 hours, non-empty task) to one entry.
+
+    Returns:
+        (hours as a float, None) if the entry is valid, otherwise (None, error message).
+    """
+    try:
+        hours = float(hours)
+    except (TypeError, ValueError) as e:
+        return None, f"Invalid tool arguments: {e}"
+    if not (0.5 <= hours <= 24):
+        return None, "Hours must be between 0.5 and 24."
+    if not task:
+        return None, "Task description cannot be empty."
+    return hours, None
+
+@instrumented_tool
+def tool_submit_timesheet(user_id: str, hours: float, date: str = None, task: str = "Unspecified project work.", tool_context: Optional["ToolContext"] = None) -> dict:
     """
     Allows the employee to submit a new timesheet entry.
 
@@ -168,56 +1121,57 @@ def tool_submit_timesheet(user_id: str, hours: float, date: str = None, task: st
         hours: The number of hours worked.
         date: The date of work in YYYY-MM-DD format. Defaults to today.
         task: A description of the task performed.
+        tool_context: Injected by ADK; supplies the session's user context.
 
     Returns:
         Dictionary with status of the submission.
         Success: {"status": "success", "message": str, "timesheet_id": str}
         Error: {"status": "error", "error_message": str}
     """
-    logging.info(f"Executing tool: tool_submit_timesheet for user_id: {user_id} with hours: {hours}")
+    TOOL_LOG.info("Executing tool: tool_submit_timesheet for user_id: %s with hours: %s", user_id, hours)
     if not date:
         date = datetime.now().strftime('%Y-%m-%d')
 
-    try:
-        hours = float(hours)
-        if not (0.5 <= hours <= 24):
-            logging.warning(f"Invalid hours provided: {hours}. Must be between 0.5 and 24.")
-            return {"status": "error", "error_message": "Hours must be between 0.5 and 24."}
-        if not task:
-            logging.warning("Empty task description provided.")
-            return {"status": "error", "error_message": "Task description cannot be empty."}
-    except ValueError as e:
-        logging.error(f"Invalid tool arguments for tool_submit_timesheet: {e}", exc_info=True)
-        return {"status": "error", "error_message": f"Invalid tool arguments: {e}"}
+    hours, error = validate_timesheet_entry(hours, task)
+    if error:
+        TOOL_LOG.warning("tool_submit_timesheet rejected its arguments: %s", error)
+        return {"status": "error", "error_message": error}
+
+    conn = get_conn()
 
-    if not CONN:
-        logging.error("tool_submit_timesheet failed: Database connection not available.")
+    if not conn:
+        TOOL_LOG.error("tool_submit_timesheet failed: Database connection not available.")
         return {"status": "error", "error_message": "Database connection not available"}
 
+    profile = resolve_profile(user_id, tool_context)
+    if not profile:
+        TOOL_LOG.warning("tool_submit_timesheet failed: Unknown user '%s'.", user_id)
+        return {"status": "error", "error_message": f"Unknown user '{user_id}'."}
+    user_id = profile['id']
+
     try:
         new_sheet_id = str(uuid4())
         submitted_at = datetime.now().isoformat()
-        manager_id = CURRENT_PROFILE.get('reportsTo', MANAGER_ID)
-        cursor = CONN.cursor()
-        cursor.execute("""
-            INSERT INTO timesheets (id, employeeId, managerId, date, hours, task, status, submittedAt)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (new_sheet_id, user_id, manager_id, date, hours, task, 'Pending', submitted_at))
-        CONN.commit()
+        manager_id = profile.get('reportsTo', MANAGER_ID)
+        # Returns once the row is committed, possibly together with other users' writes.
+        run_write(insert_timesheets, [(new_sheet_id, user_id, manager_id, date, hours, task, 'Pending', submitted_at)], conn=conn)
+        invalidate_results(user_ids=[user_id], manager_ids=[manager_id])
         result = {
             "status": "success",
             "message": f"Timesheet submitted for {date} ({hours} hours). Task: '{task}'. Awaiting manager approval.",
             "timesheet_id": new_sheet_id
         }
-        logging.info(f"tool_submit_timesheet executed successfully. New timesheet ID: {new_sheet_id}")
+        TOOL_LOG.info("tool_submit_timesheet executed successfully. New timesheet ID: %s", new_sheet_id)
         return result
     except Exception as e:
-        logging.error(f"tool_submit_timesheet failed during DB operation: {e}", exc_info=True)
+        TOOL_LOG.error("tool_submit_timesheet failed during DB operation: %s", e, exc_info=True)
         return {"status": "error", "error_message": f"An error occurred during submission: {e}"}
 
 # --- TOOL 3: Manager Approval (Manager Role) ---
 
-def tool_manager_approval(manager_id: str) -> dict:
+@instrumented_tool
+def tool_manager_approval(manager_id: str, page_size: int = DEFAULT_PAGE_SIZE, page_token: str = None, scope: str = "direct",
+                          tool_context: Optional["ToolContext"] = None) -> dict:
     """
     Allows a manager to view pending timesheets submitted by their direct reports.
 
@@ -225,42 +1179,127 @@ def tool_manager_approval(manager_id: str) -> dict:
     of items awaiting action. A separate tool would be used to perform the
     approval or rejection action itself.
 
+    Results are paged, newest first. Pass the returned `next_page_token` back
+    as `page_token` to fetch the next page. With scope 'org', the list covers
+    everyone below the manager at any depth, grouped by employee, and each
+    sheet names the manager it is waiting on; only that manager can approve it.
+
     Args:
         manager_id: The unique ID of the manager performing the query.
+        page_size: The maximum number of sheets to return.
+        page_token: The `next_page_token` of a previous call. Omit for the first page.
+        scope: 'direct' (sheets routed to this manager) or 'org' (the whole reporting subtree).
+        tool_context: Injected by ADK; supplies the session's user context.
 
     Returns:
-        A dictionary containing the status and the list of pending timesheets.
-        Success: {"status": "success", "pending_sheets": list}
+        A dictionary containing the status and one page of pending timesheets.
+        Success: {"status": "success", "pending_sheets": list, "total_pending": int, "next_page_token": str | None}
         Error: {"status": "error", "error_message": str}
     """
-    logging.info(f"Executing tool: tool_manager_approval for manager_id: {manager_id}")
-    if CURRENT_PROFILE['role'] != 'Manager':
-        logging.warning(f"Access denied for tool_manager_approval. User role is not 'Manager'.")
+    TOOL_LOG.info("Executing tool: tool_manager_approval for manager_id: %s", manager_id)
+    profile = resolve_profile(manager_id, tool_context)
+    if not profile or profile['role'] != 'Manager':
+        TOOL_LOG.warning("Access denied for tool_manager_approval. User role is not 'Manager'.")
         return {
             "status": "error",
             "error_message": "ACCESS DENIED: You must have the 'Manager' role to perform approvals."
         }
+    manager_id = profile['id']
+    if scope not in ORG_SCOPES:
+        return {"status": "error", "error_message": f"Invalid scope '{scope}'. Must be one of {', '.join(ORG_SCOPES)}."}
 
-    try:
-        pending_sheets = get_timesheets(manager_id=manager_id, status='Pending')
+    # Org-wide lists change with writes anywhere below the manager, which
+    # invalidate_results does not track, so only direct lists are cached.
+    cache_group = ('tool_manager_approval', manager_id)
+    cached = RESULT_CACHE.get(cache_group + (page_size, page_token)) if scope == "direct" else None
+    if cached is not None:
+        TOOL_LOG.info("tool_manager_approval served from the result cache.")
+        return copy.deepcopy(cached)
+    generation = RESULT_CACHE.generation
 
-        # Add employee name to each sheet for easier display
-        for sheet in pending_sheets:
-            sheet['employee_name'] = get_user_name(sheet['employeeId'])
+    try:
+        # Employee names come from the same query (JOIN) for easier display
+        pending_sheets, next_page_token = get_timesheets_page(
+            manager_id=manager_id, status='Pending', with_employee_name=True,
+            columns=ORG_PENDING_SHEET_COLUMNS if scope == "org" else PENDING_SHEET_COLUMNS,
+            page_size=page_size, page_token=page_token, scope=scope
+        )
+        total_pending = get_status_count('Pending', manager_id=manager_id, scope=scope)
 
         result = {
             "status": "success",
-            "pending_sheets": pending_sheets
+            "pending_sheets": pending_sheets,
+            "total_pending": total_pending,
+            "next_page_token": next_page_token,
         }
-        logging.info(f"tool_manager_approval executed successfully. Found {len(pending_sheets)} pending sheets.")
+        if scope == "direct":
+            RESULT_CACHE.put(cache_group + (page_size, page_token), copy.deepcopy(result), generation, group=cache_group)
+        TOOL_LOG.info("tool_manager_approval executed successfully. Returned %s of %s pending sheets.", len(pending_sheets), total_pending)
         return result
+    except ValueError as e:
+        TOOL_LOG.warning("tool_manager_approval rejected its paging arguments: %s", e)
+        return {"status": "error", "error_message": str(e)}
     except Exception as e:
-        logging.error(f"tool_manager_approval failed with exception: {e}", exc_info=True)
+        TOOL_LOG.error("tool_manager_approval failed with exception: %s", e, exc_info=True)
         return {"status": "error", "error_message": f"An error occurred while fetching pending sheets: {e}"}
 
 # --- TOOL 4: Update Timesheet Status (Manager Role) ---
 
-def tool_update_timesheet_status(manager_id: str, timesheet_id: str, new_status: str) -> dict:
+def update_timesheet_statuses(conn: sqlite3.Connection, manager_id: str, new_status: str,
+                              timesheet_ids: Optional[Sequence[str]] = None,
+                              employee_id: Optional[str] = None, before_date: Optional[str] = None) -> Dict[str, List[str]]:
+    """
+    Approves or rejects pending timesheets with a single guarded UPDATE and commits it (see run_write).
+
+    Only rows that belong to `manager_id` and are still 'Pending' change; the
+    guard is part of the UPDATE itself, so there is no window between checking
+    and writing. Targets are either `timesheet_ids`, or every pending sheet of
+    the manager, optionally narrowed to `employee_id` and to dates before
+    `before_date` (YYYY-MM-DD).
+
+    Returns:
+        {"updated": [...], "not_found": [...], "not_owned": [...], "not_pending": [...]}.
+        Only ID-based updates can report the last three.
+    """
+    query = "UPDATE timesheets SET status = ?, approvedAt = ? WHERE managerId = ? AND status = 'Pending'"
+    params: List[Any] = [new_status, datetime.now().isoformat(), manager_id]
+    if timesheet_ids is not None:
+        query += f" AND id IN ({', '.join('?' * len(timesheet_ids))})"
+        params.extend(timesheet_ids)
+    if employee_id:
+        query += " AND employeeId = ?"
+        params.append(employee_id)
+    if before_date:
+        query += " AND date < ?"
+        params.append(before_date)
+    query += " RETURNING id, employeeId"
+
+    outcome: Dict[str, List[str]] = {"updated": [], "not_found": [], "not_owned": [], "not_pending": []}
+    rows = run_write(lambda write_conn: write_conn.execute(query, params).fetchall(), conn=conn)
+    outcome["updated"] = [row[0] for row in rows]
+    if rows:
+        invalidate_results(user_ids=[row[1] for row in rows], manager_ids=[manager_id])
+
+    # Explain the IDs that were not updated; this only runs when something was skipped.
+    # Archived sheets are settled, so they report as not pending rather than not found.
+    updated = set(outcome["updated"])
+    missed = [timesheet_id for timesheet_id in dict.fromkeys(timesheet_ids or []) if timesheet_id not in updated]
+    if missed:
+        found = {row[0]: row[1] for row in conn.execute(
+            f"SELECT id, managerId FROM all_timesheets WHERE id IN ({', '.join('?' * len(missed))})", missed
+        )}
+        for timesheet_id in missed:
+            if timesheet_id not in found:
+                outcome["not_found"].append(timesheet_id)
+            elif found[timesheet_id] != manager_id:
+                outcome["not_owned"].append(timesheet_id)
+            else:
+                outcome["not_pending"].append(timesheet_id)
+    return outcome
+
+
+@instrumented_tool
+def tool_update_timesheet_status(manager_id: str, timesheet_id: str, new_status: str, tool_context: Optional["ToolContext"] = None) -> dict:
     """
     Allows a manager to approve or reject a pending timesheet.
 
@@ -268,183 +1307,2031 @@ def tool_update_timesheet_status(manager_id: str, timesheet_id: str, new_status:
         manager_id: The unique ID of the manager performing the action.
         timesheet_id: The unique ID of the timesheet to be updated.
         new_status: The new status to set. Must be 'Approved' or 'Rejected'.
+        tool_context: Injected by ADK; supplies the session's user context.
 
     Returns:
         A dictionary containing the status of the update operation.
         Success: {"status": "success", "message": str}
         Error: {"status": "error", "error_message": str}
     """
-    logging.info(f"Executing tool: tool_update_timesheet_status for manager_id: {manager_id}, timesheet_id: {timesheet_id}, new_status: {new_status}")
-    if CURRENT_PROFILE['role'] != 'Manager':
-        logging.warning(f"Access denied for tool_update_timesheet_status. User role is not 'Manager'.")
+    TOOL_LOG.info("Executing tool: tool_update_timesheet_status for manager_id: %s, timesheet_id: %s, new_status: %s", manager_id, timesheet_id, new_status)
+    profile = resolve_profile(manager_id, tool_context)
+    if not profile or profile['role'] != 'Manager':
+        TOOL_LOG.warning("Access denied for tool_update_timesheet_status. User role is not 'Manager'.")
         return {
             "status": "error",
             "error_message": "ACCESS DENIED: You must have the 'Manager' role to perform this action."
         }
+    manager_id = profile['id']
+    timesheet_id = resolve_timesheet_refs([timesheet_id], tool_context)[0]
 
     if new_status not in ['Approved', 'Rejected']:
-        logging.warning(f"Invalid status '{new_status}' provided to tool_update_timesheet_status.")
+        TOOL_LOG.warning("Invalid status '%s' provided to tool_update_timesheet_status.", new_status)
         return {
             "status": "error",
             "error_message": f"Invalid status '{new_status}'. Must be 'Approved' or 'Rejected'."
         }
 
-    if not CONN:
-        logging.error("tool_update_timesheet_status failed: Database connection not available.")
+    conn = get_conn()
+
+    if not conn:
+        TOOL_LOG.error("tool_update_timesheet_status failed: Database connection not available.")
         return {"status": "error", "error_message": "Database connection not available"}
 
     try:
-        cursor = CONN.cursor()
-
-        # Verify the timesheet exists and reports to this manager
-        cursor.execute("SELECT managerId FROM timesheets WHERE id = ?", (timesheet_id,))
-        result = cursor.fetchone()
-
-        if not result:
-            logging.warning(f"Timesheet with ID '{timesheet_id}' not found during update.")
-            return { "status": "error", "error_message": f"Timesheet with ID '{timesheet_id}' not found." }
-
-        sheet_manager_id = result[0]
-        if sheet_manager_id != manager_id:
-            logging.warning(f"Access denied: Manager '{manager_id}' attempted to update timesheet '{timesheet_id}' owned by manager '{sheet_manager_id}'.")
-            return { "status": "error", "error_message": f"ACCESS DENIED: You are not the manager for timesheet '{timesheet_id}'." }
-
-        # Update the status
-        approved_at = datetime.now().isoformat()
-        cursor.execute( """ UPDATE timesheets SET status = ?, approvedAt = ? WHERE id = ? """, (new_status, approved_at, timesheet_id) )
-        CONN.commit()
+        outcome = update_timesheet_statuses(conn, manager_id, new_status, timesheet_ids=[timesheet_id])
 
-        if cursor.rowcount > 0:
+        if outcome["updated"]:
             result = { "status": "success", "message": f"Timesheet '{timesheet_id[:8]}...' has been {new_status}." }
-            logging.info(f"tool_update_timesheet_status executed successfully for timesheet '{timesheet_id}'.")
+            TOOL_LOG.info("tool_update_timesheet_status executed successfully for timesheet '%s'.", timesheet_id)
             return result
-        else:
-            # This case is unlikely if the initial check passes, but good to have
-            logging.error(f"Failed to update timesheet '{timesheet_id}' in the database, though it was found initially.")
-            return { "status": "error", "error_message": f"Failed to update timesheet '{timesheet_id}'. It may have been deleted." }
+        if outcome["not_found"]:
+            TOOL_LOG.warning("Timesheet with ID '%s' not found during update.", timesheet_id)
+            return { "status": "error", "error_message": f"Timesheet with ID '{timesheet_id}' not found." }
+        if outcome["not_owned"]:
+            TOOL_LOG.warning("Access denied: Manager '%s' attempted to update timesheet '%s' they do not manage.", manager_id, timesheet_id)
+            return { "status": "error", "error_message": f"ACCESS DENIED: You are not the manager for timesheet '{timesheet_id}'." }
+        TOOL_LOG.warning("Timesheet '%s' is no longer pending; not updated.", timesheet_id)
+        return { "status": "error", "error_message": f"Timesheet '{timesheet_id}' is not pending; it has already been approved or rejected." }
 
     except Exception as e:
-        logging.error(f"tool_update_timesheet_status failed with exception: {e}", exc_info=True)
+        TOOL_LOG.error("tool_update_timesheet_status failed with exception: %s", e, exc_info=True)
         return {
             "status": "error",
             "error_message": f"An error occurred during the update process: {e}"
         }
 
-# --- ADK INTEGRATION: Tool Manager and LLM Router ---
+# --- TOOL 5: Bulk Submit Timesheets (Employee Role) ---
 
-# 1. TOOL SCHEMA DEFINITIONS (The metadata the LLM uses)
-TOOL_SCHEMAS: Dict[str, Dict[str, Any]] = {
-    "tool_view_queries": {
-        "function_ref": tool_view_queries,
-        "description": "Retrieves the current user's timesheet dashboard information, including pending sheets, approved hours, and manager contact details. Use for any status or history query.",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "user_id": {"type": "string", "description": "The unique ID of the employee querying the data. (Mandatory)"}
-            },
-            "required": ["user_id"]
-        }
-    },
-    "tool_submit_timesheet": {
-        "function_ref": tool_submit_timesheet,
-        "description": "Creates and submits a new timesheet entry for approval. Use for logging or adding hours.",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "user_id": {"type": "string", "description": "The unique ID of the employee submitting the sheet. (Mandatory)"},
-                "hours": {"type": "number", "description": "The number of hours to submit (e.g., 8.0)."},
-                "date": {"type": "string", "description": "The date of the submission in YYYY-MM-DD format. Defaults to today."},
-                "task": {"type": "string", "description": "A description of the task performed. Defaults to 'Unspecified project work.'"}
-            },
-            "required": ["user_id", "hours"]
-        }
-    },
-    "tool_manager_approval": {
-        "function_ref": tool_manager_approval,
-        "description": "Retrieves a list of pending timesheets for a manager to review. Requires Manager role.",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "manager_id": {"type": "string", "description": "The unique ID of the manager performing the approval. (Mandatory)"}
-            },
-            "required": ["manager_id"]
-        }
-    },
-    "tool_update_timesheet_status": {
-        "function_ref": tool_update_timesheet_status,
-        "description": "Allows a manager to approve or reject a pending timesheet by its ID. Requires Manager role.",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "manager_id": {"type": "string", "description": "The unique ID of the manager performing the action. (Mandatory)"},
-                "timesheet_id": {"type": "string", "description": "The unique ID of the timesheet to update. (Mandatory)"},
-                "new_status": {"type": "string", "description": "The new status to set. Must be 'Approved' or 'Rejected'. (Mandatory)"}
-            },
-            "required": ["manager_id", "timesheet_id", "new_status"]
-        }
-    }
-}
+MAX_BATCH_SIZE = 100  # Most entries a single batch tool call may carry
 
-# agent with custom function tools
-timesheet_agent = LlmAgent(
-    name="timesheet_agent",
-    model=Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config),
-    instruction="You are a helpful timesheet assistant.",
-    tools=[
-        tool_view_queries,
-        tool_submit_timesheet,
-        tool_manager_approval,
-        tool_update_timesheet_status
-    ],
-)
+@instrumented_tool
+def tool_submit_timesheet_batch(user_id: str, entries: List[Dict[str, Any]], tool_context: Optional["ToolContext"] = None) -> dict:
+    """
+    Submits several timesheet entries at once, e.g. a whole week of work.
+
+    Each entry is validated with the same rules as `tool_submit_timesheet`.
+    All valid entries are inserted in a single transaction; invalid entries are
+    reported and skipped.
+
+    Args:
+        user_id: The unique ID of the employee submitting the sheets.
+        entries: The entries to submit. Each is an object with `hours` (number, required),
+            `date` (YYYY-MM-DD, defaults to today) and `task` (string, defaults to
+            'Unspecified project work.').
+        tool_context: Injected by ADK; supplies the session's user context.
+
+    Returns:
+        Dictionary with per-entry results. `index` refers to the position in `entries`.
+        Success: {"status": "success", "message": str, "submitted": [{"index": int, "timesheet_id": str, "date": str, "hours": float}], "errors": [{"index": int, "error_message": str}]}
+        Error: {"status": "error", "error_message": str, "errors": list}
+    """
+    TOOL_LOG.info("Executing tool: tool_submit_timesheet_batch for user_id: %s with %s entries", user_id, len(entries or []))
+    if not entries:
+        return {"status": "error", "error_message": "No timesheet entries provided.", "errors": []}
+    if len(entries) > MAX_BATCH_SIZE:
+        return {"status": "error", "error_message": f"At most {MAX_BATCH_SIZE} entries can be submitted at once.", "errors": []}
+
+    conn = get_conn()
+    if not conn:
+        TOOL_LOG.error("tool_submit_timesheet_batch failed: Database connection not available.")
+        return {"status": "error", "error_message": "Database connection not available"}
+
+    profile = resolve_profile(user_id, tool_context)
+    if not profile:
+        TOOL_LOG.warning("tool_submit_timesheet_batch failed: Unknown user '%s'.", user_id)
+        return {"status": "error", "error_message": f"Unknown user '{user_id}'."}
+    user_id = profile['id']
+    manager_id = profile.get('reportsTo', MANAGER_ID)
+    submitted_at = datetime.now().isoformat()
+    today = datetime.now().strftime('%Y-%m-%d')
+
+    rows, submitted, errors = [], [], []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            errors.append({"index": index, "error_message": "Entry must be an object with 'hours', 'date' and 'task'."})
+            continue
+        hours, error = validate_timesheet_entry(entry.get('hours'), entry.get('task', "Unspecified project work."))
+        if error:
+            errors.append({"index": index, "error_message": error})
+            continue
+        date = entry.get('date') or today
+        task = entry.get('task', "Unspecified project work.")
+        new_sheet_id = str(uuid4())
+        rows.append((new_sheet_id, user_id, manager_id, date, hours, task, 'Pending', submitted_at))
+        submitted.append({"index": index, "timesheet_id": new_sheet_id, "date": date, "hours": hours})
+
+    if not rows:
+        TOOL_LOG.warning("tool_submit_timesheet_batch rejected all %s entries.", len(entries))
+        return {"status": "error", "error_message": "No valid timesheet entries to submit.", "errors": errors}
+
+    try:
+        run_write(insert_timesheets, rows, conn=conn)
+        invalidate_results(user_ids=[user_id], manager_ids=[manager_id])
+    except Exception as e:
+        TOOL_LOG.error("tool_submit_timesheet_batch failed during DB operation: %s", e, exc_info=True)
+        return {"status": "error", "error_message": f"An error occurred during submission: {e}", "errors": errors}
+
+    total_hours = sum(row[4] for row in rows)
+    result = {
+        "status": "success",
+        "message": f"{len(rows)} timesheet(s) submitted ({total_hours} hours in total). Awaiting manager approval.",
+        "submitted": submitted,
+        "errors": errors,
+    }
+    TOOL_LOG.info("tool_submit_timesheet_batch executed successfully. Submitted %s, rejected %s.", len(rows), len(errors))
+    return result
+
+# --- TOOL 6: Bulk Update Timesheet Status (Manager Role) ---
+
+MAX_STATUS_BATCH_SIZE = 500  # Most timesheet IDs a single batch status update may list
+
+@instrumented_tool
+def tool_update_timesheet_status_batch(manager_id: str, new_status: str, timesheet_ids: List[str] = None,
+                                       employee_id: str = None, before_date: str = None,
+                                       tool_context: Optional["ToolContext"] = None) -> dict:
+    """
+    Allows a manager to approve or reject many pending timesheets in one step.
+
+    Pass either `timesheet_ids`, or a filter: every pending sheet of this manager,
+    optionally only for `employee_id` and/or only for dates before `before_date`.
+
+    Args:
+        manager_id: The unique ID of the manager performing the action.
+        new_status: The new status to set. Must be 'Approved' or 'Rejected'.
+        timesheet_ids: The IDs of the timesheets to update.
+        employee_id: With no IDs: only update pending sheets of this employee.
+        before_date: With no IDs: only update pending sheets dated before this day (YYYY-MM-DD).
+        tool_context: Injected by ADK; supplies the session's user context.
+
+    Returns:
+        A dictionary with the IDs in each outcome.
+        Success: {"status": "success", "message": str, "updated": list, "not_found": list, "not_owned": list, "not_pending": list}
+        Error: {"status": "error", "error_message": str}
+    """
+    TOOL_LOG.info("Executing tool: tool_update_timesheet_status_batch for manager_id: %s, new_status: %s, "
+                  "ids: %s, employee_id: %s, before_date: %s",
+                  manager_id, new_status, len(timesheet_ids or []), employee_id, before_date)
+    profile = resolve_profile(manager_id, tool_context)
+    if not profile or profile['role'] != 'Manager':
+        TOOL_LOG.warning("Access denied for tool_update_timesheet_status_batch. User role is not 'Manager'.")
+        return {
+            "status": "error",
+            "error_message": "ACCESS DENIED: You must have the 'Manager' role to perform this action."
+        }
+    manager_id = profile['id']
+    if timesheet_ids:
+        timesheet_ids = resolve_timesheet_refs(timesheet_ids, tool_context)
+
+    if new_status not in ['Approved', 'Rejected']:
+        TOOL_LOG.warning("Invalid status '%s' provided to tool_update_timesheet_status_batch.", new_status)
+        return {
+            "status": "error",
+            "error_message": f"Invalid status '{new_status}'. Must be 'Approved' or 'Rejected'."
+        }
+    if not timesheet_ids and not employee_id and not before_date:
+        return {
+            "status": "error",
+            "error_message": "Provide timesheet IDs, or an employee ID and/or a cut-off date to select the pending sheets."
+        }
+    if timesheet_ids and len(timesheet_ids) > MAX_STATUS_BATCH_SIZE:
+        return {"status": "error", "error_message": f"At most {MAX_STATUS_BATCH_SIZE} timesheet IDs can be updated at once."}
+
+    conn = get_conn()
+    if not conn:
+        TOOL_LOG.error("tool_update_timesheet_status_batch failed: Database connection not available.")
+        return {"status": "error", "error_message": "Database connection not available"}
+
+    try:
+        outcome = update_timesheet_statuses(
+            conn, manager_id, new_status, timesheet_ids=timesheet_ids or None,
+            employee_id=employee_id, before_date=before_date
+        )
+        skipped = len(outcome["not_found"]) + len(outcome["not_owned"]) + len(outcome["not_pending"])
+        result = {
+            "status": "success",
+            "message": f"{len(outcome['updated'])} timesheet(s) {new_status}." + (f" {skipped} skipped." if skipped else ""),
+            **outcome,
+        }
+        TOOL_LOG.info("tool_update_timesheet_status_batch executed successfully. Updated %s, skipped %s.", len(outcome['updated']), skipped)
+        return result
+    except Exception as e:
+        TOOL_LOG.error("tool_update_timesheet_status_batch failed with exception: %s", e, exc_info=True)
+        return {
+            "status": "error",
+            "error_message": f"An error occurred during the update process: {e}"
+        }
+
+# --- TOOL 7: Team Hours Report (Manager Role) ---
+
+@instrumented_tool
+def tool_team_hours_report(manager_id: str, start_date: str, end_date: str, group_by: str = "employee",
+                           scope: str = "direct", tool_context: Optional["ToolContext"] = None) -> dict:
+    """
+    Allows a manager to see the approved hours of their direct reports, or their whole org, over a date range.
+
+    Args:
+        manager_id: The unique ID of the manager requesting the report.
+        start_date: First day of the range (YYYY-MM-DD), inclusive.
+        end_date: Last day of the range (YYYY-MM-DD), inclusive.
+        group_by: 'employee' (one total per person), 'day' or 'week' (weeks start on Monday).
+        scope: 'direct' (direct reports) or 'org' (everyone below the manager at any depth).
+        tool_context: Injected by ADK; supplies the session's user context.
+
+    Returns:
+        A dictionary with the report rows (the first REPORT_TOOL_ROW_LIMIT) and totals over all rows.
+        Success: {"status": "success", "group_by": str, "scope": str, "start_date": str, "end_date": str, "rows": list,
+                  "row_count": int, "total_hours": float, "truncated": bool}
+        Error: {"status": "error", "error_message": str}
+    """
+    TOOL_LOG.info("Executing tool: tool_team_hours_report for manager_id: %s, %s to %s by %s (%s)",
+                  manager_id, start_date, end_date, group_by, scope)
+    profile = resolve_profile(manager_id, tool_context)
+    if not profile or profile['role'] != 'Manager':
+        TOOL_LOG.warning("Access denied for tool_team_hours_report. User role is not 'Manager'.")
+        return {
+            "status": "error",
+            "error_message": "ACCESS DENIED: You must have the 'Manager' role to view team reports."
+        }
+    manager_id = profile['id']
+    if group_by not in reporting.REPORT_GROUPINGS:
+        return {"status": "error", "error_message": f"Invalid grouping '{group_by}'. Must be one of {', '.join(reporting.REPORT_GROUPINGS)}."}
+    if scope not in ORG_SCOPES:
+        return {"status": "error", "error_message": f"Invalid scope '{scope}'. Must be one of {', '.join(ORG_SCOPES)}."}
+    error = reporting.validate_report_range(start_date, end_date, reporting.REPORT_MAX_DAYS)
+    if error:
+        return {"status": "error", "error_message": error}
+
+    conn = get_conn()
+    if not conn:
+        TOOL_LOG.error("tool_team_hours_report failed: Database connection not available.")
+        return {"status": "error", "error_message": "Database connection not available"}
+    try:
+        rows, row_count, total_hours = [], 0, 0.0
+        for row in reporting.team_hours_report(conn, start_date, end_date, group_by, manager_id, scope):
+            if row_count < reporting.REPORT_TOOL_ROW_LIMIT:
+                rows.append(row)
+            row_count += 1
+            total_hours += row['hours']
+        TOOL_LOG.info("tool_team_hours_report executed successfully. %s rows, %.2f hours.", row_count, total_hours)
+        return {
+            "status": "success",
+            "group_by": group_by,
+            "scope": scope,
+            "start_date": start_date,
+            "end_date": end_date,
+            "rows": rows,
+            "row_count": row_count,
+            "total_hours": round(total_hours, 2),
+            "truncated": row_count > len(rows),
+        }
+    except Exception as e:
+        TOOL_LOG.error("tool_team_hours_report failed with exception: %s", e, exc_info=True)
+        return {"status": "error", "error_message": f"An error occurred while building the report: {e}"}
+
+# --- Async Tool Variants ---
+# The agent runs tools inside runner.run_async, so a synchronous query would stall
+# every session on the event loop. These variants keep the name, signature and
+# docstring of the sync tool (which ADK uses for the function declaration) and run
+# the DB work on the worker pool, or for the write tools on the write pool, where
+# they wait for their group commit. Inside an agent invocation (a tool_context is
+# passed), results are compacted for the model per TOOL_RESULT_FORMAT.
+
+def _run_on_db_pool(func: Callable[..., Any], writes: bool = False) -> Callable[..., Any]:
+    """Wraps a blocking function into a coroutine function that runs it via run_db (or run_write_tool)."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        result = await (run_write_tool if writes else run_db)(func, *args, **kwargs)
+        tool_context = kwargs.get('tool_context')
+        if tool_context is not None and TOOL_RESULT_FORMAT == "compact" and isinstance(result, dict):
+            result = compact_tool_result(func.__name__, result, tool_context.state)
+        return result
+    return wrapper
+
+tool_view_queries_async = _run_on_db_pool(tool_view_queries)
+tool_submit_timesheet_async = _run_on_db_pool(tool_submit_timesheet, writes=True)
+tool_manager_approval_async = _run_on_db_pool(tool_manager_approval)
+tool_update_timesheet_status_async = _run_on_db_pool(tool_update_timesheet_status, writes=True)
+tool_submit_timesheet_batch_async = _run_on_db_pool(tool_submit_timesheet_batch, writes=True)
+tool_update_timesheet_status_batch_async = _run_on_db_pool(tool_update_timesheet_status_batch, writes=True)
+tool_team_hours_report_async = _run_on_db_pool(tool_team_hours_report)
+
+# The tools the local intent fast path may dispatch to, by tool name.
+FAST_PATH_TOOLS: Dict[str, Callable[..., Any]] = {
+    "tool_view_queries": tool_view_queries_async,
+    "tool_submit_timesheet": tool_submit_timesheet_async,
+    "tool_manager_approval": tool_manager_approval_async,
+    "tool_update_timesheet_status": tool_update_timesheet_status_async,
+}
+
+# --- ADK INTEGRATION: Tool Manager and LLM Router ---
+
+# 1. TOOL SCHEMA DEFINITIONS (The metadata the LLM uses)
+TOOL_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "tool_view_queries": {
+        "function_ref": tool_view_queries,
+        "description": "Retrieves the current user's timesheet dashboard information, including pending sheets, approved hours, and manager contact details. Use for any status or history query.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "user_id": {"type": "string", "description": "The unique ID of the employee querying the data. (Mandatory)"},
+                "page_size": {"type": "integer", "description": "How many recent submissions to return. Defaults to 3."},
+                "page_token": {"type": "string", "description": "The 'next_page_token' from a previous call, to see older submissions."}
+            },
+            "required": ["user_id"]
+        }
+    },
+    "tool_submit_timesheet": {
+        "function_ref": tool_submit_timesheet,
+        "description": "Creates and submits a new timesheet entry for approval. Use for logging or adding hours.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "user_id": {"type": "string", "description": "The unique ID of the employee submitting the sheet. (Mandatory)"},
+                "hours": {"type": "number", "description": "The number of hours to submit (e.g., 8.0)."},
+                "date": {"type": "string", "description": "The date of the submission in YYYY-MM-DD format. Defaults to today."},
+                "task": {"type": "string", "description": "A description of the task performed. Defaults to 'Unspecified project work.'"}
+            },
+            "required": ["user_id", "hours"]
+        }
+    },
+    "tool_manager_approval": {
+        "function_ref": tool_manager_approval,
+        "description": "Retrieves a list of pending timesheets for a manager to review, from their direct reports or their whole org. Requires Manager role.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "manager_id": {"type": "string", "description": "The unique ID of the manager performing the approval. (Mandatory)"},
+                "page_size": {"type": "integer", "description": f"Maximum number of sheets to return (up to {MAX_PAGE_SIZE}). Defaults to {DEFAULT_PAGE_SIZE}."},
+                "page_token": {"type": "string", "description": "The 'next_page_token' from a previous call, to fetch the next page."},
+                "scope": {"type": "string", "description": "'direct' (default): sheets waiting on this manager. 'org': everyone below the manager at any depth."}
+            },
+            "required": ["manager_id"]
+        }
+    },
+    "tool_update_timesheet_status": {
+        "function_ref": tool_update_timesheet_status,
+        "description": "Allows a manager to approve or reject a pending timesheet by its ID. Requires Manager role.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "manager_id": {"type": "string", "description": "The unique ID of the manager performing the action. (Mandatory)"},
+                "timesheet_id": {"type": "string", "description": "The unique ID of the timesheet to update. (Mandatory)"},
+                "new_status": {"type": "string", "description": "The new status to set. Must be 'Approved' or 'Rejected'. (Mandatory)"}
+            },
+            "required": ["manager_id", "timesheet_id", "new_status"]
+        }
+    },
+    "tool_submit_timesheet_batch": {
+        "function_ref": tool_submit_timesheet_batch,
+        "description": "Submits several timesheet entries in one call, e.g. a whole week. Returns the new ID or the error for each entry. Use whenever the user logs more than one day or task at once.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "user_id": {"type": "string", "description": "The unique ID of the employee submitting the sheets. (Mandatory)"},
+                "entries": {
+                    "type": "array",
+                    "description": f"The entries to submit (at most {MAX_BATCH_SIZE}). (Mandatory)",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "hours": {"type": "number", "description": "The number of hours worked (e.g., 8.0)."},
+                            "date": {"type": "string", "description": "The date of work in YYYY-MM-DD format. Defaults to today."},
+                            "task": {"type": "string", "description": "A description of the task performed. Defaults to 'Unspecified project work.'"}
+                        },
+                        "required": ["hours"]
+                    }
+                }
+            },
+            "required": ["user_id", "entries"]
+        }
+    },
+    "tool_update_timesheet_status_batch": {
+        "function_ref": tool_update_timesheet_status_batch,
+        "description": "Approves or rejects many pending timesheets at once, by ID list or by filter (all pending for an employee and/or before a date). Reports updated, not found, not owned and no-longer-pending IDs. Requires Manager role.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "manager_id": {"type": "string", "description": "The unique ID of the manager performing the action. (Mandatory)"},
+                "new_status": {"type": "string", "description": "The new status to set. Must be 'Approved' or 'Rejected'. (Mandatory)"},
+                "timesheet_ids": {"type": "array", "items": {"type": "string"}, "description": f"The IDs of the timesheets to update (at most {MAX_STATUS_BATCH_SIZE})."},
+                "employee_id": {"type": "string", "description": "Without IDs: only update pending sheets of this employee."},
+                "before_date": {"type": "string", "description": "Without IDs: only update pending sheets dated before this day (YYYY-MM-DD)."}
+            },
+            "required": ["manager_id", "new_status"]
+        }
+    },
+    "tool_team_hours_report": {
+        "function_ref": tool_team_hours_report,
+        "description": "Reports the approved hours of a manager's direct reports, or whole org, over a date range, per employee, per day or per week. Requires Manager role.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "manager_id": {"type": "string", "description": "The unique ID of the manager requesting the report. (Mandatory)"},
+                "start_date": {"type": "string", "description": "First day of the range, YYYY-MM-DD, inclusive. (Mandatory)"},
+                "end_date": {"type": "string", "description": f"Last day of the range, YYYY-MM-DD, inclusive; at most {reporting.REPORT_MAX_DAYS} days after the start. (Mandatory)"},
+                "group_by": {"type": "string", "description": "'employee' (default), 'day' or 'week' (weeks start on Monday)."},
+                "scope": {"type": "string", "description": "'direct' (default): direct reports only. 'org': everyone below the manager at any depth."}
+            },
+            "required": ["manager_id", "start_date", "end_date"]
+        }
+    }
+}
+
+# --- Agent, Session Service and Runner (built lazily) ---
+
+_AGENT: Optional["LlmAgent"] = None
+_SESSION_SERVICE: Optional["BaseSessionService"] = None
+_RUNNER: Optional["Runner"] = None
+
+def build_model() -> "BaseLlm":
+    """
+    Creates the model selected by MODEL_BACKEND.
+
+    For Gemini, GOOGLE_API_KEY is loaded from the .env file next to this module,
+    and calls go through the process-wide model-call scheduler (MODEL_SCHEDULER).
+    """
+    if MODEL_BACKEND == "local":
+        return build_local_model()
+    if MODEL_BACKEND != "gemini":
+        raise ValueError(f"Unknown TIMESHEET_MODEL_BACKEND '{MODEL_BACKEND}'. Must be 'gemini' or 'local'.")
+
+    from dotenv import load_dotenv
+    from google.adk.models.google_llm import Gemini
+
+    load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+    if not os.getenv("GOOGLE_API_KEY"):
+        MODEL_LOG.warning("GOOGLE_API_KEY is not set; Gemini calls will fail.")
+
+    # No client-side retry options: the model-call scheduler retries throttled calls
+    # with jittered, process-wide backoff instead of each call on its own schedule.
+    return limit_model_calls(Gemini(model=MODEL_NAME))
+
+# --- Persistent Sessions ---
+# Conversations are stored in the timesheet database (chat_* tables), so they
+# survive restarts. Each session keeps at most SESSION_HISTORY_LIMIT events. When
+# a new turn starts, whole older turns beyond the limit are folded into a short
+# text summary, which the model sees as the first event of the session. So the
+# prompt stops growing with the conversation. Recently used sessions are kept in
+# an LRU cache; idle ones are evicted and reloaded from the database on demand.
+# Writes go through this process's cache, so one process should own the sessions.
+
+SESSION_STORE = os.getenv("TIMESHEET_SESSION_STORE", "sqlite")  # "sqlite" (persistent) or "memory"
+SESSION_HISTORY_LIMIT = int(os.getenv("TIMESHEET_SESSION_HISTORY_LIMIT", "40"))  # Events kept per session before compaction
+SESSION_SUMMARY_CHARS = 2000  # Longest summary of compacted turns; the oldest lines are dropped first
+SESSION_SUMMARY_LINE_CHARS = 160  # Each summarised message is cut to this length
+SESSION_CACHE_SIZE = 256  # Sessions (and user/app states) kept in memory
+SESSION_SUMMARY_EVENT_ID = "history-summary"
+
+_SESSION_SERVICE_CLASS = None
+
+def split_state_delta(delta: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """Splits a state delta into (app, user, session) parts, with the prefixes removed. 'temp:' keys are dropped."""
+    app_delta, user_delta, session_delta = {}, {}, {}
+    for key, value in delta.items():
+        if key.startswith('app:'):
+            app_delta[key[len('app:'):]] = value
+        elif key.startswith('user:'):
+            user_delta[key[len('user:'):]] = value
+        elif not key.startswith('temp:'):
+            session_delta[key] = value
+    return app_delta, user_delta, session_delta
+
+def is_turn_start(event: Any) -> bool:
+    """True for a user message with text: the first event of a turn."""
+    return (event.author == 'user' and event.content is not None
+            and any(part.text for part in event.content.parts or []))
+
+def summarize_events(events: Sequence[Any]) -> List[str]:
+    """Returns one summary line per message, tool call and tool result in `events`."""
+    lines = []
+    for event in events:
+        for part in (event.content.parts or []) if event.content else []:
+            if part.text:
+                speaker = "User" if event.author == 'user' else "Assistant"
+                lines.append(f"{speaker}: {shorten(' '.join(part.text.split()), SESSION_SUMMARY_LINE_CHARS)}")
+            elif part.function_call:
+                lines.append(f"Assistant called {part.function_call.name}({json.dumps(part.function_call.args, default=str)[:80]})")
+            elif part.function_response:
+                response = part.function_response.response or {}
+                outcome = response.get('message') or response.get('error_message') or response.get('status')
+                lines.append(f"{part.function_response.name} returned: {shorten(str(outcome), SESSION_SUMMARY_LINE_CHARS)}")
+    return lines
+
+def merge_summary(summary: str, lines: Sequence[str], limit: int = SESSION_SUMMARY_CHARS) -> str:
+    """Appends `lines` to `summary`, dropping the oldest lines to stay within `limit` characters."""
+    merged = [line for line in summary.split("\n") if line] + list(lines)
+    while merged and sum(len(line) + 1 for line in merged) > limit:
+        merged.pop(0)
+    return "\n".join(merged)
+
+def _session_service_class() -> type:
+    """Defines SqliteSessionService on first use, so that importing this module does not import ADK."""
+    global _SESSION_SERVICE_CLASS
+    if _SESSION_SERVICE_CLASS is not None:
+        return _SESSION_SERVICE_CLASS
+
+    from google.genai import types
+    from google.adk.errors.already_exists_error import AlreadyExistsError
+    from google.adk.errors.session_not_found_error import SessionNotFoundError
+    from google.adk.events import Event
+    from google.adk.sessions import BaseSessionService, Session
+    from google.adk.sessions.base_session_service import ListSessionsResponse
+
+    class SqliteSessionService(BaseSessionService):
+        """Session service backed by the timesheet database, with bounded history and an LRU session cache."""
+
+        def __init__(self, history_limit: int = SESSION_HISTORY_LIMIT, cache_size: int = SESSION_CACHE_SIZE):
+            self.history_limit = history_limit
+            # (app, user, session) -> [Session with stored events only, summary]
+            self.sessions = LRUCache(cache_size)
+            # ('app', app) or ('user', app, user) -> state dict
+            self.shared_states = LRUCache(cache_size)
+            self.compactions = 0
+
+        # Blocking helpers, run on the DB worker pool.
+
+        @staticmethod
+        def _insert_session(app_name, user_id, session_id, state, app_delta, user_delta, now) -> None:
+            conn = get_conn()
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT INTO chat_sessions (app_name, user_id, id, state, summary, create_time, update_time) "
+                        "VALUES (?, ?, ?, ?, '', ?, ?)", (app_name, user_id, session_id, json.dumps(state), now, now))
+                    SqliteSessionService._write_shared(conn, app_name, user_id, app_delta, user_delta)
+            except sqlite3.IntegrityError:
+                raise AlreadyExistsError(f"Session with id {session_id} already exists.")
+
+        @staticmethod
+        def _write_shared(conn, app_name, user_id, app_state, user_state) -> None:
+            if app_state is not None:
+                conn.execute("INSERT INTO chat_app_states (app_name, state) VALUES (?, ?) "
+                             "ON CONFLICT (app_name) DO UPDATE SET state = excluded.state", (app_name, json.dumps(app_state)))
+            if user_state is not None:
+                conn.execute("INSERT INTO chat_user_states (app_name, user_id, state) VALUES (?, ?, ?) "
+                             "ON CONFLICT (app_name, user_id) DO UPDATE SET state = excluded.state",
+                             (app_name, user_id, json.dumps(user_state)))
+
+        @staticmethod
+        def _load_session(app_name, user_id, session_id) -> Optional[list]:
+            conn = get_conn()
+            row = conn.execute("SELECT state, summary, update_time FROM chat_sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+                               (app_name, user_id, session_id)).fetchone()
+            if row is None:
+                return None
+            events = [Event.model_validate_json(data) for (data,) in conn.execute(
+                "SELECT event FROM chat_events WHERE app_name = ? AND user_id = ? AND session_id = ? ORDER BY seq",
+                (app_name, user_id, session_id))]
+            session = Session(app_name=app_name, user_id=user_id, id=session_id, state=json.loads(row[0]),
+                              events=events, last_update_time=row[2])
+            return [session, row[1]]
+
+        @staticmethod
+        def _load_shared(key: tuple) -> Dict[str, Any]:
+            conn = get_conn()
+            if key[0] == 'app':
+                row = conn.execute("SELECT state FROM chat_app_states WHERE app_name = ?", key[1:]).fetchone()
+            else:
+                row = conn.execute("SELECT state FROM chat_user_states WHERE app_name = ? AND user_id = ?", key[1:]).fetchone()
+            return json.loads(row[0]) if row else {}
+
+        @staticmethod
+        def _store_event(app_name, user_id, session_id, event_json, event_id, timestamp, state, summary,
+                         dropped_ids, app_state, user_state) -> None:
+            conn = get_conn()
+            with conn:
+                conn.execute(
+                    "INSERT INTO chat_events (app_name, user_id, session_id, event_id, timestamp, event) VALUES (?, ?, ?, ?, ?, ?)",
+                    (app_name, user_id, session_id, event_id, timestamp, event_json))
+                conn.execute("UPDATE chat_sessions SET state = ?, summary = ?, update_time = ? "
+                             "WHERE app_name = ? AND user_id = ? AND id = ?",
+                             (json.dumps(state), summary, timestamp, app_name, user_id, session_id))
+                if dropped_ids:
+                    conn.executemany("DELETE FROM chat_events WHERE app_name = ? AND user_id = ? AND session_id = ? AND event_id = ?",
+                                     [(app_name, user_id, session_id, event_id) for event_id in dropped_ids])
+                SqliteSessionService._write_shared(conn, app_name, user_id, app_state, user_state)
+
+        @staticmethod
+        def _list_sessions(app_name, user_id) -> list:
+            query = "SELECT user_id, id, state, update_time FROM chat_sessions WHERE app_name = ?"
+            params: list = [app_name]
+            if user_id is not None:
+                query += " AND user_id = ?"
+                params.append(user_id)
+            return get_conn().execute(query + " ORDER BY update_time", params).fetchall()
+
+        @staticmethod
+        def _delete_session(app_name, user_id, session_id) -> None:
+            conn = get_conn()
+            with conn:
+                conn.execute("DELETE FROM chat_events WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                             (app_name, user_id, session_id))
+                conn.execute("DELETE FROM chat_sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+                             (app_name, user_id, session_id))
+
+        # Cache access.
+
+        async def _entry(self, app_name: str, user_id: str, session_id: str) -> Optional[list]:
+            key = (app_name, user_id, session_id)
+            entry = self.sessions.get(key)
+            if entry is None:
+                generation = self.sessions.generation
+                entry = await run_db(self._load_session, app_name, user_id, session_id)
+                if entry is not None:
+                    self.sessions.put(key, entry, generation)
+            return entry
+
+        async def _shared(self, key: tuple) -> Dict[str, Any]:
+            state = self.shared_states.get(key)
+            if state is None:
+                state = await run_db(self._load_shared, key)
+                self.shared_states.put(key, state)
+            return state
+
+        async def _view(self, entry: list, config: Any = None) -> "Session":
+            """Returns a copy of a cached session with the summary event and the app/user state merged in."""
+            stored, summary = entry
+            events = list(stored.events)
+            if config is not None and config.num_recent_events is not None:
+                events = events[-config.num_recent_events:] if config.num_recent_events else []
+            if config is not None and config.after_timestamp is not None:
+                events = [event for event in events if event.timestamp >= config.after_timestamp]
+            if summary and (config is None or len(events) == len(stored.events)):
+                first = events[0].timestamp if events else stored.last_update_time
+                events.insert(0, Event(
+                    id=SESSION_SUMMARY_EVENT_ID, invocation_id=SESSION_SUMMARY_EVENT_ID, author='user',
+                    timestamp=first - 0.001,
+                    content=types.Content(role='user', parts=[types.Part(text=f"[Summary of the earlier conversation]\n{summary}")]),
+                ))
+            session = Session(app_name=stored.app_name, user_id=stored.user_id, id=stored.id,
+                              state=copy.deepcopy(stored.state), events=[event.model_copy(deep=True) for event in events],
+                              last_update_time=stored.last_update_time)
+            for key, value in (await self._shared(('app', stored.app_name))).items():
+                session.state['app:' + key] = copy.deepcopy(value)
+            for key, value in (await self._shared(('user', stored.app_name, stored.user_id))).items():
+                session.state['user:' + key] = copy.deepcopy(value)
+            return session
+
+        # BaseSessionService API.
+
+        async def create_session(self, *, app_name: str, user_id: str, state: Optional[Dict[str, Any]] = None,
+                                 session_id: Optional[str] = None) -> "Session":
+            session_id = (session_id or "").strip() or str(uuid4())
+            app_delta, user_delta, session_state = split_state_delta(state or {})
+            app_state = {**await self._shared(('app', app_name)), **app_delta} if app_delta else None
+            user_state = {**await self._shared(('user', app_name, user_id)), **user_delta} if user_delta else None
+            now = time.time()
+            await run_db(self._insert_session, app_name, user_id, session_id, session_state, app_state, user_state, now)
+            if app_state is not None:
+                self.shared_states.put(('app', app_name), app_state)
+            if user_state is not None:
+                self.shared_states.put(('user', app_name, user_id), user_state)
+            entry = [Session(app_name=app_name, user_id=user_id, id=session_id, state=session_state, last_update_time=now), ""]
+            self.sessions.put((app_name, user_id, session_id), entry)
+            return await self._view(entry)
+
+        async def get_session(self, *, app_name: str, user_id: str, session_id: str, config: Any = None) -> Optional["Session"]:
+            entry = await self._entry(app_name, user_id, session_id)
+            return await self._view(entry, config) if entry is not None else None
+
+        async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> "ListSessionsResponse":
+            rows = await run_db(self._list_sessions, app_name, user_id)
+            return ListSessionsResponse(sessions=[
+                Session(app_name=app_name, user_id=row[0], id=row[1], state=json.loads(row[2]), last_update_time=row[3])
+                for row in rows
+            ])
+
+        async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+            await run_db(self._delete_session, app_name, user_id, session_id)
+            self.sessions.invalidate((app_name, user_id, session_id))
+
+        async def get_user_state(self, *, app_name: str, user_id: str) -> Dict[str, Any]:
+            return copy.deepcopy(await self._shared(('user', app_name, user_id)))
+
+        async def append_event(self, session: "Session", event: "Event") -> "Event":
+            if event.partial:
+                return event
+            entry = await self._entry(session.app_name, session.user_id, session.id)
+            if entry is None:
+                raise SessionNotFoundError(f"Session {session.id} not found.")
+            event = await super().append_event(session=session, event=event)
+            session.last_update_time = event.timestamp
+            stored = entry[0]
+
+            app_delta, user_delta, session_delta = split_state_delta(
+                event.actions.state_delta if event.actions and event.actions.state_delta else {})
+            stored.state.update(session_delta)
+            app_state = {**await self._shared(('app', session.app_name)), **app_delta} if app_delta else None
+            user_state = {**await self._shared(('user', session.app_name, session.user_id)), **user_delta} if user_delta else None
+
+            stored.events.append(event.model_copy(deep=True))
+            stored.last_update_time = event.timestamp
+            dropped: List[Any] = []
+            if is_turn_start(event) and len(stored.events) > self.history_limit:
+                # Keep the longest tail of whole turns that fits in the limit.
+                cut = next(index for index in range(len(stored.events) - self.history_limit, len(stored.events))
+                           if is_turn_start(stored.events[index]))
+                dropped, stored.events = stored.events[:cut], stored.events[cut:]
+                entry[1] = merge_summary(entry[1], summarize_events(dropped))
+                self.compactions += 1
+                # The caller's copy feeds the model for this turn: compact it the same way.
+                dropped_ids = {old.id for old in dropped} | {SESSION_SUMMARY_EVENT_ID}
+                session.events[:] = (await self._view(entry)).events[:1] + [
+                    kept for kept in session.events if kept.id not in dropped_ids]
+
+            await run_db(self._store_event, session.app_name, session.user_id, session.id,
+                         event.model_dump_json(exclude_none=True), event.id, event.timestamp, stored.state, entry[1],
+                         [old.id for old in dropped], app_state, user_state)
+            if app_state is not None:
+                self.shared_states.put(('app', session.app_name), app_state)
+            if user_state is not None:
+                self.shared_states.put(('user', session.app_name, session.user_id), user_state)
+            return event
+
+    _SESSION_SERVICE_CLASS = SqliteSessionService
+    return SqliteSessionService
+
+def build_session_service(**settings: Any) -> "BaseSessionService":
+    """
+    Creates a SqliteSessionService on the timesheet database.
+
+    `settings` override history_limit and cache_size.
+    """
+    return _session_service_class()(**settings)
+
+# --- Local Model Backend ---
+# A deterministic, offline stand-in for Gemini, for load tests and CI runs of the
+# full Runner and tool dispatch path. It picks a tool from keywords in the user's
+# message, calls it with the session user's ID, and then summarises the tool's
+# response as text.
+
+LOCAL_MODEL_LATENCY_MS = float(os.getenv("TIMESHEET_LOCAL_MODEL_LATENCY_MS", "0"))  # Simulated wait before the first chunk
+LOCAL_MODEL_CHUNK_CHARS = int(os.getenv("TIMESHEET_LOCAL_MODEL_CHUNK_CHARS", "16"))  # Characters per streamed chunk
+LOCAL_MODEL_CHUNK_DELAY_MS = float(os.getenv("TIMESHEET_LOCAL_MODEL_CHUNK_DELAY_MS", "0"))  # Simulated wait between chunks
+
+_LOCAL_MODEL_CLASS = None
+
+def local_model_call(text: str, user_id: str, role: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    Returns the (tool name, arguments) the local model calls for a user message, or None to reply in text.
+
+    The first matching rule wins: an approve/reject with a timesheet ID, a
+    request to submit hours, a manager asking about pending approvals, then any
+    question about status, hours or history.
+    """
+    lowered = text.lower()
+    sheet = re.search(r"\b(t\d+|ts-[\w-]+|synth-\d+|bulk-\d+|[0-9a-f]{8}-[0-9a-f-]{27})\b", text)
+    if sheet and re.search(r"\b(approve|reject)", lowered):
+        status = 'Rejected' if 'reject' in lowered else 'Approved'
+        return "tool_update_timesheet_status", {"manager_id": user_id, "timesheet_id": sheet.group(1), "new_status": status}
+    hours = re.search(r"(\d+(?:\.\d+)?)\s*(?:h\b|hours?\b)", lowered)
+    if hours and re.search(r"\b(submit|log|add|record)", lowered):
+        return "tool_submit_timesheet", {"user_id": user_id, "hours": float(hours.group(1))}
+    if role == 'Manager' and re.search(r"\b(pending|approv|review)", lowered):
+        return "tool_manager_approval", {"manager_id": user_id}
+    if re.search(r"\b(status|dashboard|hours|history|recent|summary)", lowered):
+        return "tool_view_queries", {"user_id": user_id}
+    return None
+
+def local_model_reply(tool_name: Optional[str], response: Optional[Dict[str, Any]]) -> str:
+    """Returns the text the local model answers with, given the tool response it received (if any)."""
+    if response is None:
+        return ("I can show your timesheet dashboard, submit hours, or, for managers, list and approve "
+                "pending timesheets. What would you like to do?")
+    return render_tool_result(tool_name, response)
+
+def _local_model_class() -> type:
+    """Defines LocalModel on first use, so that importing this module does not import ADK."""
+    global _LOCAL_MODEL_CLASS
+    if _LOCAL_MODEL_CLASS is not None:
+        return _LOCAL_MODEL_CLASS
+
+    import asyncio
+    from google.genai import types
+    from google.adk.models.base_llm import BaseLlm
+    from google.adk.models.llm_response import LlmResponse
+
+    def usage(prompt_chars: int, reply_chars: int) -> "types.GenerateContentResponseUsageMetadata":
+        # Roughly four characters per token, so token-based accounting has numbers to work with.
+        prompt_tokens, reply_tokens = prompt_chars // 4, max(1, reply_chars // 4)
+        return types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_tokens, candidates_token_count=reply_tokens,
+            total_token_count=prompt_tokens + reply_tokens,
+        )
+
+    class LocalModel(BaseLlm):
+        """Deterministic offline model: keyword-routed tool calls, templated replies, simulated latency and streaming."""
+
+        latency_ms: float = LOCAL_MODEL_LATENCY_MS
+        chunk_chars: int = LOCAL_MODEL_CHUNK_CHARS
+        chunk_delay_ms: float = LOCAL_MODEL_CHUNK_DELAY_MS
+        calls: int = 0  # Requests served, for load drivers
+        busy_seconds: float = 0.0  # Time spent producing responses, simulated waits included
+
+        async def generate_content_async(self, llm_request, stream: bool = False):
+            # Only time spent producing each response counts as model time, not the
+            # time the caller takes to consume it (which includes running tools).
+            responses = self._respond(llm_request, stream)
+            while True:
+                start = time.perf_counter()
+                try:
+                    response = await responses.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    self.busy_seconds += time.perf_counter() - start
+                yield response
+            self.calls += 1
+
+        async def _respond(self, llm_request, stream: bool):
+            instruction = str(llm_request.config.system_instruction or "")
+            user_match = re.search(r"User ID: (\S+)", instruction)
+            role_match = re.search(r"User Role: (\S+)", instruction)
+            user_id = user_match.group(1) if user_match else USER_ID
+            role = role_match.group(1) if role_match else 'Employee'
+            prompt_chars = len(instruction) + sum(len(str(content)) for content in llm_request.contents)
+
+            last = llm_request.contents[-1] if llm_request.contents else None
+            parts = (last.parts or []) if last else []
+            function_response = next((p.function_response for p in parts if p.function_response), None)
+            if self.latency_ms:
+                await asyncio.sleep(self.latency_ms / 1000)
+
+            if function_response is None:
+                text = " ".join(p.text for p in parts if p.text)
+                call = local_model_call(text, user_id, role)
+                if call is not None:
+                    name, args = call
+                    part = types.Part(function_call=types.FunctionCall(name=name, args=args))
+                    yield LlmResponse(content=types.Content(role="model", parts=[part]),
+                                      usage_metadata=usage(prompt_chars, len(json.dumps(args))))
+                    return
+                reply = local_model_reply(None, None)
+            else:
+                reply = local_model_reply(function_response.name, function_response.response or {})
+
+            if stream and self.chunk_chars > 0:
+                for offset in range(0, len(reply), self.chunk_chars):
+                    if offset and self.chunk_delay_ms:
+                        await asyncio.sleep(self.chunk_delay_ms / 1000)
+                    chunk = types.Part(text=reply[offset:offset + self.chunk_chars])
+                    yield LlmResponse(content=types.Content(role="model", parts=[chunk]), partial=True)
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=reply)]),
+                              usage_metadata=usage(prompt_chars, len(reply)))
+
+    _LOCAL_MODEL_CLASS = LocalModel
+    return LocalModel
+
+def build_local_model(**settings: Any) -> "BaseLlm":
+    """
+    Creates the offline LocalModel.
+
+    `settings` override the TIMESHEET_LOCAL_MODEL_* defaults: latency_ms,
+    chunk_chars and chunk_delay_ms.
+    """
+    return _local_model_class()(model="local", **settings)
+
+def build_agent(model: Optional["BaseLlm"] = None) -> "LlmAgent":
+    """Creates the timesheet agent with its custom function tools. Uses build_model() if no model is given."""
+    from google.adk.agents import LlmAgent
+
+    # agent with custom function tools
+    return LlmAgent(
+        name="timesheet_agent",
+        model=model or build_model(),
+        instruction=session_instruction,
+        tools=[
+            tool_view_queries_async,
+            tool_submit_timesheet_async,
+            tool_manager_approval_async,
+            tool_update_timesheet_status_async,
+            tool_submit_timesheet_batch_async,
+            tool_update_timesheet_status_batch_async,
+            tool_team_hours_report_async
+        ],
+        **model_callbacks(),
+    )
+
+def get_agent() -> "LlmAgent":
+    """Returns the process-wide timesheet agent, building it on first use."""
+    global _AGENT
+    if _AGENT is None:
+        _AGENT = build_agent()
+    return _AGENT
+
+def get_session_service() -> "BaseSessionService":
+    """Returns the process-wide session service selected by SESSION_STORE, creating it on first use."""
+    global _SESSION_SERVICE
+    if _SESSION_SERVICE is None:
+        if SESSION_STORE == "sqlite":
+            _SESSION_SERVICE = build_session_service()
+        else:
+            from google.adk.sessions import InMemorySessionService
+            # InMemorySessionService stores conversations in RAM (temporary)
+            _SESSION_SERVICE = InMemorySessionService()
+    return _SESSION_SERVICE
+
+def get_runner() -> "Runner":
+    """Returns the process-wide Runner for the agent and session service, creating it on first use."""
+    global _RUNNER
+    if _RUNNER is None:
+        from google.adk.runners import Runner
+        _RUNNER = Runner(agent=get_agent(), app_name=APP_NAME, session_service=get_session_service())
+    return _RUNNER
+
+# Module attributes that used to be built at import time, now built on first access.
+_LAZY_ATTRIBUTES: Dict[str, Callable[[], Any]] = {
+    "timesheet_agent": get_agent,
+    "root_agent": get_agent,  # The name `adk web` / `adk run` look for.
+    "session_service": get_session_service,
+    "runner": get_runner,
+}
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# --- Model Call Scheduler ---
+# Every Gemini call in the process goes through MODEL_SCHEDULER, which admits
+# calls under three limits: a token bucket sized to the project's requests-per-
+# minute quota, a concurrency limit that halves when the API answers 429 or 503
+# and grows back by one call per limit's worth of successes (AIMD), and fair
+# queuing, serving waiting sessions round-robin so one busy session cannot
+# starve the others. The scheduler also owns retries: a throttled or failed call
+# goes back in its session's queue after a short, jittered delay, rather than
+# each call sleeping through its own exponential schedule in lockstep with the
+# others. Identical requests in flight at the same time (a repeated message,
+# a client that resubmits) share one upstream call.
+
+MODEL_RPM = float(os.getenv("TIMESHEET_MODEL_RPM", "4000"))  # Requests per minute the quota allows; 0 disables the token bucket
+MODEL_BURST = int(os.getenv("TIMESHEET_MODEL_BURST", "100"))  # Requests the bucket admits back to back after a quiet spell
+MODEL_MAX_CONCURRENCY = int(os.getenv("TIMESHEET_MODEL_MAX_CONCURRENCY", "8"))  # Ceiling of the adaptive concurrency limit
+MODEL_RETRY_ATTEMPTS = int(os.getenv("TIMESHEET_MODEL_RETRY_ATTEMPTS", "4"))  # Tries per call, the first included
+MODEL_RETRY_BASE_SECONDS = 0.5  # Retry n waits a random time up to base * 2**(n-1)...
+MODEL_RETRY_MAX_SECONDS = 8.0  # ...but never more than this
+MODEL_RETRY_CODES = (429, 500, 503, 504)  # HTTP statuses worth retrying
+MODEL_THROTTLE_CODES = (429, 503)  # Statuses that also shrink the concurrency limit
+MODEL_BACKOFF_FACTOR = 0.5  # Concurrency limit multiplier on throttling
+MODEL_BACKOFF_INTERVAL_SECONDS = 1.0  # At most one cut per interval: a burst of 429s is one signal
+MODEL_COALESCE = os.getenv("TIMESHEET_MODEL_COALESCE", "1") != "0"
+MODEL_WAIT_SAMPLES = 1000  # Recent queue waits kept for the percentiles in stats()
+
+_MODEL_QUEUE_KEY: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar("timesheet_model_queue", default=None)
+
+def model_error_status(error: BaseException) -> Optional[int]:
+    """Returns the HTTP status of a failed model call (google.genai errors carry it as `code`), or None."""
+    status = getattr(error, "code", None)
+    return status if isinstance(status, int) else None
+
+def model_queue_key(llm_request: Any) -> str:
+    """
+    Returns the queue a model request waits in: the session set by stream_turn,
+    or else the user named in the system instruction.
+    """
+    key = _MODEL_QUEUE_KEY.get()
+    if key:
+        return key
+    config = getattr(llm_request, "config", None)
+    match = re.search(r"User ID: (\S+)", str(getattr(config, "system_instruction", None) or ""))
+    return match.group(1) if match else USER_ID
+
+def model_request_key(llm_request: Any, stream: bool) -> Optional[str]:
+    """Returns a digest that is equal for identical model requests, or None if the request cannot be serialised."""
+    try:
+        payload = llm_request.model_dump_json(
+            exclude={"tools_dict": True, "live_connect_config": True, "config": {"http_options": True}})
+    except Exception:
+        return None
+    return hashlib.sha256(f"{stream}:{payload}".encode()).hexdigest()
+
+class _ModelFlight:
+    """One upstream model call and the responses it has produced so far, shared by every caller waiting on it."""
+
+    def __init__(self, loop: Any):
+        self.responses: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Any = None
+        self._loop = loop
+        self.changed = loop.create_future()  # Resolved, and replaced, whenever a response or the end arrives
+
+    def _notify(self) -> None:
+        self.changed.set_result(None)
+        self.changed = self._loop.create_future()
+
+    def push(self, response: Any) -> None:
+        self.responses.append(response)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.done, self.error = True, error
+        self._notify()
+
+class ModelScheduler:
+    """
+    Admits model calls under a token bucket, an adaptive concurrency limit and
+    round-robin queuing per session, retries throttled calls and coalesces
+    identical ones.
+
+    All state belongs to the running event loop. If calls arrive on a different
+    loop (e.g. after another asyncio.run), the queues are reset.
+    """
+
+    def __init__(self, rpm: float = MODEL_RPM, burst: int = MODEL_BURST, max_concurrency: int = MODEL_MAX_CONCURRENCY,
+                 attempts: int = MODEL_RETRY_ATTEMPTS, coalesce: bool = MODEL_COALESCE):
+        self.rpm = rpm
+        self.burst = burst
+        self.attempts = max(1, attempts)
+        self.coalesce = coalesce
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(self.max_concurrency)  # Current adaptive limit, between 1 and max_concurrency
+        self.tokens = float(burst)
+        self.active = 0
+        self._refilled = time.monotonic()
+        self._last_cut = 0.0
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()  # session key -> waiting futures, in serving order
+        self._flights: Dict[str, _ModelFlight] = {}  # request digest -> call in flight
+        self._loop: Any = None
+        self._wakeup: Any = None  # Timer that resumes dispatch once the bucket has a token again
+        self._waits: deque = deque(maxlen=MODEL_WAIT_SAMPLES)
+        self._wait_max = 0.0
+        self.counters = {"requests": 0, "coalesced": 0, "attempts": 0, "retries": 0, "throttled": 0, "failed": 0}
+
+    def set_max_concurrency(self, max_calls: int) -> None:
+        self.max_concurrency = max(1, max_calls)
+        self.limit = float(self.max_concurrency)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the counters, the current limit and queue, and queue-wait percentiles over recent calls."""
+        waits = sorted(self._waits)
+
+        def percentile(fraction: float) -> float:
+            return round(waits[min(len(waits) - 1, int(fraction * len(waits)))] * 1000, 1) if waits else 0.0
+
+        return {
+            **self.counters,
+            "limit": round(self.limit, 2),
+            "active": self.active,
+            "queued": sum(1 for waiters in self._queues.values() for waiter in waiters if not waiter.done()),
+            "wait_p50_ms": percentile(0.50),
+            "wait_p95_ms": percentile(0.95),
+            "wait_max_ms": round(self._wait_max * 1000, 1),
+        }
+
+    async def generate(self, key: str, request_key: Optional[str],
+                       call: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """
+        Yields the responses of `call()`, run when the scheduler admits it from queue `key`.
+
+        Callers with the same non-empty `request_key` while a call is in flight
+        share it, and each of them, the first included, receives its own copies
+        of the responses. The upstream call runs as its own task and is
+        cancelled only when every caller has gone.
+        """
+        import asyncio
+
+        self._bind()
+        self.counters["requests"] += 1
+        flight = self._flights.get(request_key) if request_key else None
+        if flight is not None:
+            self.counters["coalesced"] += 1
+        else:
+            flight = _ModelFlight(self._loop)
+            if request_key:
+                self._flights[request_key] = flight
+            flight.task = self._loop.create_task(self._run(flight, key, request_key, call))
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(flight.responses):
+                    response = flight.responses[index]
+                    index += 1
+                    # The agent annotates the responses it receives, so the stored responses of a shareable
+                    # call stay pristine and every caller gets its own copy. Without a key no one can join.
+                    yield copy.deepcopy(response) if request_key else response
+                if flight.done:
+                    break
+                await asyncio.shield(flight.changed)
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            flight.subscribers -= 1
+            if not flight.subscribers and not flight.done:
+                # Every caller has gone (e.g. their clients disconnected): stop the upstream call.
+                flight.task.cancel()
+                if request_key and self._flights.get(request_key) is flight:
+                    del self._flights[request_key]
+
+    async def _run(self, flight: _ModelFlight, key: str, request_key: Optional[str],
+                   call: Callable[[], AsyncIterator[Any]]) -> None:
+        import asyncio
+
+        retries = 0
+        try:
+            for attempt in range(self.attempts):
+                queued = time.perf_counter()
+                await self._acquire(key)
+                self._record_wait(time.perf_counter() - queued)
+                self.counters["attempts"] += 1
+                outcome, status = "failed", None
+                try:
+                    responses = call()
+                    try:
+                        async for response in responses:
+                            flight.push(copy.deepcopy(response) if request_key else response)
+                    finally:
+                        await responses.aclose()
+                    outcome = "succeeded"
+                except Exception as e:
+                    status = model_error_status(e)
+                    if status in MODEL_THROTTLE_CODES:
+                        outcome = "throttled"
+                        self.counters["throttled"] += 1
+                    # A call that already produced output cannot be replayed without duplicating it.
+                    if status not in MODEL_RETRY_CODES or flight.responses or attempt + 1 == self.attempts:
+                        raise
+                finally:
+                    self._release(outcome)
+                if outcome == "succeeded":
+                    break
+                retries += 1
+                self.counters["retries"] += 1
+                delay = random.uniform(0, min(MODEL_RETRY_MAX_SECONDS, MODEL_RETRY_BASE_SECONDS * 2 ** attempt))
+                MODEL_LOG.info("Model call failed with HTTP %s; retry %s in %.2fs.", status, retries, delay)
+                await asyncio.sleep(delay)
+            flight.finish()
+        except asyncio.CancelledError as e:
+            flight.finish(e)
+        except Exception as e:
+            self.counters["failed"] += 1
+            flight.finish(e)
+        finally:
+            if INSTRUMENTATION_ENABLED:
+                observe("timesheet_model_retries", retries, CARDINALITY_BUCKETS)
+            if request_key and self._flights.get(request_key) is flight:
+                del self._flights[request_key]
+
+    def _bind(self) -> None:
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Waiters and calls of a previous event loop can never complete; start afresh.
+            self._loop, self._queues, self._flights, self._wakeup, self.active = loop, OrderedDict(), {}, None, 0
+
+    async def _acquire(self, key: str) -> None:
+        import asyncio
+
+        waiter = self._loop.create_future()
+        self._queues.setdefault(key, deque()).append(waiter)
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release("failed")  # Admitted, but cancelled before it could start
+            raise
+
+    def _release(self, outcome: str) -> None:
+        self.active -= 1
+        if outcome == "succeeded":
+            self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+        elif outcome == "throttled":
+            now = time.monotonic()
+            if now - self._last_cut >= MODEL_BACKOFF_INTERVAL_SECONDS:
+                self._last_cut = now
+                self.limit = max(1.0, self.limit * MODEL_BACKOFF_FACTOR)
+                self.tokens = min(self.tokens, 0.0)  # Spend the burst: admit calls at the quota rate only
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Admits waiting calls, one session at a time in turn, while the limit and the bucket allow."""
+        now = time.monotonic()
+        if self.rpm > 0:
+            self.tokens = min(float(self.burst), self.tokens + (now - self._refilled) * self.rpm / 60)
+        self._refilled = now
+        while self._queues and self.active < int(self.limit):
+            if self.rpm > 0 and self.tokens < 1:
+                if self._wakeup is None:
+                    self._wakeup = self._loop.call_later((1 - self.tokens) * 60 / self.rpm, self._on_wakeup)
+                return
+            key, waiters = next(iter(self._queues.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            if waiter.done():
+                continue  # Cancelled while waiting
+            self.active += 1
+            if self.rpm > 0:
+                self.tokens -= 1
+            waiter.set_result(None)
+
+    def _on_wakeup(self) -> None:
+        self._wakeup = None
+        self._dispatch()
+
+    def _record_wait(self, seconds: float) -> None:
+        self._waits.append(seconds)
+        self._wait_max = max(self._wait_max, seconds)
+        if INSTRUMENTATION_ENABLED:
+            observe("timesheet_model_queue_wait_seconds", seconds)
+
+MODEL_SCHEDULER = ModelScheduler()
+
+_LIMITED_MODEL_CLASS = None
+
+def _limited_model_class() -> type:
+    """Defines LimitedModel on first use, so that importing this module does not import ADK."""
+    global _LIMITED_MODEL_CLASS
+    if _LIMITED_MODEL_CLASS is not None:
+        return _LIMITED_MODEL_CLASS
+
+    from google.adk.models.base_llm import BaseLlm
+
+    class LimitedModel(BaseLlm):
+        """Delegates to `inner`, admitting, retrying and coalescing its calls through `scheduler`."""
+
+        inner: BaseLlm
+        scheduler: Any = None  # A ModelScheduler; MODEL_SCHEDULER if unset
+
+        async def generate_content_async(self, llm_request, stream: bool = False):
+            scheduler = self.scheduler or MODEL_SCHEDULER
+            request_key = model_request_key(llm_request, stream) if scheduler.coalesce else None
+            responses = scheduler.generate(model_queue_key(llm_request), request_key,
+                                           lambda: self.inner.generate_content_async(llm_request, stream))
+            try:
+                async for response in responses:
+                    yield response
+            finally:
+                # Also runs when the stream is closed early, e.g. when an HTTP client disconnects.
+                await responses.aclose()
+
+    _LIMITED_MODEL_CLASS = LimitedModel
+    return LimitedModel
+
+def limit_model_calls(model: "BaseLlm", max_calls: int = MODEL_MAX_CONCURRENCY,
+                      scheduler: Optional[ModelScheduler] = None) -> "BaseLlm":
+    """
+    Routes `model`'s calls through `scheduler` (default: MODEL_SCHEDULER) and
+    caps that scheduler at `max_calls` concurrent calls. A model that is already
+    routed keeps its scheduler and only gets the new cap.
+    """
+    limited_model_class = _limited_model_class()
+    if isinstance(model, limited_model_class):
+        (model.scheduler or MODEL_SCHEDULER).set_max_concurrency(max_calls)
+        return model
+    scheduler = scheduler or MODEL_SCHEDULER
+    scheduler.set_max_concurrency(max_calls)
+    return limited_model_class(model=model.model, inner=model, scheduler=scheduler)
+
+# --- HTTP Front-End ---
+# `python agent.py serve` puts the agent behind HTTP for the intranet portal.
+# POST /chat runs one turn for the user named in the X-Timesheet-User header
+# (set by the portal's authenticating proxy) and streams the reply with SSE, or
+# as chunked plain text with ?format=text. Each user has their own sessions, and
+# turns in one session run one at a time. Model calls go through the model-call
+# scheduler, capped at max_model_calls at once; further calls wait their turn.
+#
+# The server does no authentication of its own: whoever can reach it can act as
+# any user by setting the header. So it only binds a loopback address, where the
+# proxy on the same host is the only client, unless the operator opts in with
+# --allow-remote (TIMESHEET_HTTP_ALLOW_REMOTE=1), e.g. when a firewall already
+# limits it to the proxy.
+
+HTTP_HOST = os.getenv("TIMESHEET_HTTP_HOST", "127.0.0.1")
+HTTP_PORT = int(os.getenv("TIMESHEET_HTTP_PORT", "8080"))
+HTTP_MAX_MODEL_CALLS = int(os.getenv("TIMESHEET_HTTP_MAX_MODEL_CALLS", str(MODEL_MAX_CONCURRENCY)))  # Concurrent model calls per process
+HTTP_USER_HEADER = "X-Timesheet-User"
+HTTP_DEFAULT_SESSION = "http"  # Session used when a request names none
+HTTP_ALLOW_REMOTE = os.getenv("TIMESHEET_HTTP_ALLOW_REMOTE", "0") != "0"  # Allow binding a non-loopback address
+
+def is_loopback_host(host: str) -> bool:
+    """Whether `host` (a name or an IP address) only accepts connections from this machine."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+async def open_session(session_service: "BaseSessionService", profile: Dict[str, Any], session_id: str) -> "Session":
+    """Returns the user's session `session_id`, creating it with the user's profile state if it does not exist yet."""
+    session = await session_service.get_session(app_name=APP_NAME, user_id=profile['id'], session_id=session_id)
+    if session is not None:
+        return session
+    try:
+        return await session_service.create_session(
+            app_name=APP_NAME, user_id=profile['id'], session_id=session_id, state=profile_state(profile))
+    except Exception:
+        # Another request created it first.
+        return await session_service.get_session(app_name=APP_NAME, user_id=profile['id'], session_id=session_id)
+
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Formats one server-sent event."""
+    return (f"event: {event}\n" if event else "") + f"data: {json.dumps(data)}\n\n"
+
+def build_http_app(runner_instance: Optional["Runner"] = None, max_model_calls: int = HTTP_MAX_MODEL_CALLS) -> Any:
+    """
+    Creates the FastAPI app serving the agent.
+
+    Without a runner, builds one around the configured model (see build_model),
+    limited to `max_model_calls` concurrent calls, and the shared session service.
+    """
+    import asyncio
+    import weakref
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.responses import PlainTextResponse, StreamingResponse
+    from google.adk.runners import Runner
+
+    if runner_instance is None:
+        agent = build_agent(limit_model_calls(build_model(), max_model_calls))
+        runner_instance = Runner(agent=agent, app_name=APP_NAME, session_service=get_session_service())
+    # One lock per session that has a turn running or waiting; unused locks are garbage collected.
+    session_locks: "weakref.WeakValueDictionary[Tuple[str, str], asyncio.Lock]" = weakref.WeakValueDictionary()
+    app = FastAPI(title="ADK Timesheet Agent")
+
+    @app.get("/healthz")
+    async def healthz() -> Dict[str, str]:
+        return {"status": "ok"}
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics() -> str:
+        if not INSTRUMENTATION_ENABLED:
+            raise HTTPException(404, "Instrumentation is off; set TIMESHEET_INSTRUMENTATION=1.")
+        return metrics_text()
+
+    @app.post("/chat")
+    async def chat(request: Request):
+        user_id = request.headers.get(HTTP_USER_HEADER)
+        if not user_id:
+            raise HTTPException(401, f"Missing {HTTP_USER_HEADER} header.")
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(400, "The body must be a JSON object.")
+        message = str(body.get("message") or "").strip() if isinstance(body, dict) else ""
+        if not message:
+            raise HTTPException(400, "'message' is required.")
+        session_id = str(body.get("session_id") or HTTP_DEFAULT_SESSION)
+        profile = await run_db(get_user_profile, user_id)
+        if profile is None:
+            raise HTTPException(404, f"Unknown user '{user_id}'.")
+        session = await open_session(runner_instance.session_service, profile, session_id)
+        as_text = request.query_params.get("format") == "text"
+        lock = session_locks.setdefault((user_id, session_id), asyncio.Lock())
 
-print("✅ Timesheet agent created with custom function tools")
-print("🔧 Available tools:")
-for tool_name, schema in TOOL_SCHEMAS.items():
-    print(f"  • {tool_name} - {schema['description']}")
+        async def reply():
+            async with lock:
+                try:
+                    async for chunk in stream_turn(runner_instance, user_id, session, message):
+                        yield chunk if as_text else sse_event({"text": chunk})
+                except Exception as e:
+                    HTTP_LOG.error("Turn failed for user '%s': %s", user_id, e, exc_info=True)
+                    yield f"\n[error] {e}" if as_text else sse_event({"error": str(e)}, event="error")
+                    return
+            if not as_text:
+                yield sse_event({"session_id": session_id}, event="done")
 
-#Set up Session Management
-# InMemorySessionService stores conversations in RAM (temporary)
-session_service = InMemorySessionService()
+        media_type = "text/plain; charset=utf-8" if as_text else "text/event-stream"
+        return StreamingResponse(reply(), media_type=media_type, headers={"Cache-Control": "no-cache"})
 
-# Create the Runner
-runner = Runner(agent=timesheet_agent, app_name=APP_NAME, session_service=session_service)
+    return app
 
-print("✅ Stateful agent initialized!")
-print(f"   - Application: {APP_NAME}")
-print(f"   - User: {USER_ID}")
-print(f"   - Using: {session_service.__class__.__name__}")
+def serve(host: str = HTTP_HOST, port: int = HTTP_PORT, max_model_calls: int = HTTP_MAX_MODEL_CALLS,
+          allow_remote: bool = HTTP_ALLOW_REMOTE) -> None:
+    """
+    Runs the HTTP front-end until interrupted.
+
+    Raises ValueError for a non-loopback `host` unless `allow_remote` is set:
+    the X-Timesheet-User header is trusted without authentication.
+    """
+    if not is_loopback_host(host) and not allow_remote:
+        raise ValueError(f"Refusing to serve on {host}: {HTTP_USER_HEADER} is trusted without authentication, "
+                         f"so anyone who can reach the server could act as any user. Bind a loopback address "
+                         f"behind an authenticating proxy, or pass --allow-remote if access is restricted otherwise.")
+    import uvicorn
+
+    HTTP_LOG.info("Serving the timesheet agent on http://%s:%s (at most %s concurrent model calls).", host, port, max_model_calls)
+    uvicorn.run(build_http_app(max_model_calls=max_model_calls), host=host, port=port, log_level="warning")
 
 # --- Configuration and Database Setup ---
 
-DB_NAME = 'timesheet_agent.db'
+DB_NAME = os.getenv("TIMESHEET_DB_PATH", 'timesheet_agent.db')
+DB_POOL_SIZE = int(os.getenv("TIMESHEET_DB_POOL_SIZE", "4"))  # Worker threads for the async tools
+DB_BUSY_TIMEOUT_MS = 5000  # How long a writer waits on a locked database before failing
+PROFILE_CACHE_SIZE = 4096  # Maximum number of user profiles kept in memory
+RESULT_CACHE_SIZE = 2048  # Maximum number of cached tool results (one per user/manager and page)
+RESULT_CACHE_TTL_SECONDS = 60  # Upper bound on staleness from writes made by other processes
 EMPLOYEE_ID = 'employee-demo-5678'
 MANAGER_ID = 'manager-demo-1234'
-CURRENT_USER_ID = EMPLOYEE_ID  # Start as the employee by default
-CONN: Optional[sqlite3.Connection] = None
+DEFAULT_USER_ID = EMPLOYEE_ID  # The CLI starts as the employee by default
+CONN: Optional[sqlite3.Connection] = None  # Connection of the thread that ran init_db()
 
-def init_db() -> Dict[str, Any]:
-    """Initializes the SQLite database and sets up initial data."""
-    global CONN
-    logging.info("Initializing database...")
-    # Check if DB file exists to decide if we need to seed data later
-    #db_exists = os.path.exists(DB_NAME)
-    is_new_db = not os.path.exists(DB_NAME)
+# Each DB worker thread opens its own connection; sqlite3 connections must not be shared across threads.
+_THREAD_LOCAL = threading.local()
+_DB_EXECUTOR = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="timesheet-db")
+_INIT_LOCK = threading.Lock()
+_DB_READY = False  # Set once init_db() has migrated and seeded the database; CONN is set before that
 
-    if CONN is None:
-        CONN = sqlite3.connect(DB_NAME)
-        logging.info(f"Database connection established to {DB_NAME}.")
+def connect_db() -> sqlite3.Connection:
+    """Opens a new connection to DB_NAME configured for concurrent readers and writers."""
+    conn = sqlite3.connect(DB_NAME, factory=InstrumentedConnection if INSTRUMENT_SQL else sqlite3.Connection)
+    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    return conn
 
-    cursor = CONN.cursor()
-    cursor.execute("""
+def get_conn() -> Optional[sqlite3.Connection]:
+    """
+    Returns the calling thread's database connection, opening one on first use in a worker thread.
+
+    The first call in the process runs init_db(), and concurrent first calls wait
+    for it to finish. Returns None if that fails.
+    """
+    if not _DB_READY:
+        with _INIT_LOCK:
+            if not _DB_READY:
+                try:
+                    init_db()
+                except Exception as e:
+                    DB_LOG.error("Database initialization failed: %s", e, exc_info=True)
+                    return None
+    conn = getattr(_THREAD_LOCAL, 'conn', None)
+    if conn is None:
+        conn = connect_db()
+        _THREAD_LOCAL.conn = conn
+    return conn
+
+async def run_db(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Runs a blocking database function on the DB worker pool without blocking the event loop."""
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    call = functools.partial(func, *args, **kwargs)
+    if INSTRUMENTATION_ENABLED:
+        # Carry the current turn's trace into the worker thread.
+        call = functools.partial(contextvars.copy_context().run, call)
+    return await loop.run_in_executor(_DB_EXECUTOR, call)
+
+# --- Group Commit ---
+# Every commit waits for an fsync, so committing each timesheet write on its own
+# caps throughput at the disk's sync rate. When many users submit or approve at
+# once (end of week), writes are instead queued to a single writer thread that
+# commits them in groups: the first queued write opens a window of at most
+# WRITE_MAX_DELAY_MS, and everything queued by then (up to WRITE_BATCH_SIZE
+# writes) shares one transaction. The window only opens while writes arrive
+# together (the previous batch had more than one), so a lone write commits at
+# once. Each write runs in its own savepoint, so a failing write is rolled back
+# alone. A caller gets its result, or its exception, only once the batch has
+# been committed.
+
+GROUP_COMMIT_ENABLED = os.getenv("TIMESHEET_GROUP_COMMIT", "1") != "0"
+WRITE_MAX_DELAY_MS = float(os.getenv("TIMESHEET_WRITE_MAX_DELAY_MS", "2"))  # Longest a write waits for others to join its batch
+WRITE_BATCH_SIZE = int(os.getenv("TIMESHEET_WRITE_BATCH_SIZE", "256"))  # Most writes committed in one transaction
+# Threads for the async write tools. They mostly wait for their batch, so there are
+# more of them than DB workers; waiting writers never hold a read worker.
+WRITE_POOL_SIZE = int(os.getenv("TIMESHEET_WRITE_POOL_SIZE", "64"))
+
+_WRITE_EXECUTOR = ThreadPoolExecutor(max_workers=WRITE_POOL_SIZE, thread_name_prefix="timesheet-write")
+
+class WriteCoordinator:
+    """
+    Runs write functions from any thread on one writer thread, committing them in groups.
+
+    `submit(func, *args)` calls `func(conn, *args)` on the writer's connection
+    inside the current batch's transaction and returns its result once that
+    transaction has committed. `func` must not commit or roll back itself.
+    The writer thread starts on the first submit.
+    """
+
+    def __init__(self, max_delay_ms: float = WRITE_MAX_DELAY_MS, max_batch: int = WRITE_BATCH_SIZE):
+        self.max_delay = max_delay_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self.batches = 0
+        self.writes = 0
+        self.failed = 0
+        self.largest_batch = 0
+        self._last_batch = 0
+        self._queue: "queue.SimpleQueue[Optional[Tuple[Future, Callable[..., Any], tuple, Any]]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._conn: Optional[sqlite3.Connection] = None  # The writer thread's, opened by its first batch
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Queues `func(conn, *args)` and blocks until its batch is durable. Re-raises its exception."""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="timesheet-writer", daemon=True)
+                    self._thread.start()
+        future: Future = Future()
+        # The write's SQL spans belong to the caller's turn trace.
+        context = contextvars.copy_context() if INSTRUMENTATION_ENABLED else None
+        start = time.perf_counter()
+        self._queue.put((future, func, args, context))
+        try:
+            return future.result()
+        finally:
+            if INSTRUMENTATION_ENABLED:
+                observe("timesheet_write_wait_seconds", time.perf_counter() - start)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Commits the writes already queued, then stops the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the batch and write counters."""
+        return {
+            "batches": self.batches,
+            "writes": self.writes,
+            "failed": self.failed,
+            "mean_batch": round(self.writes / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+        }
+
+    def _run(self) -> None:
+        try:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    return
+                batch = [job]
+                stop = self._fill(batch)
+                self._commit(batch)
+                if stop:
+                    return
+        finally:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _fill(self, batch: list) -> bool:
+        """Adds queued writes to `batch` until the window closes or it is full. Returns True on close()."""
+        deadline = time.monotonic() + (self.max_delay if self._last_batch > 1 else 0)
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                # Past the deadline, still take whatever is already queued.
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                return False
+            if job is None:
+                return True
+            batch.append(job)
+        return False
+
+    def _commit(self, batch: list) -> None:
+        outcomes = []
+        try:
+            if self._conn is None:
+                self._conn = connect_db()
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            for _, func, args, context in batch:
+                conn.execute("SAVEPOINT group_write")
+                try:
+                    value = context.run(func, conn, *args) if context is not None else func(conn, *args)
+                    conn.execute("RELEASE group_write")
+                    outcomes.append((True, value))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO group_write")
+                    conn.execute("RELEASE group_write")
+                    outcomes.append((False, e))
+            conn.commit()
+        except Exception as e:
+            # Nothing in the batch was committed.
+            DB_LOG.error("Group commit of %s writes failed: %s", len(batch), e)
+            if self._conn is not None and self._conn.in_transaction:
+                self._conn.rollback()
+            self.failed += len(batch)
+            for future, *_ in batch:
+                future.set_exception(e)
+            return
+        self._last_batch = len(batch)
+        self.batches += 1
+        self.writes += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        if INSTRUMENTATION_ENABLED:
+            observe("timesheet_write_batch_size", len(batch), CARDINALITY_BUCKETS)
+        for (future, *_), (ok, value) in zip(batch, outcomes):
+            if ok:
+                future.set_result(value)
+            else:
+                self.failed += 1
+                future.set_exception(value)
+
+WRITE_COORDINATOR = WriteCoordinator()
+
+def run_write(func: Callable[..., Any], *args: Any, conn: Optional[sqlite3.Connection] = None) -> Any:
+    """
+    Runs `func(conn, *args)` in a committed write transaction and returns its result.
+
+    With GROUP_COMMIT_ENABLED the write goes through WRITE_COORDINATOR (and
+    `conn` is ignored); otherwise it runs and commits on `conn`, by default the
+    calling thread's connection.
+    """
+    if GROUP_COMMIT_ENABLED:
+        return WRITE_COORDINATOR.submit(func, *args)
+    conn = conn or get_conn()
+    with conn:
+        return func(conn, *args)
+
+async def run_write_tool(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Like run_db, but on the write pool, for tools that wait on run_write."""
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    call = functools.partial(func, *args, **kwargs)
+    if INSTRUMENTATION_ENABLED:
+        call = functools.partial(contextvars.copy_context().run, call)
+    return await loop.run_in_executor(_WRITE_EXECUTOR, call)
+
+# --- Aggregates ---
+# Hour totals and row counts per key, kept current by triggers on timesheets so
+# the dashboard reads a few rows instead of scanning raw timesheets. They cover
+# archived rows too (see Archive), so reports read across both tables.
+# Each entry: (table, key columns, key expressions over a timesheets row `{row}`).
+AGGREGATE_TABLES: List[Tuple[str, Tuple[str, ...], Tuple[str, ...]]] = [
+    ("hours_daily", ("employeeId", "date", "status"), ("{row}.employeeId", "{row}.date", "{row}.status")),
+    ("hours_monthly", ("employeeId", "month", "status"), ("{row}.employeeId", "substr({row}.date, 1, 7)", "{row}.status")),
+    ("employee_status_counts", ("employeeId", "status"), ("{row}.employeeId", "{row}.status")),
+    ("manager_status_counts", ("managerId", "status"), ("{row}.managerId", "{row}.status")),
+]
+
+def _aggregate_keys(expressions: Tuple[str, ...], row: str) -> List[str]:
+    return [expression.format(row=row) for expression in expressions]
+
+def _aggregate_add_sql(table: str, keys: Tuple[str, ...], expressions: Tuple[str, ...], row: str) -> str:
+    values = _aggregate_keys(expressions, row)
+    return (
+        f"INSERT INTO {table} ({', '.join(keys)}, hours, entries) "
+        f"SELECT {', '.join(values)}, {row}.hours, 1 WHERE {' AND '.join(f'{v} IS NOT NULL' for v in values)} "
+        f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET hours = hours + excluded.hours, entries = entries + 1;"
+    )
+
+def _aggregate_remove_sql(table: str, keys: Tuple[str, ...], expressions: Tuple[str, ...], row: str) -> str:
+    values = _aggregate_keys(expressions, row)
+    return (
+        f"UPDATE {table} SET hours = hours - {row}.hours, entries = entries - 1 "
+        f"WHERE {' AND '.join(f'{key} = {value}' for key, value in zip(keys, values))};"
+    )
+
+def aggregate_expected_query(table: str, source: str = "all_timesheets") -> str:
+    """Returns the SELECT that recomputes `table` from the raw rows of `source` (hot and archived by default)."""
+    _, keys, expressions = next(entry for entry in AGGREGATE_TABLES if entry[0] == table)
+    values = _aggregate_keys(expressions, "t")
+    return (
+        f"SELECT {', '.join(f'{v} AS {k}' for k, v in zip(keys, values))}, SUM(t.hours) AS hours, COUNT(*) AS entries "
+        f"FROM {source} t WHERE {' AND '.join(f'{v} IS NOT NULL' for v in values)} GROUP BY {', '.join(values)}"
+    )
+
+def aggregate_rebuild_statements(source: str = "all_timesheets") -> List[str]:
+    """Statements that empty every aggregate table and refill it from the raw rows."""
+    statements = []
+    for table, keys, _ in AGGREGATE_TABLES:
+        statements.append(f"DELETE FROM {table}")
+        statements.append(f"INSERT INTO {table} ({', '.join(keys)}, hours, entries) {aggregate_expected_query(table, source)}")
+    return statements
+
+def _aggregate_delete_trigger(when: Optional[str] = None) -> str:
+    remove_old = "\n".join(_aggregate_remove_sql(*entry, row="OLD") for entry in AGGREGATE_TABLES)
+    condition = f" WHEN {when}" if when else ""
+    return f"CREATE TRIGGER IF NOT EXISTS trg_timesheets_aggregates_delete AFTER DELETE ON timesheets{condition} BEGIN\n{remove_old}\nEND"
+
+def _aggregate_schema_statements() -> List[str]:
+    tables = [
+        f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            {' TEXT NOT NULL, '.join(keys)} TEXT NOT NULL,
+            hours REAL NOT NULL DEFAULT 0,
+            entries INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY ({', '.join(keys)})
+        ) WITHOUT ROWID
+        """
+        for table, keys, _ in AGGREGATE_TABLES
+    ]
+    add_new = "\n".join(_aggregate_add_sql(*entry, row="NEW") for entry in AGGREGATE_TABLES)
+    remove_old = "\n".join(_aggregate_remove_sql(*entry, row="OLD") for entry in AGGREGATE_TABLES)
+    triggers = [
+        f"CREATE TRIGGER IF NOT EXISTS trg_timesheets_aggregates_insert AFTER INSERT ON timesheets BEGIN\n{add_new}\nEND",
+        _aggregate_delete_trigger(),
+        "CREATE TRIGGER IF NOT EXISTS trg_timesheets_aggregates_update "
+        f"AFTER UPDATE OF employeeId, managerId, date, hours, status ON timesheets BEGIN\n{remove_old}\n{add_new}\nEND",
+    ]
+    # Backfill before the triggers exist; the migration runs in one transaction.
+    # The archive (migration 8) does not exist yet at this version.
+    return tables + aggregate_rebuild_statements("timesheets") + triggers
+
+def verify_aggregates(conn: Optional[sqlite3.Connection] = None, rebuild: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Recomputes every aggregate table from the raw timesheets (hot and archived), and the reporting
+    hierarchy (org_closure) from user_profiles, and reports drift.
+
+    Hours are compared rounded to 6 decimal places, and stored keys whose count
+    dropped to zero are treated as absent.
+
+    Args:
+        conn: The connection to check. Defaults to the calling thread's connection.
+        rebuild: If True, rewrite the aggregate tables and the hierarchy from the raw rows after checking.
+
+    Returns:
+        A dictionary mapping each drifting table to {"missing": int, "unexpected": int, "examples": list},
+        where "missing" rows are expected but absent or different, and "unexpected" rows are stored but wrong.
+        An empty dictionary means the aggregates match the raw rows.
+    """
+    conn = conn or get_conn()
+    drift: Dict[str, Dict[str, Any]] = {}
+    for table, keys, _ in AGGREGATE_TABLES:
+        columns = ", ".join(keys)
+        expected = f"SELECT {columns}, ROUND(hours, 6), entries FROM ({aggregate_expected_query(table)})"
+        stored = f"SELECT {columns}, ROUND(hours, 6), entries FROM {table} WHERE entries != 0"
+        missing = conn.execute(f"SELECT * FROM ({expected} EXCEPT {stored})").fetchall()
+        unexpected = conn.execute(f"SELECT * FROM ({stored} EXCEPT {expected})").fetchall()
+        if missing or unexpected:
+            drift[table] = {"missing": len(missing), "unexpected": len(unexpected), "examples": (missing + unexpected)[:5]}
+    expected = f"SELECT ancestorId, descendantId, depth FROM ({org_closure_expected_query()})"
+    stored = "SELECT ancestorId, descendantId, depth FROM org_closure"
+    missing = conn.execute(f"SELECT * FROM ({expected} EXCEPT {stored})").fetchall()
+    unexpected = conn.execute(f"SELECT * FROM ({stored} EXCEPT {expected})").fetchall()
+    if missing or unexpected:
+        drift["org_closure"] = {"missing": len(missing), "unexpected": len(unexpected), "examples": (missing + unexpected)[:5]}
+    if rebuild:
+        with conn:
+            conn.execute("BEGIN")
+            for statement in aggregate_rebuild_statements() + org_closure_rebuild_statements():
+                conn.execute(statement)
+        RESULT_CACHE.invalidate()
+    return drift
+
+def get_status_count(status: str, user_id: Optional[str] = None, manager_id: Optional[str] = None,
+                     scope: str = "direct") -> int:
+    """
+    Reads the number of timesheets with `status` for an employee or a manager from the aggregate counters.
+
+    With scope 'org', counts the sheets of everyone below the manager instead of
+    the sheets routed to them.
+    """
+    conn = get_conn()
+    if not conn: return 0
+    query, params = build_status_count_query(status, user_id, manager_id, scope)
+    result = conn.execute(query, params).fetchone()
+    return result[0] if result else 0
+
+def build_status_count_query(status: str, user_id: Optional[str] = None, manager_id: Optional[str] = None,
+                             scope: str = "direct"):
+    """Builds the point lookup (one lookup per person below the manager for scope 'org') used by get_status_count."""
+    if user_id:
+        return "SELECT entries FROM employee_status_counts WHERE employeeId = ? AND status = ?", [user_id, status]
+    if scope == "org":
+        return (
+            "SELECT COALESCE(SUM(s.entries), 0) FROM org_closure c "
+            "JOIN employee_status_counts s ON s.employeeId = c.descendantId AND s.status = ? "
+            "WHERE c.ancestorId = ? AND c.depth > 0",
+            [status, manager_id],
+        )
+    return "SELECT entries FROM manager_status_counts WHERE managerId = ? AND status = ?", [manager_id, status]
+
+# --- Reporting Hierarchy ---
+# org_closure holds one row per (ancestor, descendant) pair of the reportsTo tree,
+# including each person as their own ancestor at depth 0. "Everyone below this
+# manager" is then one primary-key range, at any depth, instead of a query per
+# level. Triggers on user_profiles keep it current: moving someone detaches their
+# whole subtree from the old ancestors and attaches it under the new ones. A
+# reportsTo that points at a missing profile makes the person a root, and the
+# triggers refuse a reportsTo that would create a cycle.
+
+ORG_SCOPES = reporting.ORG_SCOPES  # Direct reports only, or everyone below the manager; shared with the reports
+ORG_MAX_DEPTH = 256  # Deepest chain the rebuild follows; guards against cycles in imported data
+
+def org_closure_expected_query() -> str:
+    """Returns the SELECT that recomputes org_closure from user_profiles with a recursive CTE."""
+    return f"""
+        WITH RECURSIVE chain (ancestorId, descendantId, depth) AS (
+            SELECT id, id, 0 FROM user_profiles
+            UNION ALL
+            SELECT m.id, chain.descendantId, chain.depth + 1
+            FROM chain
+            JOIN user_profiles p ON p.id = chain.ancestorId
+            JOIN user_profiles m ON m.id = p.reportsTo
+            WHERE chain.depth < {ORG_MAX_DEPTH}
+        )
+        SELECT ancestorId, descendantId, MIN(depth) AS depth FROM chain GROUP BY ancestorId, descendantId
+    """
+
+def org_closure_rebuild_statements() -> List[str]:
+    """Statements that empty org_closure and refill it from user_profiles."""
+    return [
+        "DELETE FROM org_closure",
+        f"INSERT INTO org_closure (ancestorId, descendantId, depth) {org_closure_expected_query()}",
+    ]
+
+def _org_closure_remove_sql(row: str) -> str:
+    # Detach the subtree of {row}.id from everyone above it, then drop the rows
+    # that hang below {row}.id itself (its subtree stays rooted at its reports).
+    return (
+        "DELETE FROM org_closure "
+        f"WHERE descendantId IN (SELECT descendantId FROM org_closure WHERE ancestorId = {row}.id) "
+        f"AND ancestorId IN (SELECT ancestorId FROM org_closure WHERE descendantId = {row}.id AND depth > 0);\n"
+        f"DELETE FROM org_closure WHERE ancestorId = {row}.id;"
+    )
+
+def _org_closure_add_sql(row: str) -> str:
+    # The person, then the subtrees of their reports below them, then that whole
+    # subtree below everyone above their manager (and the manager).
+    return (
+        f"INSERT INTO org_closure (ancestorId, descendantId, depth) VALUES ({row}.id, {row}.id, 0);\n"
+        "INSERT INTO org_closure (ancestorId, descendantId, depth) "
+        f"SELECT {row}.id, s.descendantId, s.depth + 1 FROM user_profiles r "
+        f"JOIN org_closure s ON s.ancestorId = r.id WHERE r.reportsTo = {row}.id AND r.id != {row}.id;\n"
+        "INSERT INTO org_closure (ancestorId, descendantId, depth) "
+        "SELECT a.ancestorId, s.descendantId, a.depth + s.depth + 1 FROM org_closure a "
+        f"JOIN org_closure s ON s.ancestorId = {row}.id WHERE a.descendantId = {row}.reportsTo;"
+    )
+
+# True when NEW.reportsTo is NEW itself or someone below NEW (through its reports,
+# which also covers a row replacing an existing profile).
+_ORG_CYCLE_CHECK = (
+    "NEW.reportsTo = NEW.id OR EXISTS (SELECT 1 FROM user_profiles r JOIN org_closure s ON s.ancestorId = r.id "
+    "WHERE r.reportsTo = NEW.id AND r.id != NEW.id AND s.descendantId = NEW.reportsTo)"
+)
+
+def _org_closure_schema_statements() -> List[str]:
+    cycle_error = "SELECT RAISE(ABORT, 'reportsTo would create a cycle in the reporting hierarchy');"
+    return [
+        """
+        CREATE TABLE IF NOT EXISTS org_closure (
+            ancestorId TEXT NOT NULL,
+            descendantId TEXT NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestorId, descendantId)
+        ) WITHOUT ROWID
+        """,
+        # A person's managers at every level (trigger maintenance).
+        "CREATE INDEX IF NOT EXISTS idx_org_closure_descendant ON org_closure (descendantId, depth)",
+        # Org-wide pending list: per employee and status, newest first.
+        "CREATE INDEX IF NOT EXISTS idx_timesheets_employee_status_submitted_id ON timesheets (employeeId, status, submittedAt, id)",
+        # Backfill before the triggers exist; the migration runs in one transaction.
+        *org_closure_rebuild_statements(),
+        f"CREATE TRIGGER IF NOT EXISTS trg_user_profiles_org_cycle_insert BEFORE INSERT ON user_profiles "
+        f"WHEN {_ORG_CYCLE_CHECK} BEGIN\n{cycle_error}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS trg_user_profiles_org_cycle_update BEFORE UPDATE OF id, reportsTo ON user_profiles "
+        f"WHEN {_ORG_CYCLE_CHECK} BEGIN\n{cycle_error}\nEND",
+        # INSERT OR REPLACE does not fire the delete trigger, so an insert first removes any previous rows.
+        "CREATE TRIGGER IF NOT EXISTS trg_user_profiles_org_insert AFTER INSERT ON user_profiles BEGIN\n"
+        f"{_org_closure_remove_sql('NEW')}\n{_org_closure_add_sql('NEW')}\nEND",
+        "CREATE TRIGGER IF NOT EXISTS trg_user_profiles_org_delete AFTER DELETE ON user_profiles BEGIN\n"
+        f"{_org_closure_remove_sql('OLD')}\nEND",
+        "CREATE TRIGGER IF NOT EXISTS trg_user_profiles_org_update AFTER UPDATE OF id, reportsTo ON user_profiles BEGIN\n"
+        f"{_org_closure_remove_sql('OLD')}\n{_org_closure_add_sql('NEW')}\nEND",
+    ]
+
+# --- Archive ---
+# Settled (Approved or Rejected) timesheets older than ARCHIVE_AFTER_DAYS move
+# from timesheets to timesheets_archive, so the hot table and its indexes hold
+# only recent and pending work. The archive has the same columns and only its
+# primary key. The aggregate tables keep counting archived rows: the delete
+# trigger skips rows that are already in the archive, so every report built on
+# them reads across both tables unchanged. all_timesheets is the union of both
+# for queries that need raw rows.
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("TIMESHEET_ARCHIVE_AFTER_DAYS", "180"))  # Age (by work date) at which settled sheets move
+ARCHIVE_CHUNK_SIZE = 5_000  # Rowids per archiving transaction; interactive writes wait for at most one chunk
+ARCHIVE_STATUSES = ('Approved', 'Rejected')
+
+def _archive_schema_statements() -> List[str]:
+    columns = ", ".join(TIMESHEET_COLUMNS)
+    return [
+        """
+        CREATE TABLE IF NOT EXISTS timesheets_archive (
+            id TEXT PRIMARY KEY,
+            employeeId TEXT NOT NULL,
+            managerId TEXT,
+            date TEXT NOT NULL,
+            hours REAL NOT NULL,
+            task TEXT,
+            status TEXT NOT NULL,
+            submittedAt TEXT,
+            approvedAt TEXT
+        )
+        """,
+        f"CREATE VIEW IF NOT EXISTS all_timesheets AS "
+        f"SELECT {columns} FROM timesheets UNION ALL SELECT {columns} FROM timesheets_archive",
+        # Moving a row to the archive must not subtract it from the aggregates.
+        "DROP TRIGGER IF EXISTS trg_timesheets_aggregates_delete",
+        _aggregate_delete_trigger("NOT EXISTS (SELECT 1 FROM timesheets_archive a WHERE a.id = OLD.id)"),
+    ]
+
+def archive_settled(older_than_days: int = ARCHIVE_AFTER_DAYS, before: Optional[str] = None,
+                    conn: Optional[sqlite3.Connection] = None, chunk_size: int = ARCHIVE_CHUNK_SIZE,
+                    progress: Optional[Callable[[int, float], None]] = None) -> Dict[str, Any]:
+    """
+    Moves settled timesheets dated before a cutoff from timesheets to timesheets_archive.
+
+    The hot table is walked once in rowid ranges of `chunk_size`; each range is
+    copied and deleted in its own short write transaction, so the job can run
+    alongside the agent and be interrupted and restarted at any point. Pending
+    sheets are never moved.
+
+    Args:
+        older_than_days: Archive sheets whose work date is more than this many days ago.
+        before: An explicit cutoff date (YYYY-MM-DD, exclusive) instead of `older_than_days`.
+        conn: The connection to archive through. Defaults to the calling thread's connection.
+        chunk_size: Rowids per transaction.
+        progress: Called after each chunk with (rows archived so far, seconds elapsed).
+
+    Returns:
+        {"rows": int, "cutoff": str, "seconds": float, "rows_per_second": float}
+    """
+    cutoff = before or (datetime.now() - timedelta(days=older_than_days)).strftime('%Y-%m-%d')
+    datetime.strptime(cutoff, '%Y-%m-%d')  # Raises ValueError on a malformed date
+    conn = conn or get_conn()
+    columns = ", ".join(TIMESHEET_COLUMNS)
+    settled = f"rowid > ? AND rowid <= ? AND status IN ({', '.join('?' * len(ARCHIVE_STATUSES))}) AND date < ?"
+    DB_LOG.info("Archiving settled timesheets dated before %s...", cutoff)
+
+    start = time.perf_counter()
+    moved = 0
+    last_rowid = conn.execute("SELECT MAX(rowid) FROM timesheets").fetchone()[0] or 0
+    for low in range(0, last_rowid, chunk_size):
+        params = (low, low + chunk_size, *ARCHIVE_STATUSES, cutoff)
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(f"INSERT INTO timesheets_archive ({columns}) SELECT {columns} FROM timesheets WHERE {settled}", params)
+            moved += conn.execute(f"DELETE FROM timesheets WHERE {settled}", params).rowcount
+        if progress:
+            progress(moved, time.perf_counter() - start)
+    if moved:
+        conn.execute("PRAGMA optimize")
+        RESULT_CACHE.invalidate()
+
+    seconds = time.perf_counter() - start
+    DB_LOG.info("Archived %s timesheets dated before %s in %.1fs.", moved, cutoff, seconds)
+    return {"rows": moved, "cutoff": cutoff, "seconds": round(seconds, 3),
+            "rows_per_second": round(moved / seconds) if seconds else 0}
+
+# --- Required submittedAt ---
+# Lists are paged by (submittedAt, id), and a row value comparison with a NULL
+# is never true, so a sheet without submittedAt could never be paged to. SQLite
+# cannot add NOT NULL to an existing column, so timesheets is rebuilt with the
+# constraint; sheets without a submission time take their work date.
+
+def _require_submitted_at(conn: sqlite3.Connection) -> None:
+    """Rebuilds timesheets with submittedAt NOT NULL, keeping rowids, indexes, triggers and the union view."""
+    columns = ", ".join(TIMESHEET_COLUMNS)
+    dependents = conn.execute(
+        "SELECT type, sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name = 'timesheets' AND sql IS NOT NULL"
+    ).fetchall()
+    views = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'view' AND name = 'all_timesheets'").fetchall()
+    conn.execute("DROP VIEW IF EXISTS all_timesheets")
+    conn.execute("""
+        CREATE TABLE timesheets_rebuilt (
+            id TEXT PRIMARY KEY,
+            employeeId TEXT NOT NULL,
+            managerId TEXT,
+            date TEXT NOT NULL,
+            hours REAL NOT NULL,
+            task TEXT,
+            status TEXT NOT NULL,
+            submittedAt TEXT NOT NULL,
+            approvedAt TEXT
+        )
+    """)
+    # No trigger fires here: the copy goes into a table without triggers, and DROP TABLE fires none.
+    conn.execute(
+        f"INSERT INTO timesheets_rebuilt (rowid, {columns}) "
+        f"SELECT rowid, {columns.replace('submittedAt', 'COALESCE(submittedAt, date)')} FROM timesheets"
+    )
+    conn.execute("DROP TABLE timesheets")
+    conn.execute("ALTER TABLE timesheets_rebuilt RENAME TO timesheets")
+    for kind, sql in sorted(dependents, key=lambda item: item[0] != 'index'):
+        conn.execute(sql)
+    for (sql,) in views:
+        conn.execute(sql)
+    conn.execute("UPDATE timesheets_archive SET submittedAt = date WHERE submittedAt IS NULL")
+
+# Schema migrations, applied in order. PRAGMA user_version records how many
+# have been applied, so each step runs exactly once per database file. A step
+# is a list of SQL statements or functions taking the connection.
+SCHEMA_MIGRATIONS: List[List[Union[str, Callable[[sqlite3.Connection], None]]]] = [
+    # 1: Base tables.
+    [
+        """
         CREATE TABLE IF NOT EXISTS user_profiles (
             id TEXT PRIMARY KEY,
             name TEXT NOT NULL,
             role TEXT NOT NULL,
             reportsTo TEXT
         )
-    """)
-    cursor.execute("""
+        """,
+        """
         CREATE TABLE IF NOT EXISTS timesheets (
             id TEXT PRIMARY KEY,
             employeeId TEXT NOT NULL,
@@ -456,168 +3343,856 @@ def init_db() -> Dict[str, Any]:
             submittedAt TEXT,
             approvedAt TEXT
         )
-    """)
+        """,
+    ],
+    # 2: Indexes matching the tool query filters.
+    [
+        # Pending count and the 30-day SUM(hours) (covering: hours is included).
+        "CREATE INDEX IF NOT EXISTS idx_timesheets_employee_status_date ON timesheets (employeeId, status, date, hours)",
+        # Manager pending list, newest first.
+        "CREATE INDEX IF NOT EXISTS idx_timesheets_manager_status_submitted ON timesheets (managerId, status, submittedAt)",
+        # Recent submissions for the dashboard, newest first.
+        "CREATE INDEX IF NOT EXISTS idx_timesheets_employee_submitted ON timesheets (employeeId, submittedAt)",
+    ],
+    # 3: Keyset pagination orders by (submittedAt, id); extend the list indexes with id.
+    [
+        "DROP INDEX IF EXISTS idx_timesheets_manager_status_submitted",
+        "DROP INDEX IF EXISTS idx_timesheets_employee_submitted",
+        "CREATE INDEX IF NOT EXISTS idx_timesheets_manager_status_submitted_id ON timesheets (managerId, status, submittedAt, id)",
+        "CREATE INDEX IF NOT EXISTS idx_timesheets_employee_submitted_id ON timesheets (employeeId, submittedAt, id)",
+    ],
+    # 4: Trigger-maintained hour aggregates and status counters, backfilled from existing rows.
+    _aggregate_schema_statements(),
+    # 5: Persistent agent sessions (see SqliteSessionService). State columns hold JSON objects.
+    [
+        """
+        CREATE TABLE IF NOT EXISTS chat_sessions (
+            app_name TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            id TEXT NOT NULL,
+            state TEXT NOT NULL,
+            summary TEXT NOT NULL DEFAULT '',
+            create_time REAL NOT NULL,
+            update_time REAL NOT NULL,
+            PRIMARY KEY (app_name, user_id, id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS chat_events (
+            seq INTEGER PRIMARY KEY,
+            app_name TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            event_id TEXT NOT NULL,
+            timestamp REAL NOT NULL,
+            event TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_chat_events_session ON chat_events (app_name, user_id, session_id, event_id)",
+        """
+        CREATE TABLE IF NOT EXISTS chat_user_states (
+            app_name TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            state TEXT NOT NULL,
+            PRIMARY KEY (app_name, user_id)
+        )
+        """,
+        "CREATE TABLE IF NOT EXISTS chat_app_states (app_name TEXT PRIMARY KEY, state TEXT NOT NULL)",
+    ],
+    # 6: Team lookups by manager (reports), in ID order.
+    [
+        "CREATE INDEX IF NOT EXISTS idx_user_profiles_reports_to ON user_profiles (reportsTo, id)",
+    ],
+    # 7: Reporting hierarchy (org_closure) for org-wide approvals and reports, backfilled from the profiles.
+    _org_closure_schema_statements(),
+    # 8: Archive table for settled history, and a union view over hot and archived rows.
+    _archive_schema_statements(),
+    # 9: submittedAt is required, so every sheet has a keyset position.
+    [_require_submitted_at],
+]
+
+def migrate_db(conn: sqlite3.Connection) -> int:
+    """Applies any pending schema migrations and returns the resulting schema version."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, statements in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+        DB_LOG.info("Applying schema migration %s...", target)
+        with conn:
+            conn.execute("BEGIN")
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            # PRAGMA does not accept bound parameters; target is always an int.
+            conn.execute(f"PRAGMA user_version = {target}")
+    return max(version, len(SCHEMA_MIGRATIONS))
+
+class LRUCache:
+    """
+    A thread-safe, size-bounded mapping that evicts the least recently used entry.
+
+    `generation` increases on every invalidation. A caller that loads a value
+    from the database passes the generation it saw before the read to `put`, so
+    a value read before a concurrent write can never be cached after it.
+
+    Entries expire `ttl` seconds after they are stored (never, if ttl is None).
+    Entries may be put in a `group` so that related keys can be dropped together.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Any, Tuple[Any, Optional[float], Any]]" = OrderedDict()  # key -> (value, expires_at, group)
+        self._groups: Dict[Any, set] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Any, value: Any, generation: Optional[int] = None, group: Any = None) -> None:
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._remove(key)
+            expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+            self._data[key] = (value, expires_at, group)
+            if group is not None:
+                self._groups.setdefault(group, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def invalidate(self, key: Any = None) -> None:
+        """Drops one entry, or every entry when no key is given."""
+        with self._lock:
+            self.generation += 1
+            if key is None:
+                self._data.clear()
+                self._groups.clear()
+            else:
+                self._remove(key)
+
+    def invalidate_group(self, group: Any) -> None:
+        """Drops every entry that was put with `group`."""
+        with self._lock:
+            self.generation += 1
+            for key in list(self._groups.get(group, ())):
+                self._remove(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the size and hit/miss/eviction counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key: Any) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None and entry[2] is not None:
+            keys = self._groups.get(entry[2])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._groups[entry[2]]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+# User profiles change rarely but are read on every tool call. Every write to
+# user_profiles must invalidate the affected entries.
+PROFILE_CACHE = LRUCache(PROFILE_CACHE_SIZE)
+
+# Results of the read-only tools (dashboard, pending list), grouped by the user
+# or manager they belong to. Writes in this process invalidate the affected
+# groups; the TTL bounds staleness from writes made by other processes.
+RESULT_CACHE = LRUCache(RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL_SECONDS)
+
+def invalidate_results(user_ids: Sequence[str] = (), manager_ids: Sequence[str] = ()) -> None:
+    """Drops the cached dashboards of `user_ids` and the cached pending lists of `manager_ids`."""
+    for user_id in set(user_ids):
+        RESULT_CACHE.invalidate_group(('tool_view_queries', user_id))
+    for manager_id in set(manager_ids):
+        if manager_id is not None:
+            RESULT_CACHE.invalidate_group(('tool_manager_approval', manager_id))
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Returns the hit/miss counters of the in-process caches."""
+    return {"profiles": PROFILE_CACHE.stats(), "results": RESULT_CACHE.stats()}
+
+def init_db() -> Dict[str, Any]:
+    """Initializes the SQLite database and sets up initial data."""
+    global CONN, _DB_READY
+    DB_LOG.info("Initializing database...")
+    # Check if DB file exists to decide if we need to seed data later
+    #db_exists = os.path.exists(DB_NAME)
+    is_new_db = not os.path.exists(DB_NAME)
+
+    if CONN is None:
+        CONN = connect_db()
+        _THREAD_LOCAL.conn = CONN
+        DB_LOG.info("Database connection established to %s.", DB_NAME)
+
+    # WAL lets readers proceed while a writer commits; the mode is stored in the database file.
+    CONN.execute("PRAGMA journal_mode=WAL")
 
-    CONN.commit()
+    migrate_db(CONN)
+    cursor = CONN.cursor()
 
     if is_new_db:
-        logging.info("New database detected. Seeding with initial data...")
+        DB_LOG.info("New database detected. Seeding with initial data...")
         seed_file = 'seed_data.sql'
         try:
-            with open(seed_file, 'r') as f:
-                sql_script = f.read()
-            cursor.executescript(sql_script)
-            CONN.commit()
-            logging.info(f"Database seeded successfully from {seed_file}.")
+            bulk_import(seed_file, conn=CONN, defer_indexes=False)
+            DB_LOG.info("Database seeded successfully from %s.", seed_file)
         except FileNotFoundError:
-            logging.warning(f"{seed_file} not found. Seeding with default manager and employee.")
+            DB_LOG.warning("%s not found. Seeding with default manager and employee.", seed_file)
             # Fallback to original seeding if file not found
             cursor.execute("INSERT INTO user_profiles (id, name, role, reportsTo) VALUES (?, ?, ?, ?)",
                            (MANAGER_ID, 'Default Manager', 'Manager', None))
             cursor.execute("INSERT INTO user_profiles (id, name, role, reportsTo) VALUES (?, ?, ?, ?)",
                            (EMPLOYEE_ID, 'Demo Employee', 'Employee', MANAGER_ID))
             CONN.commit()
-            logging.info(f"Seeded manager profile: {MANAGER_ID} and employee profile: {EMPLOYEE_ID}")
+            DB_LOG.info("Seeded manager profile: %s and employee profile: %s", MANAGER_ID, EMPLOYEE_ID)
         except sqlite3.Error as e:
-            logging.error(f"Error seeding database from {seed_file}: {e}", exc_info=True)
-            print(f"Error seeding database: {e}")
+            DB_LOG.error("Error seeding database from %s: %s", seed_file, e, exc_info=True)
 
     # Load the initial user profile (which is the employee)
-    cursor.execute("SELECT name, role, reportsTo FROM user_profiles WHERE id=?", (CURRENT_USER_ID,))
+    cursor.execute("SELECT name, role, reportsTo FROM user_profiles WHERE id=?", (DEFAULT_USER_ID,))
     profile_data = cursor.fetchone()
 
     if not profile_data:
-        # This can happen if CURRENT_USER_ID is not in the seeded data.
+        # This can happen if DEFAULT_USER_ID is not in the seeded data.
         # Let's ensure the default user exists to prevent a crash.
-        logging.warning(f"Current user ID '{CURRENT_USER_ID}' not found. Creating a default profile.")
+        DB_LOG.warning("Current user ID '%s' not found. Creating a default profile.", DEFAULT_USER_ID)
         cursor.execute("INSERT OR IGNORE INTO user_profiles (id, name, role, reportsTo) VALUES (?, ?, ?, ?)",
                        (MANAGER_ID, 'Default Manager', 'Manager', None))
         cursor.execute("INSERT OR IGNORE INTO user_profiles (id, name, role, reportsTo) VALUES (?, ?, ?, ?)",
                        (EMPLOYEE_ID, 'Demo Employee', 'Employee', MANAGER_ID))
         CONN.commit()
-        cursor.execute("SELECT name, role, reportsTo FROM user_profiles WHERE id=?", (CURRENT_USER_ID,))
+        cursor.execute("SELECT name, role, reportsTo FROM user_profiles WHERE id=?", (DEFAULT_USER_ID,))
         profile_data = cursor.fetchone()
         if not profile_data:
-             raise RuntimeError(f"Could not load profile for user '{CURRENT_USER_ID}'. The database may be inconsistent.")
+             raise RuntimeError(f"Could not load profile for user '{DEFAULT_USER_ID}'. The database may be inconsistent.")
 
-    logging.info(f"Database initialization complete. Current user: {profile_data[0]}")
+    PROFILE_CACHE.invalidate()
+    RESULT_CACHE.invalidate()
+    _DB_READY = True
+    DB_LOG.info("Database initialization complete. Current user: %s", profile_data[0])
     return {
-        'id': CURRENT_USER_ID,
+        'id': DEFAULT_USER_ID,
         'name': profile_data[0],
         'role': profile_data[1],
         'reportsTo': profile_data[2]
     }
 
-# Initialize DB and get current profile
-CURRENT_PROFILE = init_db()
+# --- Bulk Import ---
+# Streams rows from CSV, JSONL or SQL files into the database in chunks. Used for
+# first-run seeding and for migrating history from other systems.
+
+IMPORT_CHUNK_SIZE = 10_000  # Rows (or SQL statements) per executemany call and commit
+IMPORT_TABLES: Dict[str, Tuple[str, ...]] = {
+    "timesheets": ('id', 'employeeId', 'managerId', 'date', 'hours', 'task', 'status', 'submittedAt', 'approvedAt'),
+    "user_profiles": ('id', 'name', 'role', 'reportsTo'),
+}
+# Loader-friendly settings, applied only for the duration of an import. With
+# synchronous=OFF a power loss mid-import can lose the last chunks, never corrupt the file.
+IMPORT_PRAGMAS = {"synchronous": "OFF", "cache_size": "-262144", "temp_store": "MEMORY"}
+
+def read_import_rows(path: str, table: str) -> Iterator[tuple]:
+    """
+    Yields rows for `table` from a CSV (with a header) or JSONL file, one at a time.
+
+    Columns are matched by name against IMPORT_TABLES; missing columns and empty
+    CSV fields become NULL. A timesheet without submittedAt, which is required,
+    is taken as submitted on its work date.
+    """
+    fields = IMPORT_TABLES[table]
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            records = ({field: value or None for field, value in record.items()} for record in csv.DictReader(f))
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        for record in records:
+            if table == "timesheets" and not record.get('submittedAt'):
+                record['submittedAt'] = record.get('date')
+            yield tuple(record.get(field) for field in fields)
+
+def read_sql_statements(path: str) -> Iterator[str]:
+    """Yields the complete SQL statements of a script one at a time, without loading the whole file."""
+    statement = ""
+    with open(path) as f:
+        for line in f:
+            statement += line
+            if sqlite3.complete_statement(statement):
+                yield statement
+                statement = ""
+    if statement.strip() and not statement.strip().startswith('--'):
+        yield statement
+
+def _chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def bulk_import(path: str, table: str = "timesheets", conn: Optional[sqlite3.Connection] = None,
+                chunk_size: int = IMPORT_CHUNK_SIZE, on_conflict: str = "abort", defer_indexes: bool = True,
+                progress: Optional[Callable[[int, float], None]] = None) -> Dict[str, Any]:
+    """
+    Loads a CSV, JSONL or SQL file into the database.
+
+    CSV and JSONL rows go into `table` through one executemany per chunk. SQL
+    files are executed statement by statement, committing once per chunk. During
+    the load, IMPORT_PRAGMAS are in effect. With `defer_indexes`, the table's
+    secondary indexes and triggers are dropped first and rebuilt after the load,
+    and the aggregate tables (and, for profiles, the reporting hierarchy) are
+    recomputed. They are restored even if the load fails part way; chunks
+    committed before the failure stay loaded.
+
+    Args:
+        path: The file to load. The format is taken from the extension (.csv, .jsonl, .sql).
+        table: The target table for CSV/JSONL rows, a key of IMPORT_TABLES.
+        conn: The connection to load through. Defaults to the calling thread's connection.
+        chunk_size: Rows or statements per chunk.
+        on_conflict: 'abort', 'ignore' or 'replace' for rows whose ID already exists.
+        defer_indexes: Drop and rebuild indexes and triggers around the load.
+        progress: Called after each chunk with (rows loaded so far, seconds elapsed).
+
+    Returns:
+        {"rows": int, "seconds": float, "rows_per_second": float}
+    """
+    if table not in IMPORT_TABLES:
+        raise ValueError(f"Cannot import into '{table}'. Choose one of: {', '.join(IMPORT_TABLES)}.")
+    if on_conflict not in ("abort", "ignore", "replace"):
+        raise ValueError(f"Invalid on_conflict '{on_conflict}'. Must be 'abort', 'ignore' or 'replace'.")
+    conn = conn or get_conn()
+    is_sql = path.endswith('.sql')
+    DB_LOG.info("Bulk import of %s into %s started.", path, 'the database' if is_sql else table)
+
+    saved_pragmas = {name: conn.execute(f"PRAGMA {name}").fetchone()[0] for name in IMPORT_PRAGMAS}
+    for name, value in IMPORT_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+    # Indexes and triggers of every table the load may touch, to rebuild after it.
+    deferred: List[Tuple[str, str, str]] = []
+    if defer_indexes:
+        tables = list(IMPORT_TABLES) if is_sql else [table]
+        deferred = conn.execute(
+            f"SELECT type, name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND sql IS NOT NULL "
+            f"AND tbl_name IN ({', '.join('?' * len(tables))})", tables
+        ).fetchall()
+        with conn:
+            for kind, name, _ in deferred:
+                conn.execute(f"DROP {kind.upper()} IF EXISTS {name}")
+
+    start = time.perf_counter()
+    loaded = 0
+    try:
+        if is_sql:
+            for chunk in _chunks(read_sql_statements(path), chunk_size):
+                with conn:
+                    for statement in chunk:
+                        conn.execute(statement)
+                loaded += len(chunk)
+                if progress:
+                    progress(loaded, time.perf_counter() - start)
+        else:
+            fields = IMPORT_TABLES[table]
+            verb = {"abort": "INSERT", "ignore": "INSERT OR IGNORE", "replace": "INSERT OR REPLACE"}[on_conflict]
+            insert = f"{verb} INTO {table} ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})"
+            for chunk in _chunks(read_import_rows(path, table), chunk_size):
+                with conn:
+                    conn.executemany(insert, chunk)
+                loaded += len(chunk)
+                if progress:
+                    progress(loaded, time.perf_counter() - start)
+    finally:
+        if deferred:
+            # Indexes first (faster to build over the loaded rows), then the aggregates the
+            # dropped triggers missed, then the triggers, all in one write transaction.
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for kind, _, sql in sorted(deferred, key=lambda item: item[0] != 'index'):
+                    if kind == 'index':
+                        conn.execute(sql)
+                rebuild = aggregate_rebuild_statements()
+                if "user_profiles" in tables:
+                    rebuild += org_closure_rebuild_statements()
+                for statement in rebuild:
+                    conn.execute(statement)
+                for kind, _, sql in deferred:
+                    if kind == 'trigger':
+                        conn.execute(sql)
+            conn.execute("PRAGMA optimize")
+        for name, value in saved_pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        PROFILE_CACHE.invalidate()
+        RESULT_CACHE.invalidate()
+
+    seconds = time.perf_counter() - start
+    DB_LOG.info("Bulk import of %s finished: %s rows in %.1fs.", path, loaded, seconds)
+    return {"rows": loaded, "seconds": round(seconds, 3), "rows_per_second": round(loaded / seconds) if seconds else 0}
 
 # --- Utility Functions (Database Access) ---
 
 def get_user_name(user_id: str) -> str:
     """Retrieves the display name for a given user ID."""
-    if not CONN: return "Unknown"
-    cursor = CONN.cursor()
-    cursor.execute("SELECT name FROM user_profiles WHERE id=?", (user_id,))
-    result = cursor.fetchone()
-    return result[0] if result else f'User-{user_id[:4]}'
+    if not get_conn(): return "Unknown"
+    profile = get_user_profile(user_id)
+    return profile['name'] if profile else f'User-{user_id[:4]}'
+
+def build_timesheets_source(scope: str = "direct") -> str:
+    """
+    Returns the FROM clause shared by the timesheet list and count queries.
+
+    With scope 'org', timesheets are reached through the reporting hierarchy
+    (org_closure, aliased `c`) instead of their managerId.
+    """
+    if scope not in ORG_SCOPES:
+        raise ValueError(f"Invalid scope '{scope}'. Must be one of {', '.join(ORG_SCOPES)}.")
+    if scope == "org":
+        return " FROM org_closure c JOIN timesheets t ON t.employeeId = c.descendantId"
+    return " FROM timesheets t"
 
-def get_timesheets(user_id=None, manager_id=None, status=None, limit=None) -> List[Dict[str, Any]]:
-    """Filters timesheets based on criteria."""
-    if not CONN: return []
-    query = "SELECT id, date, hours, task, status, employeeId, submittedAt FROM timesheets WHERE 1=1"
+def build_timesheets_filter(user_id=None, manager_id=None, status=None, scope: str = "direct"):
+    """Builds the WHERE clause and parameters shared by the timesheet list and count queries."""
+    where = " WHERE 1=1"
     params = []
 
     if user_id:
-        query += " AND employeeId = ?"
+        where += " AND t.employeeId = ?"
         params.append(user_id)
-    if manager_id:
-        query += " AND managerId = ?"
+    if manager_id and scope == "org":
+        # Everyone below the manager, at any depth, but not the manager's own sheets.
+        where += " AND c.ancestorId = ? AND c.depth > 0"
+        params.append(manager_id)
+    elif manager_id:
+        where += " AND t.managerId = ?"
         params.append(manager_id)
     if status:
-        query += " AND status = ?"
+        where += " AND t.status = ?"
         params.append(status)
+    return where, params
+
+def build_timesheets_query(user_id=None, manager_id=None, status=None, limit=None, with_employee_name=False,
+                           columns: Optional[Sequence[str]] = None, after: Optional[Tuple[str, ...]] = None,
+                           scope: str = "direct"):
+    """
+    Builds the SELECT statement and parameters used by get_timesheets.
+
+    Rows are ordered newest first by (submittedAt, id). `after` is a keyset
+    position from decode_page_token; only rows strictly older are returned.
+    With scope 'org', rows are grouped by employee (in ID order) and `after`
+    is an (employeeId, submittedAt, id) position, so the hierarchy's primary
+    key and the per-employee index return them without a sort.
+    Raises ValueError for a column outside TIMESHEET_COLUMNS or an unknown scope.
+    """
+    columns = columns or DEFAULT_TIMESHEET_COLUMNS
+    unknown = [column for column in columns if column not in TIMESHEET_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown timesheet column(s): {', '.join(unknown)}.")
+    query = "SELECT " + ", ".join(f"t.{column}" for column in columns)
+    if with_employee_name:
+        # Same fallback as get_user_name for employees without a profile.
+        query += ", COALESCE(p.name, 'User-' || substr(t.employeeId, 1, 4)) AS employee_name"
+        query += build_timesheets_source(scope) + " LEFT JOIN user_profiles p ON p.id = t.employeeId"
+    else:
+        query += build_timesheets_source(scope)
+
+    where, params = build_timesheets_filter(user_id, manager_id, status, scope)
+    query += where
+    if after is not None and scope == "org":
+        query += " AND c.descendantId >= ? AND (c.descendantId > ? OR (t.submittedAt, t.id) < (?, ?))"
+        params.extend([after[0], *after])
+    elif after is not None:
+        query += " AND (t.submittedAt, t.id) < (?, ?)"
+        params.extend(after)
 
-    query += " ORDER BY submittedAt DESC"
+    if scope == "org":
+        query += " ORDER BY c.descendantId, t.submittedAt DESC, t.id DESC"
+    else:
+        query += " ORDER BY t.submittedAt DESC, t.id DESC"
     if limit is not None:
-        query += f" LIMIT {limit}"
+        query += " LIMIT ?"
+        params.append(int(limit))
+    return query, params
 
-    cursor = CONN.cursor()
+def get_user_profile(user_id: str) -> Optional[Dict[str, Any]]:
+    """Retrieves the profile (id, name, role, reportsTo) for a given user ID, served from PROFILE_CACHE when possible."""
+    cached = PROFILE_CACHE.get(user_id)
+    if cached is not None:
+        return dict(cached)
+    conn = get_conn()
+    if not conn: return None
+    generation = PROFILE_CACHE.generation
+    cursor = conn.cursor()
+    cursor.execute("SELECT name, role, reportsTo FROM user_profiles WHERE id=?", (user_id,))
+    result = cursor.fetchone()
+    if not result:
+        return None
+    profile = {'id': user_id, 'name': result[0], 'role': result[1], 'reportsTo': result[2]}
+    PROFILE_CACHE.put(user_id, profile, generation)
+    return dict(profile)
+
+async def set_role(user_id: str, new_role: str, session: Optional["Session"] = None) -> dict:
+    """
+    Updates a user's role in the database and, if a session is given, in the user's session state.
+
+    The role lives in 'user:'-scoped state, so the change is visible to every
+    session of that user, not only the one passed in.
+    """
+    LOG.info("Role change to '%s' requested for user '%s'.", new_role, user_id)
+    if new_role not in ['Employee', 'Manager']:
+        return {"status": "error", "error_message": "Invalid role. Must be 'Employee' or 'Manager'."}
+    try:
+        # Off the event loop: a wait on the write lock must not stall the other sessions.
+        await run_write_tool(run_write, lambda write_conn: write_conn.execute(
+            "UPDATE user_profiles SET role = ? WHERE id = ?", (new_role, user_id)))
+        PROFILE_CACHE.invalidate(user_id)
+        invalidate_results(user_ids=[user_id], manager_ids=[user_id])
+        if session is not None:
+            from google.adk.events import Event, EventActions
+
+            event = Event(
+                invocation_id=f"set_role-{uuid4()}",
+                author="user",
+                actions=EventActions(state_delta={'user:role': new_role}),
+            )
+            await get_session_service().append_event(session, event)
+        LOG.info("Role for user '%s' successfully updated to %s.", user_id, new_role)
+        return {"status": "success", "message": f"Role updated to {new_role}."}
+    except Exception as e:
+        LOG.error("Error updating role: %s", e, exc_info=True)
+        return {"status": "error", "error_message": f"Error updating role: {e}"}
+
+def get_timesheets(user_id=None, manager_id=None, status=None, limit=None, with_employee_name=False,
+                   columns: Optional[Sequence[str]] = None, after: Optional[Tuple[str, ...]] = None,
+                   scope: str = "direct") -> List[Dict[str, Any]]:
+    """
+    Filters timesheets based on criteria.
+
+    `columns` selects which TIMESHEET_COLUMNS to fetch. With `with_employee_name`,
+    each row also carries the employee's display name. With scope 'org',
+    `manager_id` matches every sheet of the people below that manager.
+    """
+    conn = get_conn()
+    if not conn: return []
+    query, params = build_timesheets_query(user_id, manager_id, status, limit, with_employee_name, columns, after, scope)
+
+    cursor = conn.cursor()
     cursor.execute(query, params)
 
     columns = [desc[0] for desc in cursor.description]
     return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
+def get_timesheets_page(user_id=None, manager_id=None, status=None, with_employee_name=False,
+                        columns: Optional[Sequence[str]] = None, page_size: int = DEFAULT_PAGE_SIZE,
+                        page_token: Optional[str] = None, scope: str = "direct") -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Returns one page of get_timesheets results and the token for the next page (None on the last page).
+
+    The page size is clamped to 1..MAX_PAGE_SIZE. `id` and `submittedAt` (and
+    `employeeId` with scope 'org') are always fetched because the continuation
+    token is built from them.
+    Raises ValueError for a malformed token, unknown column or unknown scope.
+    """
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    position = ('employeeId', 'submittedAt', 'id') if scope == "org" else ('submittedAt', 'id')
+    after = decode_page_token(page_token, len(position)) if page_token else None
+    columns = list(columns or DEFAULT_TIMESHEET_COLUMNS)
+    for key in position:
+        if key not in columns:
+            columns.append(key)
+
+    # Fetch one extra row to learn whether another page exists.
+    rows = get_timesheets(user_id, manager_id, status, page_size + 1, with_employee_name, columns, after, scope)
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_page_token(*(rows[-1][key] for key in position))
+
+def count_timesheets(user_id=None, manager_id=None, status=None, scope: str = "direct") -> int:
+    """Counts the timesheets matching the same criteria as get_timesheets."""
+    conn = get_conn()
+    if not conn: return 0
+    query, params = build_count_query(user_id, manager_id, status, scope)
+    return conn.execute(query, params).fetchone()[0]
+
+def build_count_query(user_id=None, manager_id=None, status=None, scope: str = "direct"):
+    """Builds the COUNT statement and parameters used by count_timesheets."""
+    where, params = build_timesheets_filter(user_id, manager_id, status, scope)
+    return "SELECT COUNT(*)" + build_timesheets_source(scope) + where, params
+
+async def get_user_name_async(user_id: str) -> str:
+    """Async variant of get_user_name that runs on the DB worker pool."""
+    return await run_db(get_user_name, user_id)
+
+async def get_timesheets_async(user_id=None, manager_id=None, status=None, limit=None, with_employee_name=False,
+                               columns: Optional[Sequence[str]] = None, after: Optional[Tuple[str, ...]] = None,
+                               scope: str = "direct") -> List[Dict[str, Any]]:
+    """Async variant of get_timesheets that runs on the DB worker pool."""
+    return await run_db(get_timesheets, user_id, manager_id, status, limit, with_employee_name, columns, after, scope)
+
+def tool_queries() -> Dict[str, tuple]:
+    """Returns every statement the tools issue, keyed by a short label, with sample parameters."""
+    today = datetime.now().strftime('%Y-%m-%d')
+    return {
+        "view_queries.pending_count": build_status_count_query('Pending', user_id=EMPLOYEE_ID),
+        "view_queries.monthly_hours": (MONTHLY_HOURS_QUERY, [EMPLOYEE_ID, today]),
+        "view_queries.recent": build_timesheets_query(user_id=EMPLOYEE_ID, limit=4),
+        "view_queries.recent_next_page": build_timesheets_query(user_id=EMPLOYEE_ID, limit=4, after=(today, 'ts-1')),
+        "manager_approval.pending": build_timesheets_query(
+            manager_id=MANAGER_ID, status='Pending', limit=DEFAULT_PAGE_SIZE + 1, with_employee_name=True, columns=PENDING_SHEET_COLUMNS),
+        "manager_approval.pending_next_page": build_timesheets_query(
+            manager_id=MANAGER_ID, status='Pending', limit=DEFAULT_PAGE_SIZE + 1, with_employee_name=True, columns=PENDING_SHEET_COLUMNS,
+            after=(today, 'ts-1')),
+        "manager_approval.total_pending": build_status_count_query('Pending', manager_id=MANAGER_ID),
+        "manager_approval.org_pending": build_timesheets_query(
+            manager_id=MANAGER_ID, status='Pending', limit=DEFAULT_PAGE_SIZE + 1, with_employee_name=True,
+            columns=ORG_PENDING_SHEET_COLUMNS, scope="org"),
+        "manager_approval.org_pending_next_page": build_timesheets_query(
+            manager_id=MANAGER_ID, status='Pending', limit=DEFAULT_PAGE_SIZE + 1, with_employee_name=True,
+            columns=ORG_PENDING_SHEET_COLUMNS, after=(EMPLOYEE_ID, today, 'ts-1'), scope="org"),
+        "manager_approval.org_total_pending": build_status_count_query('Pending', manager_id=MANAGER_ID, scope="org"),
+        "update_status.update": (
+            "UPDATE timesheets SET status = ?, approvedAt = ? WHERE managerId = ? AND status = 'Pending' AND id IN (?) RETURNING id",
+            ['Approved', today, MANAGER_ID, 'ts-1']),
+        "update_status.filter_update": (
+            "UPDATE timesheets SET status = ?, approvedAt = ? WHERE managerId = ? AND status = 'Pending' AND employeeId = ? AND date < ? RETURNING id",
+            ['Approved', today, MANAGER_ID, EMPLOYEE_ID, today]),
+        "update_status.explain_missed": ("SELECT id, managerId FROM all_timesheets WHERE id IN (?, ?)", ['ts-1', 'ts-2']),
+        "get_user_profile": ("SELECT name, role, reportsTo FROM user_profiles WHERE id=?", [EMPLOYEE_ID]),
+        "team_hours_report.team": (reporting.build_report_query(MANAGER_ID), [today, today, MANAGER_ID]),
+        "team_hours_report.org": (reporting.build_report_query(MANAGER_ID, scope="org"), [today, today, MANAGER_ID]),
+    }
+
+def check_query_plans(conn: Optional[sqlite3.Connection] = None) -> Dict[str, List[str]]:
+    """
+    Runs EXPLAIN QUERY PLAN over every tool query and reports the ones that are not index-served.
+
+    A plan step is flagged when it scans a whole table or index ("SCAN ...") or
+    needs a temporary B-tree to sort the results.
+
+    Returns:
+        A dictionary mapping each offending query label to its flagged plan steps.
+        An empty dictionary means every tool query is served by an index.
+    """
+    conn = conn or get_conn()
+    problems: Dict[str, List[str]] = {}
+    for label, (query, params) in tool_queries().items():
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        flagged = [row[-1] for row in plan if row[-1].startswith("SCAN") or "TEMP B-TREE" in row[-1]]
+        if flagged:
+            problems[label] = flagged
+    return problems
+
 if __name__ == '__main__':
+    import argparse
     import asyncio
+    import sys
+
+    parser = argparse.ArgumentParser(description="ADK timesheet agent console.")
+    subcommands = parser.add_subparsers(dest="command")
+    subcommands.add_parser("check-plans", help="Verify with EXPLAIN QUERY PLAN that no tool query does a full scan.")
+    aggregates_parser = subcommands.add_parser("aggregates", help="Recompute the hour aggregates and reporting hierarchy from raw rows and report drift.")
+    aggregates_parser.add_argument("action", choices=["verify", "rebuild"], help="'rebuild' also rewrites the aggregate tables.")
+    import_parser = subcommands.add_parser("import", help="Bulk-load timesheets or profiles from a CSV, JSONL or SQL file.")
+    import_parser.add_argument("path", help="File to load; the format is taken from the extension (.csv, .jsonl, .sql).")
+    import_parser.add_argument("--table", choices=list(IMPORT_TABLES), default="timesheets", help="Target table for CSV/JSONL rows.")
+    import_parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    import_parser.add_argument("--on-conflict", choices=["abort", "ignore", "replace"], default="abort",
+                               help="What to do with rows whose ID already exists.")
+    export_parser = subcommands.add_parser("export", help="Stream approved hours over a date range to a CSV or JSONL file.")
+    export_parser.add_argument("output", help="File to write ('-' for stdout); the format is taken from the extension (.csv, .jsonl).")
+    export_parser.add_argument("--start", required=True, help="First day, YYYY-MM-DD (inclusive).")
+    export_parser.add_argument("--end", required=True, help="Last day, YYYY-MM-DD (inclusive).")
+    export_parser.add_argument("--group-by", choices=reporting.REPORT_GROUPINGS, default="employee")
+    export_parser.add_argument("--manager", help="Only this manager's direct reports; default: every employee.")
+    export_parser.add_argument("--org", action="store_true", help="With --manager, everyone below the manager at any depth.")
+    export_parser.add_argument("--format", choices=["csv", "jsonl"], help="Overrides the format implied by the extension.")
+    archive_parser = subcommands.add_parser("archive", help="Move settled timesheets older than a cutoff to the archive table.")
+    archive_parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS,
+                                help="Archive Approved and Rejected sheets dated more than this many days ago.")
+    archive_parser.add_argument("--before", help="Archive settled sheets dated before this day (YYYY-MM-DD) instead.")
+    serve_parser = subcommands.add_parser(
+        "serve", help="Serve the agent over HTTP, streaming replies with SSE.",
+        description=f"Serve the agent over HTTP, streaming replies with SSE. The {HTTP_USER_HEADER} header is trusted "
+                    f"without authentication, so run the server behind an authenticating proxy that sets it.")
+    serve_parser.add_argument("--host", default=HTTP_HOST, help="Address to bind; only loopback addresses without --allow-remote.")
+    serve_parser.add_argument("--allow-remote", action="store_true", default=HTTP_ALLOW_REMOTE,
+                              help=f"Allow a non-loopback --host. Anyone who can reach the server can then act as any user "
+                                   f"through {HTTP_USER_HEADER}.")
+    serve_parser.add_argument("--port", type=int, default=HTTP_PORT)
+    serve_parser.add_argument("--max-model-calls", type=int, default=HTTP_MAX_MODEL_CALLS,
+                              help="Most model calls in flight at once; further turns wait.")
+    args = parser.parse_args()
+    configure_logging()
+
+    if args.command == "check-plans":
+        problems = check_query_plans()
+        for label, steps in problems.items():
+            print(f"FULL SCAN  {label}: {'; '.join(steps)}")
+        print(f"{len(tool_queries()) - len(problems)}/{len(tool_queries())} tool queries are index-served.")
+        sys.exit(1 if problems else 0)
+
+    if args.command == "aggregates":
+        drift = verify_aggregates(rebuild=args.action == "rebuild")
+        for table, report in drift.items():
+            print(f"DRIFT  {table}: {report['missing']} missing/different, {report['unexpected']} unexpected. "
+                  f"Examples: {report['examples']}")
+        if not drift:
+            print(f"All {len(AGGREGATE_TABLES)} aggregate tables and the reporting hierarchy match the raw rows.")
+        elif args.action == "rebuild":
+            print("Aggregate tables and reporting hierarchy rebuilt from the raw rows.")
+        sys.exit(1 if drift and args.action == "verify" else 0)
+
+    if args.command == "import":
+        def report_progress(rows, seconds):
+            print(f"\r{rows:,} rows loaded ({rows / seconds if seconds else 0:,.0f} rows/s)", end="", file=sys.stderr, flush=True)
+
+        stats = bulk_import(args.path, table=args.table, chunk_size=args.chunk_size,
+                            on_conflict=args.on_conflict, progress=report_progress)
+        print(file=sys.stderr)
+        print(f"Imported {stats['rows']:,} rows in {stats['seconds']:.1f}s ({stats['rows_per_second']:,} rows/s).")
+        sys.exit(0)
+
+    if args.command == "export":
+        def report_progress(rows, seconds):
+            print(f"\r{rows:,} rows written ({rows / seconds if seconds else 0:,.0f} rows/s)", end="", file=sys.stderr, flush=True)
+
+        try:
+            stats = reporting.export_report(get_conn(), args.output, args.start, args.end, group_by=args.group_by,
+                                            manager_id=args.manager, fmt=args.format, progress=report_progress,
+                                            scope="org" if args.org else "direct")
+        except ValueError as e:
+            parser.error(str(e))
+        print(file=sys.stderr)
+        print(f"Exported {stats['rows']:,} rows in {stats['seconds']:.1f}s ({stats['rows_per_second']:,} rows/s).", file=sys.stderr)
+        sys.exit(0)
+
+    if args.command == "archive":
+        def report_progress(rows, seconds):
+            print(f"\r{rows:,} rows archived ({rows / seconds if seconds else 0:,.0f} rows/s)", end="", file=sys.stderr, flush=True)
+
+        try:
+            stats = archive_settled(args.older_than_days, before=args.before, progress=report_progress)
+        except ValueError as e:
+            parser.error(str(e))
+        print(file=sys.stderr)
+        print(f"Archived {stats['rows']:,} settled timesheets dated before {stats['cutoff']} in {stats['seconds']:.1f}s.")
+        sys.exit(0)
+
+    if args.command == "serve":
+        try:
+            serve(args.host, args.port, args.max_model_calls, args.allow_remote)
+        except ValueError as e:
+            parser.error(str(e))
+        sys.exit(0)
+
     # This block now contains the main agent loop.
+    runner = get_runner()
+    session_service = get_session_service()
+    print("✅ Timesheet agent created with custom function tools")
+    print("🔧 Available tools:")
+    for tool_name, schema in TOOL_SCHEMAS.items():
+        print(f"  • {tool_name} - {schema['description']}")
+    print("✅ Stateful agent initialized!")
+    print(f"   - Application: {APP_NAME}")
+    print(f"   - Using: {session_service.__class__.__name__}")
+    if METRICS_PORT:
+        server = start_metrics_server()
+        print(f"   - Metrics: http://127.0.0.1:{server.server_port}/metrics")
+
     print("=" * 70)
     print(f"ADK TIMESHEET AGENT CONSOLE (Python CLI)")
     print("-" * 70)
-    print(f"User: {CURRENT_PROFILE['name']} | Role: {CURRENT_PROFILE['role']} (ID: {CURRENT_USER_ID[:8]}...)")
+    profile = get_user_profile(DEFAULT_USER_ID)
+    print(f"User: {profile['name']} | Role: {profile['role']} (ID: {DEFAULT_USER_ID[:8]}...)")
     print(f"Database: {DB_NAME}")
     print("NOTE: Using live Gemini API calls.")
-    print("Tip: Type 'role manager' or 'role employee' to switch roles.")
+    print("Tip: Type 'role manager' or 'role employee' to switch roles, 'stats' for cache counters, or 'metrics' for latency histograms.")
     print("=" * 70)
 
-    def set_role(new_role):
-        """Updates the current user's role in the database and session."""
-        logging.info(f"User requested role change to '{new_role}'.")
-        global CURRENT_PROFILE
-        if new_role not in ['Employee', 'Manager']:
-            print("Invalid role. Must be 'Employee' or 'Manager'.")
-            return
-        if not CONN: return
-        try:
-            cursor = CONN.cursor()
-            cursor.execute("UPDATE user_profiles SET role = ? WHERE id = ?", (new_role, CURRENT_USER_ID))
-            CONN.commit()
-            CURRENT_PROFILE['role'] = new_role
-            logging.info(f"Role successfully updated to {new_role}.")
-            print(f"\n[SYSTEM] Role updated to {new_role}.")
-        except Exception as e:
-            logging.error(f"Error updating role: {e}", exc_info=True)
-            print(f"Error updating role: {e}")
-
     async def main_loop():
         session_name = "cli_session"
         try:
             session = await session_service.create_session(
-                app_name=APP_NAME, user_id=CURRENT_USER_ID, session_id=session_name
+                app_name=APP_NAME, user_id=DEFAULT_USER_ID, session_id=session_name,
+                state=profile_state(profile)
             )
         except Exception:
             session = await session_service.get_session(
-                app_name=APP_NAME, user_id=CURRENT_USER_ID, session_id=session_name
+                app_name=APP_NAME, user_id=DEFAULT_USER_ID, session_id=session_name
             )
+            print(f"[SYSTEM] Resumed session '{session_name}' ({len(session.events)} events).")
 
         while True:
             print("\nAGENT: How can I help you? (e.g., 'view status', 'submit 7.5 hours for Project X', 'review approvals')")
             command = input("Your query: ").strip()
 
             if command.lower() in ('q', 'quit', 'exit'):
-                logging.info("User requested to quit. Closing database connection.")
+                LOG.info("User requested to quit. Closing database connection.")
                 print(f"\nGoodbye! Closing connection to {DB_NAME}.")
                 if CONN:
                     CONN.close()
                 break
 
+            if command.lower() == 'stats':
+                for cache_name, stats in cache_stats().items():
+                    print(f"[SYSTEM] {cache_name} cache: {stats}")
+                print(f"[SYSTEM] group commit: {WRITE_COORDINATOR.stats()}")
+                print(f"[SYSTEM] model calls: {MODEL_SCHEDULER.stats()}")
+                print(f"[SYSTEM] logging: {logging_stats()}")
+                print(f"[SYSTEM] fast path: {fast_path_stats()}")
+                continue
+
+            if command.lower() == 'metrics':
+                print(metrics_text() if INSTRUMENTATION_ENABLED else "[SYSTEM] Instrumentation is off; set TIMESHEET_INSTRUMENTATION=1.")
+                continue
+
             if command.lower().startswith('role '):
                 parts = command.split(' ', 1)
                 if len(parts) == 2:
-                    set_role(parts[1].strip().capitalize())
+                    result = await set_role(DEFAULT_USER_ID, parts[1].strip().capitalize(), session)
+                    if result["status"] == "success":
+                        print(f"\n[SYSTEM] {result['message']}")
+                    else:
+                        print(result["error_message"])
                 else:
                     print("Usage: role [manager|employee]")
                 continue
 
             try:
-                logging.info(f"Received user query: '{command}'")
-                timesheet_agent.instruction = get_agent_instruction(CURRENT_USER_ID, CURRENT_PROFILE['role'])
-
-                logging.info("Invoking agent chat...")
-                await run_session(runner, CURRENT_USER_ID, session, command) # type: ignore
-                logging.info("Agent returned response.")
+                LOG.info("Received user query: '%s'", command)
+                LOG.info("Invoking agent chat...")
+                await run_session(runner, DEFAULT_USER_ID, session, command) # type: ignore
+                LOG.info("Agent returned response.")
 
             except Exception as e:
-                logging.error(f"An unhandled error occurred in the agent loop: {e}", exc_info=True)
+                LOG.error("An unhandled error occurred in the agent loop: %s", e, exc_info=True)
                 print(f"\nAGENT ERROR: An unhandled error occurred during tool execution: {e}")
 
     asyncio.run(main_loop())
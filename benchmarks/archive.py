@@ -0,0 +1,150 @@
+"""
+Measures hot-path latency before and after archiving a multi-year history.
+
+Generates a synthetic organisation whose timesheets are spread over `--years`
+years (see `benchmarks.synthetic_data`), then times the interactive tools for a
+fixed, seeded sample of employees and managers: `get_timesheets`,
+`tool_view_queries`, `tool_manager_approval`, `tool_update_timesheet_status`,
+`tool_submit_timesheet` and a 30-day `tool_team_hours_report`. The result cache
+is cleared before every call. It then runs `archive_settled` with a cutoff
+`--keep-days` before the last day of the dataset, times the same calls again
+and prints both runs side by side, with the size of the hot table and its
+indexes before and after.
+
+The approved hours over the whole history, and the aggregate tables, must be
+identical before and after archiving; the benchmark fails if they are not.
+
+Usage (from the repository root):
+    python -m benchmarks.archive [--managers 1000] [--timesheets 2000000] [--years 4] [--keep-days 90] [--calls 300]
+"""
+import argparse
+import datetime
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+
+END_DATE = datetime.date(2025, 11, 28)
+
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def hot_table_mib(conn) -> float:
+    """Size of the timesheets table and its indexes, from the dbstat virtual table (0 if unavailable)."""
+    try:
+        return conn.execute(
+            "SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE aggregate = TRUE AND name IN "
+            "(SELECT name FROM sqlite_master WHERE tbl_name = 'timesheets' AND type IN ('table', 'index'))"
+        ).fetchone()[0] / 2 ** 20
+    except Exception:
+        return 0.0
+
+
+def run_calls(agent, calls: dict) -> dict:
+    """Runs each tool's zero-argument callables and returns {tool: (p50 ms, p95 ms)}."""
+    results = {}
+    for name, tool_calls in calls.items():
+        latencies = []
+        for call in tool_calls:
+            agent.RESULT_CACHE.invalidate()
+            started = time.perf_counter()
+            result = call()
+            latencies.append(time.perf_counter() - started)
+            assert not isinstance(result, dict) or result.get("status", "success") == "success", (name, result)
+        results[name] = (percentile(latencies, 0.5) * 1000, percentile(latencies, 0.95) * 1000)
+    return results
+
+
+def tool_calls(agent, employees: list, managers: list, pending: list, month_start: str) -> dict:
+    last_day = END_DATE.isoformat()
+    return {
+        "get_timesheets": [lambda user=user: agent.get_timesheets(user_id=user, limit=agent.DEFAULT_PAGE_SIZE)
+                           for user in employees],
+        "tool_view_queries": [lambda user=user: agent.tool_view_queries(user) for user in employees],
+        "tool_manager_approval": [lambda manager=manager: agent.tool_manager_approval(manager) for manager in managers],
+        "tool_update_timesheet_status": [
+            lambda manager=manager, sheet=sheet: agent.tool_update_timesheet_status(manager, sheet, 'Approved')
+            for manager, sheet in pending],
+        "tool_submit_timesheet": [lambda user=user: agent.tool_submit_timesheet(user, 8, task="Archive benchmark")
+                                  for user in employees],
+        "tool_team_hours_report": [
+            lambda manager=manager: agent.tool_team_hours_report(manager, month_start, last_day) for manager in managers],
+    }
+
+
+def approved_hours(conn) -> float:
+    return round(conn.execute("SELECT COALESCE(SUM(hours), 0) FROM hours_daily WHERE status = 'Approved'").fetchone()[0], 3)
+
+
+def main(args, workdir: str) -> None:
+    os.environ["TIMESHEET_DB_PATH"] = os.path.join(workdir, "archive.db")
+    import agent  # Imported late so it opens the benchmark database.
+    from benchmarks.synthetic_data import build_dataset
+
+    logging.getLogger().setLevel(logging.WARNING)
+    conn = agent.get_conn()
+    history_days = args.years * 365
+    print(f"Generating {args.managers:,} managers and {args.timesheets:,} timesheets over {args.years} years...")
+    started = time.perf_counter()
+    build_dataset(agent, args.managers, args.team_size, args.timesheets, args.seed, END_DATE,
+                  history_days=history_days, mean_age_days=history_days)
+    print(f"Built in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(args.seed)
+    employees = [row[0] for row in conn.execute("SELECT id FROM user_profiles WHERE role = 'Employee' ORDER BY id")]
+    managers = [row[0] for row in conn.execute("SELECT id FROM user_profiles WHERE role = 'Manager' ORDER BY id")]
+    pending = rng.sample(conn.execute("SELECT managerId, id FROM timesheets WHERE status = 'Pending' ORDER BY id").fetchall(),
+                         2 * args.calls)
+    sample_employees = [rng.choice(employees) for _ in range(args.calls)]
+    sample_managers = [rng.choice(managers) for _ in range(args.calls)]
+    month_start = (END_DATE - datetime.timedelta(days=29)).isoformat()
+
+    def snapshot() -> dict:
+        return {"rows": conn.execute("SELECT COUNT(*) FROM timesheets").fetchone()[0], "mib": hot_table_mib(conn),
+                "hours": approved_hours(conn)}
+
+    hot = run_calls(agent, tool_calls(agent, sample_employees, sample_managers, pending[:args.calls], month_start))
+    before = snapshot()
+    aggregates = {table: conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2, 3").fetchall()
+                  for table, _, _ in agent.AGGREGATE_TABLES}
+
+    cutoff = (END_DATE - datetime.timedelta(days=args.keep_days)).isoformat()
+    stats = agent.archive_settled(before=cutoff)
+    after = snapshot()
+    print(f"Archived {stats['rows']:,} settled timesheets dated before {cutoff} in {stats['seconds']:.1f}s "
+          f"({stats['rows_per_second']:,} rows/s)")
+    # Archiving must be invisible to the aggregates and to every report built on them.
+    assert after["hours"] == before["hours"], (before, after)
+    assert aggregates == {table: conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2, 3").fetchall()
+                          for table, _, _ in agent.AGGREGATE_TABLES}, "archiving changed the aggregates"
+    assert not agent.verify_aggregates(conn), "aggregates drifted from the hot and archived rows"
+    archived = run_calls(agent, tool_calls(agent, sample_employees, sample_managers, pending[args.calls:], month_start))
+
+    print(f"{'':<30}{'before':>22}{'after':>22}")
+    print(f"{'hot timesheets (rows, MiB)':<30}{before['rows']:>14,}{before['mib']:>8.1f}{after['rows']:>14,}{after['mib']:>8.1f}")
+    print(f"{'approved hours (all history)':<30}{before['hours']:>22,.1f}{after['hours']:>22,.1f}")
+    print(f"{'tool (ms)':<30}{'p50':>11}{'p95':>11}{'p50':>11}{'p95':>11}")
+    for name in hot:
+        print(f"{name:<30}{hot[name][0]:>11.3f}{hot[name][1]:>11.3f}{archived[name][0]:>11.3f}{archived[name][1]:>11.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--managers", type=int, default=1000)
+    parser.add_argument("--team-size", type=int, default=8)
+    parser.add_argument("--timesheets", type=int, default=2_000_000)
+    parser.add_argument("--years", type=int, default=4, help="Length of the generated history.")
+    parser.add_argument("--keep-days", type=int, default=90, help="Settled sheets older than this are archived.")
+    parser.add_argument("--calls", type=int, default=300, help="Calls per tool in each run.")
+    parser.add_argument("--seed", type=int, default=7)
+    arguments = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix="timesheet_archive_")
+    try:
+        main(arguments, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
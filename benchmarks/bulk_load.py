@@ -0,0 +1,109 @@
+"""
+Measures bulk-import throughput.
+
+Writes a synthetic CSV (or JSONL) of timesheets, loads it into a fresh database
+with `agent.bulk_import`, and compares the rate with the naive approach of one
+INSERT statement per row on an autocommit connection with indexes and triggers
+in place (run on a smaller subset, since it is orders of magnitude slower).
+
+Usage (from the repository root):
+    python -m benchmarks.bulk_load [--rows 1000000] [--baseline-rows 20000] [--format csv|jsonl]
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+STATUSES = ('Pending', 'Approved', 'Rejected')
+
+
+def generate_rows(count: int, employees: list, manager_id: str):
+    rng = random.Random(42)
+    for index in range(count):
+        day = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        status = rng.choice(STATUSES)
+        yield {
+            "id": f"bulk-{index}",
+            "employeeId": rng.choice(employees),
+            "managerId": manager_id,
+            "date": day,
+            "hours": round(rng.uniform(1, 10), 1),
+            "task": "Bulk load benchmark work.",
+            "status": status,
+            "submittedAt": f"{day}T17:{index % 60:02d}:00Z",
+            "approvedAt": None if status == 'Pending' else f"{day}T18:00:00Z",
+        }
+
+
+def write_file(path: str, rows, fmt: str, fields) -> None:
+    with open(path, "w", newline="") as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+
+
+def naive_load(agent, path: str, fields) -> float:
+    """One autocommitted INSERT per row: roughly what per-statement seeding does."""
+    conn = sqlite3.connect(agent.DB_NAME, isolation_level=None)
+    insert = f"INSERT INTO timesheets ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})"
+    start = time.perf_counter()
+    for row in agent.read_import_rows(path, "timesheets"):
+        conn.execute(insert, row)
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed
+
+
+def main(args, workdir: str) -> None:
+    os.environ["TIMESHEET_DB_PATH"] = os.path.join(workdir, "bench.db")
+    import agent  # Imported late so it opens the benchmark database.
+
+    agent.get_conn()
+    employees = [agent.EMPLOYEE_ID, "employee-demo-5679", "employee-demo-5680"]
+    fields = agent.IMPORT_TABLES["timesheets"]
+
+    path = os.path.join(workdir, f"timesheets.{args.format}")
+    print(f"Writing {args.rows:,} rows to {path}...")
+    write_file(path, generate_rows(args.rows, employees, agent.MANAGER_ID), args.format, fields)
+    print(f"File size {os.path.getsize(path) / 1e6:,.1f} MB")
+
+    def report(rows, seconds):
+        if rows % (args.chunk_size * 20) == 0:
+            print(f"  {rows:>10,} rows  {rows / seconds:>10,.0f} rows/s")
+
+    stats = agent.bulk_import(path, chunk_size=args.chunk_size, progress=report)
+    print(f"bulk_import  {stats['rows']:>10,} rows in {stats['seconds']:7.2f}s  "
+          f"{stats['rows_per_second']:>10,} rows/s  (indexes and aggregates included)")
+
+    drift = agent.verify_aggregates()
+    print(f"Aggregates after load: {'drift in ' + ', '.join(drift) if drift else 'consistent'}")
+
+    if args.baseline_rows:
+        subset = os.path.join(workdir, f"baseline.{args.format}")
+        baseline_rows = generate_rows(args.baseline_rows, employees, agent.MANAGER_ID)
+        write_file(subset, ({**row, "id": "naive-" + row["id"]} for row in baseline_rows), args.format, fields)
+        elapsed = naive_load(agent, subset, fields)
+        print(f"naive        {args.baseline_rows:>10,} rows in {elapsed:7.2f}s  "
+              f"{args.baseline_rows / elapsed:>10,.0f} rows/s  (one autocommitted INSERT per row)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--baseline-rows", type=int, default=20_000)
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+    workdir = tempfile.mkdtemp(prefix="timesheet_bulk_")
+    try:
+        main(parser.parse_args(), workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
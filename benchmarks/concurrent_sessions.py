@@ -0,0 +1,110 @@
+"""
+Interleaves many employee and manager sessions through one shared Runner and
+checks that no user context leaks between them.
+
+A scripted model stands in for Gemini: for every turn it reads the user ID and
+role from the system instruction, calls `tool_manager_approval` with that ID,
+and echoes what it saw. Employees must be denied, managers must get their own
+pending list, and every instruction must name the session's own user.
+
+`tests/test_concurrent_sessions.py` runs the same check under pytest; this
+script drives it at larger scale and reports the time taken. It uses a fresh
+database in a temporary directory unless `--db` is given.
+
+Usage (from the repository root):
+    python -m benchmarks.concurrent_sessions [--sessions 200] [--db PATH]
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+from typing import AsyncGenerator, List, Tuple
+
+from google.genai import types
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+
+
+class ScriptedModel(BaseLlm):
+    """Calls tool_manager_approval once per turn, then reports the identity it was given."""
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        instruction = str(llm_request.config.system_instruction)
+        user_id = re.search(r"User ID: (\S+)", instruction).group(1)
+        role = re.search(r"User Role: (\S+)", instruction).group(1)
+        # Yield to the event loop so other sessions interleave with this one.
+        await asyncio.sleep(random.uniform(0, 0.01))
+
+        last = llm_request.contents[-1]
+        response = next((part.function_response for part in last.parts if part.function_response), None)
+        if response is None:
+            part = types.Part(function_call=types.FunctionCall(name="tool_manager_approval", args={"manager_id": user_id}))
+        else:
+            part = types.Part(text=f"{user_id}|{role}|{response.response.get('status')}")
+        yield LlmResponse(content=types.Content(role="model", parts=[part]))
+
+
+async def run_one(agent, runner: Runner, session_service: InMemorySessionService, profile: dict, index: int) -> str:
+    session = await session_service.create_session(
+        app_name=agent.APP_NAME, user_id=profile['id'], session_id=f"check-{index}",
+        state=agent.profile_state(profile),
+    )
+    message = types.Content(role="user", parts=[types.Part(text="review approvals")])
+    reply = ""
+    async for event in runner.run_async(user_id=profile['id'], session_id=session.id, new_message=message):
+        if event.content and event.content.parts and event.content.parts[0].text:
+            reply = event.content.parts[0].text
+    return reply
+
+
+async def run_sessions(agent, sessions: int) -> Tuple[float, List[str]]:
+    """Runs `sessions` interleaved sessions and returns (seconds taken, one message per leaked reply)."""
+    session_service = InMemorySessionService()
+    scripted_agent = agent.build_agent(model=ScriptedModel(model="scripted"))
+    runner = Runner(agent=scripted_agent, app_name=agent.APP_NAME, session_service=session_service)
+    employee = agent.get_user_profile(agent.EMPLOYEE_ID)
+    manager = agent.get_user_profile(agent.MANAGER_ID)
+    profiles = [employee if i % 2 == 0 else manager for i in range(sessions)]
+
+    start = time.perf_counter()
+    replies = await asyncio.gather(*(run_one(agent, runner, session_service, p, i) for i, p in enumerate(profiles)))
+    elapsed = time.perf_counter() - start
+
+    leaks = []
+    for profile, reply in zip(profiles, replies):
+        expected_status = "success" if profile['role'] == 'Manager' else "error"
+        expected = f"{profile['id']}|{profile['role']}|{expected_status}"
+        if reply != expected:
+            leaks.append(f"expected {expected!r}, got {reply!r}")
+    return elapsed, leaks
+
+
+def main(args, db_path: str) -> int:
+    os.environ["TIMESHEET_DB_PATH"] = db_path
+    import agent  # Imported late so it opens the chosen database.
+
+    elapsed, leaks = asyncio.run(run_sessions(agent, args.sessions))
+    for leak in leaks:
+        print(f"LEAK  {leak}")
+    print(f"{args.sessions} interleaved sessions in {elapsed:.2f}s, {len(leaks)} with leaked user context.")
+    return 1 if leaks else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--db", help="Database file to use; default: a fresh one in a temporary directory.")
+    arguments = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix="timesheet_sessions_")
+    try:
+        status = main(arguments, arguments.db or os.path.join(workdir, "sessions.db"))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    raise SystemExit(status)
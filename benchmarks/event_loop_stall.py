@@ -0,0 +1,88 @@
+"""
+Measures how long tool calls stall the asyncio event loop.
+
+A heartbeat task sleeps for 1 ms in a loop and records how late it wakes up.
+The same batch of concurrent `tool_manager_approval` calls is run twice: once
+calling the synchronous tool on the loop (the old agent behaviour), and once
+through `tool_manager_approval_async`, which runs on the DB worker pool.
+
+Usage (from the repository root):
+    python -m benchmarks.event_loop_stall [--rows 200000] [--calls 20] [--db PATH]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from uuid import uuid4
+
+HEARTBEAT_INTERVAL = 0.001
+
+
+async def heartbeat(stop: asyncio.Event, lateness: list) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + HEARTBEAT_INTERVAL
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lateness.append(max(0.0, loop.time() - expected))
+
+
+async def measure(label: str, make_call, calls: int) -> None:
+    stop = asyncio.Event()
+    lateness: list = []
+    beat = asyncio.create_task(heartbeat(stop, lateness))
+    await asyncio.sleep(0.01)  # Let the heartbeat settle before the load starts.
+
+    start = time.perf_counter()
+    await asyncio.gather(*(make_call() for _ in range(calls)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+
+    print(f"{label:<6} wall {elapsed * 1000:8.1f} ms | max stall {max(lateness) * 1000:8.1f} ms | "
+          f"total stall {sum(lateness) * 1000:8.1f} ms | heartbeats {len(lateness)}")
+
+
+def seed(agent, rows: int) -> None:
+    conn = agent.get_conn()
+    existing = conn.execute(
+        "SELECT COUNT(*) FROM timesheets WHERE managerId = ? AND status = 'Pending'", (agent.MANAGER_ID,)
+    ).fetchone()[0]
+    missing = rows - existing
+    if missing <= 0:
+        return
+    print(f"Seeding {missing} pending timesheets...")
+    now = time.strftime('%Y-%m-%dT%H:%M:%S')
+    with conn:
+        conn.executemany(
+            "INSERT INTO timesheets VALUES (?, ?, ?, ?, ?, ?, 'Pending', ?, NULL)",
+            ((str(uuid4()), agent.EMPLOYEE_ID, agent.MANAGER_ID, '2025-11-03', 8.0, 'Benchmark work.', now)
+             for _ in range(missing)),
+        )
+
+
+async def main(args) -> None:
+    os.environ["TIMESHEET_DB_PATH"] = args.db
+    import agent  # Imported late so it opens the benchmark database.
+
+    seed(agent, args.rows)
+    manager = agent.get_user_profile(agent.MANAGER_ID)
+    print(f"{args.calls} concurrent tool_manager_approval calls over {args.rows} pending rows "
+          f"(DB pool size {agent.DB_POOL_SIZE})")
+
+    async def sync_call():
+        return agent.tool_manager_approval(manager['id'])
+
+    async def async_call():
+        return await agent.tool_manager_approval_async(manager['id'])
+
+    await measure("before", sync_call, args.calls)
+    await measure("after", async_call, args.calls)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "timesheet_bench.db"))
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,113 @@
+"""
+Measures write throughput and latency with and without group commit.
+
+For each concurrency level, starts that many threads at once. Each thread is an
+employee who submits `--writes` timesheets with `tool_submit_timesheet`, and
+after each submission their manager approves it with
+`tool_update_timesheet_status`, so half the writes are inserts and half are
+guarded updates. Every level runs twice: once committing each write on the
+calling thread's connection (`GROUP_COMMIT_ENABLED` off), and once through the
+group-commit writer. Reports writes per second, p50/p99 latency per write,
+failed writes and, for group commit, the mean number of writes per commit.
+
+Usage (from the repository root):
+    python -m benchmarks.group_commit [--concurrency 1,8,32,128] [--writes 20] [--max-delay-ms 2] [--db PATH]
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_level(agent, concurrency: int, writes: int, level: str) -> dict:
+    """Runs one burst of `concurrency` employees and returns its timings."""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency + 1)
+
+    def employee(index: int) -> None:
+        user_id = f"bench-{level}-{index}"
+        own, failed = [], []
+        barrier.wait()
+        for n in range(writes):
+            started = time.perf_counter()
+            result = agent.tool_submit_timesheet(user_id, 8, task=f"Burst entry {n}")
+            own.append(time.perf_counter() - started)
+            if result["status"] != "success":
+                failed.append(result["error_message"])
+                continue
+            started = time.perf_counter()
+            result = agent.tool_update_timesheet_status(agent.MANAGER_ID, result["timesheet_id"], "Approved")
+            own.append(time.perf_counter() - started)
+            if result["status"] != "success":
+                failed.append(result["error_message"])
+        with lock:
+            latencies.extend(own)
+            errors.extend(failed)
+
+    conn = agent.get_conn()
+    with conn:
+        conn.executemany("INSERT INTO user_profiles (id, name, role, reportsTo) VALUES (?, ?, 'Employee', ?)",
+                         [(f"bench-{level}-{i}", f"Bench {i}", agent.MANAGER_ID) for i in range(concurrency)])
+    threads = [threading.Thread(target=employee, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        "writes_per_second": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "errors": len(errors),
+        "example_error": errors[0] if errors else None,
+    }
+
+
+def main(args, db_path: str) -> None:
+    os.environ["TIMESHEET_DB_PATH"] = db_path
+    os.environ["TIMESHEET_WRITE_MAX_DELAY_MS"] = str(args.max_delay_ms)
+    import agent  # Imported late so it opens the benchmark database with these settings.
+
+    logging.getLogger().setLevel(logging.CRITICAL)  # Failed writes are counted, not logged
+    synchronous = agent.get_conn().execute("PRAGMA synchronous").fetchone()[0]
+    print(f"journal_mode=WAL, synchronous={synchronous}, group-commit window {args.max_delay_ms:g} ms, "
+          f"up to {agent.WRITE_BATCH_SIZE} writes per commit")
+    print(f"{'threads':>8}{'mode':>14}{'writes/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}{'per commit':>12}")
+    for concurrency in args.concurrency:
+        for enabled in (False, True):
+            agent.GROUP_COMMIT_ENABLED = enabled
+            before = agent.WRITE_COORDINATOR.stats()
+            result = run_level(agent, concurrency, args.writes, f"{concurrency}-{int(enabled)}")
+            after = agent.WRITE_COORDINATOR.stats()
+            batches = after["batches"] - before["batches"]
+            per_commit = f"{(after['writes'] - before['writes']) / batches:.1f}" if enabled and batches else "1.0"
+            print(f"{concurrency:>8}{'group commit' if enabled else 'per write':>14}{result['writes_per_second']:>10,.0f}"
+                  f"{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}{result['errors']:>8}{per_commit:>12}")
+            if result["example_error"]:
+                print(f"{'':>8}e.g. {result['example_error']}")
+    agent.WRITE_COORDINATOR.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=lambda value: [int(n) for n in value.split(",")], default=[1, 8, 32, 128])
+    parser.add_argument("--writes", type=int, default=20, help="Submissions per thread (each followed by an approval).")
+    parser.add_argument("--max-delay-ms", type=float, default=2, help="Group-commit window.")
+    parser.add_argument("--db", help="Database file to use; default: a fresh one in a temporary directory.")
+    arguments = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix="timesheet_group_commit_")
+    try:
+        main(arguments, arguments.db or os.path.join(workdir, "writes.db"))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
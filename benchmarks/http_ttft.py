@@ -0,0 +1,146 @@
+"""
+Load-tests the HTTP front-end and reports time to first token under concurrency.
+
+Starts `python agent.py serve` in a child process with the offline local model
+(simulated latency and streaming delays), then, for each concurrency level,
+runs that many clients at once. Each client is its own user session and sends
+`--turns` agent turns (the fast path is off, so every turn calls the model,
+and so is request coalescing unless `--coalesce` is given).
+For every turn the client records the time to the first streamed text chunk
+(TTFT) and to the end of the reply. Reports p50/p95/p99 of both, and turns per
+second, per level.
+
+Usage (from the repository root):
+    python -m benchmarks.http_ttft [--concurrency 1,10,50,100] [--turns 3] [--max-model-calls 8] [--latency-ms 200]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+PROMPTS = ("Show my dashboard", "How many hours this month?", "hello")
+MANAGER_ID = "manager-demo-1234"  # Seeded users; clients alternate between them, each with its own session
+EMPLOYEE_ID = "employee-demo-5678"
+
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_turn(client, user_id: str, session_id: str, text: str) -> tuple:
+    """Sends one message and returns (seconds to first text chunk, seconds to the end of the reply)."""
+    start = time.perf_counter()
+    first = None
+    async with client.stream("POST", "/chat", headers={"X-Timesheet-User": user_id},
+                             json={"message": text, "session_id": session_id}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if first is None and line.startswith("data:") and '"text"' in line:
+                first = time.perf_counter() - start
+            elif line.startswith("event: error"):
+                raise RuntimeError(f"Turn failed: {await response.aread()}")
+    return first if first is not None else float("nan"), time.perf_counter() - start
+
+
+async def run_level(base_url: str, concurrency: int, turns: int, level: int) -> dict:
+    import httpx
+
+    async def client_session(index: int) -> list:
+        user_id = EMPLOYEE_ID if index % 2 else MANAGER_ID
+        session_id = f"load-{level}-{index}"
+        return [await run_turn(client, user_id, session_id, PROMPTS[(index + turn) % len(PROMPTS)])
+                for turn in range(turns)]
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(client_session(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    samples = [sample for session in results for sample in session]
+    ttft = [first for first, _ in samples]
+    total = [end for _, end in samples]
+    return {
+        "concurrency": concurrency,
+        "turns": len(samples),
+        "turns_per_second": round(len(samples) / elapsed, 1),
+        **{f"ttft_p{int(q * 100)}_ms": round(percentile(ttft, q) * 1000, 1) for q in (0.5, 0.95, 0.99)},
+        **{f"total_p{int(q * 100)}_ms": round(percentile(total, q) * 1000, 1) for q in (0.5, 0.95, 0.99)},
+    }
+
+
+def wait_for_server(base_url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The server exited with code {process.returncode}.")
+        try:
+            if httpx.get(f"{base_url}/healthz", timeout=1).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("The server did not start in time.")
+
+
+def main(args, workdir: str) -> None:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, TIMESHEET_MODEL_BACKEND="local", TIMESHEET_FAST_PATH="0",
+               TIMESHEET_DB_PATH=os.path.join(workdir, "http.db"),
+               TIMESHEET_LOCAL_MODEL_LATENCY_MS=str(args.latency_ms),
+               TIMESHEET_LOCAL_MODEL_CHUNK_DELAY_MS=str(args.chunk_delay_ms),
+               TIMESHEET_MODEL_COALESCE="1" if args.coalesce else "0")
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agent.py"),
+         "serve", "--port", str(port), "--max-model-calls", str(args.max_model_calls)],
+        env=env, stdout=subprocess.DEVNULL, stderr=open(os.path.join(workdir, "server.log"), "w"))
+    try:
+        wait_for_server(base_url, server)
+        print(f"{args.max_model_calls} concurrent model calls, {args.latency_ms:g} ms model latency, "
+              f"{args.chunk_delay_ms:g} ms between chunks")
+        print(f"{'clients':>8}{'turns/s':>9}{'TTFT p50':>10}{'p95':>8}{'p99':>8}{'total p50':>11}{'p95':>8}{'p99':>8}  (ms)")
+        results = []
+        for level, concurrency in enumerate(args.concurrency):
+            result = asyncio.run(run_level(base_url, concurrency, args.turns, level))
+            results.append(result)
+            print(f"{concurrency:>8}{result['turns_per_second']:>9}{result['ttft_p50_ms']:>10}{result['ttft_p95_ms']:>8}"
+                  f"{result['ttft_p99_ms']:>8}{result['total_p50_ms']:>11}{result['total_p95_ms']:>8}{result['total_p99_ms']:>8}")
+        if args.json:
+            print(json.dumps(results))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=lambda value: [int(n) for n in value.split(",")], default=[1, 10, 50, 100])
+    parser.add_argument("--turns", type=int, default=3, help="Turns per client.")
+    parser.add_argument("--max-model-calls", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=200, help="Simulated model latency per call.")
+    parser.add_argument("--chunk-delay-ms", type=float, default=20, help="Simulated delay between streamed chunks.")
+    parser.add_argument("--coalesce", action="store_true",
+                        help="Let identical model requests share a call. Off by default: clients of the same "
+                             "user send identical first turns, which would mostly measure coalescing.")
+    parser.add_argument("--json", action="store_true", help="Also print the results as JSON.")
+    arguments = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix="timesheet_http_")
+    try:
+        main(arguments, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,84 @@
+"""
+Tracks the cold-start cost of `import agent` with `python -X importtime`.
+
+Runs the import in a fresh interpreter, then reports the cumulative import time
+of the `agent` module, the number of modules it pulled in, and the slowest
+imports by self time. Pass `--record FILE` to append the result as a JSON line
+tagged with the current git commit, so runs stay comparable across commits, and
+`--budget-ms` to fail when the import gets slower than a threshold.
+
+Usage (from the repository root):
+    python -m benchmarks.import_time [--runs 5] [--record benchmarks/import_time.jsonl] [--budget-ms 150]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_profile(statement: str) -> list:
+    """Runs `statement` under -X importtime and returns (self_us, cumulative_us, module) rows."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), module.strip()))
+    return rows
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main(args) -> int:
+    samples, rows = [], []
+    for _ in range(args.runs):
+        rows = import_profile("import agent")
+        samples.append(next(cumulative for _, cumulative, module in rows if module == "agent"))
+    import_ms = statistics.median(samples) / 1000
+
+    print(f"import agent: median {import_ms:.1f} ms over {args.runs} runs, {len(rows)} modules imported")
+    print("Slowest imports by self time:")
+    for self_us, cumulative_us, module in sorted(rows, reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.2f} ms self  {cumulative_us / 1000:8.2f} ms cumulative  {module}")
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import agent; agent.get_runner()"], cwd=REPO_ROOT,
+                   capture_output=True, check=True, env={**os.environ, "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY", "unset")})
+    runner_ms = (time.perf_counter() - start) * 1000
+    print(f"Full cold start (interpreter + import + get_runner()): {runner_ms:.0f} ms")
+
+    if args.record:
+        record = {"commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                  "import_ms": round(import_ms, 2), "modules": len(rows), "cold_start_ms": round(runner_ms)}
+        with open(args.record, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"Recorded to {args.record}")
+
+    if args.budget_ms is not None and import_ms > args.budget_ms:
+        print(f"FAIL: import took {import_ms:.1f} ms, budget is {args.budget_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--record", help="Append the result as a JSON line to this file.")
+    parser.add_argument("--budget-ms", type=float, help="Exit non-zero if the median import time exceeds this.")
+    raise SystemExit(main(parser.parse_args()))
@@ -0,0 +1,108 @@
+"""
+Measures the cost of the instrumentation layer on the hot path.
+
+Runs the same workload with instrumentation off and on, each in a fresh child
+process, since the switch is read at import: direct `tool_view_queries` and
+`tool_manager_approval` calls with the result cache cleared (so every call
+reaches SQLite), then agent turns through the Runner with the offline local
+model. Reports the mean time per call and per turn in each mode, and the cost
+of one empty span (a shared no-op while off). With instrumentation on, metrics
+and a per-turn trace file are written as well.
+SQL statement spans are off unless TIMESHEET_INSTRUMENT_SQL=1 is set for the
+benchmark, which passes it on to the instrumented run.
+
+Usage (from the repository root):
+    python -m benchmarks.instrumentation_overhead [--calls 2000] [--turns 300] [--repeat 3]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SPAN_CALLS = 100_000  # Empty spans timed per run
+
+
+async def run_turns(agent, turns: int) -> float:
+    from google.genai import types
+
+    runner = agent.get_runner()
+    profile = agent.get_user_profile(agent.MANAGER_ID)
+    session = await agent.get_session_service().create_session(
+        app_name=agent.APP_NAME, user_id=profile['id'], state=agent.profile_state(profile))
+    message = types.Content(role="user", parts=[types.Part(text="Any pending approvals?")])
+    start = time.perf_counter()
+    for _ in range(turns):
+        trace = agent.start_trace(profile['id'], "Any pending approvals?")
+        async for _event in runner.run_async(user_id=profile['id'], session_id=session.id, new_message=message):
+            pass
+        agent.finish_trace(trace, "agent")
+    return (time.perf_counter() - start) / turns
+
+
+def child(args) -> None:
+    """Runs the workload in this process and prints the timings as JSON."""
+    import logging
+    import agent
+
+    logging.getLogger().setLevel(logging.WARNING)
+    agent.get_conn()
+    calls = [lambda: agent.tool_view_queries(agent.EMPLOYEE_ID), lambda: agent.tool_manager_approval(agent.MANAGER_ID)]
+    for call in calls:  # Warm-up: connection, statement cache and imports.
+        call()
+    start = time.perf_counter()
+    for index in range(args.calls):
+        agent.RESULT_CACHE.invalidate()
+        calls[index % 2]()
+    tool_seconds = (time.perf_counter() - start) / args.calls
+    asyncio.run(run_turns(agent, 3))
+    turn_seconds = asyncio.run(run_turns(agent, args.turns))
+    start = time.perf_counter()
+    for _ in range(SPAN_CALLS):
+        with agent.span("noop", "timesheet_benchmark_seconds"):
+            pass
+    span_seconds = (time.perf_counter() - start) / SPAN_CALLS
+    print(json.dumps({"tool_us": tool_seconds * 1e6, "turn_us": turn_seconds * 1e6, "span_ns": span_seconds * 1e9,
+                      "enabled": agent.INSTRUMENTATION_ENABLED}))
+
+
+def run_child(args, enabled: bool, workdir: str, run: int) -> dict:
+    env = dict(os.environ, TIMESHEET_MODEL_BACKEND="local", TIMESHEET_FAST_PATH="0", TIMESHEET_SESSION_STORE="memory",
+               TIMESHEET_DB_PATH=os.path.join(workdir, f"{'on' if enabled else 'off'}-{run}.db"))
+    for name in ("TIMESHEET_INSTRUMENTATION", "TIMESHEET_METRICS_PORT", "TIMESHEET_METRICS_FILE", "TIMESHEET_TRACE_FILE"):
+        env.pop(name, None)
+    if enabled:
+        env.update(TIMESHEET_METRICS_FILE=os.path.join(workdir, "metrics.prom"),
+                   TIMESHEET_TRACE_FILE=os.path.join(workdir, "traces.jsonl"))
+    output = subprocess.run([sys.executable, "-m", "benchmarks.instrumentation_overhead", "--child",
+                             "--calls", str(args.calls), "--turns", str(args.turns)],
+                            env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(args) -> None:
+    with tempfile.TemporaryDirectory(prefix="timesheet_instrumentation_") as workdir:
+        results = {False: [], True: []}
+        for run in range(args.repeat):  # Alternate modes so drift affects both equally.
+            for enabled in (False, True):
+                results[enabled].append(run_child(args, enabled, workdir, run))
+    best = {enabled: {key: min(r[key] for r in runs) for key in ("tool_us", "turn_us", "span_ns")}
+            for enabled, runs in results.items()}
+    print(f"{'':<26}{'off':>12}{'on':>12}{'overhead':>10}")
+    for key, label in (("tool_us", "tool call (us)"), ("turn_us", "agent turn (us)"), ("span_ns", "empty span (ns)")):
+        off, on = best[False][key], best[True][key]
+        print(f"{label:<26}{off:>12,.1f}{on:>12,.1f}{on / off - 1:>10.1%}")
+    print(f"best of {args.repeat} runs; {args.calls:,} tool calls and {args.turns:,} turns per run")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000, help="Direct tool calls per run.")
+    parser.add_argument("--turns", type=int, default=300, help="Agent turns per run.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+    child(arguments) if arguments.child else main(arguments)
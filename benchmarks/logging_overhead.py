@@ -0,0 +1,173 @@
+"""
+Measures what logging adds to a tool call, on the calling thread.
+
+Times `tool_view_queries`, `tool_manager_approval` and `tool_submit_timesheet`
+(the result cache is cleared before every call). Each tool call logs two INFO
+records. The calls are repeated under each logging set-up:
+
+- off: the root level is WARNING, so no record is created;
+- stream: the previous set-up, a synchronous `StreamHandler` with the old text
+  format and records that collect the caller, thread and process;
+- queue json / queue text: `configure_logging`, with records formatted and written
+  by the writer thread;
+- sampled: queue json keeping `--sample` of the `timesheet.tools` INFO records;
+- tools at WARNING: queue json with `timesheet.tools` at WARNING.
+
+Log lines go to a file in a temporary directory by default. A terminal is
+usually slower, which widens the gap between stream and queue. Set-ups take
+turns for `--rounds` rounds. The report gives, for each set-up:
+
+- the p50 call time over all rounds and the median of the per-round means, each
+  with its overhead over "off";
+- the log lines written, sampled out and dropped;
+- the cost on the calling thread of one `TOOL_LOG.info` call with three arguments.
+
+The sheets each round submits are deleted afterwards, so every set-up reads
+the same tables.
+
+Usage (from the repository root):
+    python -m benchmarks.logging_overhead [--calls 300] [--rounds 5] [--sample 0.05] [--stream-to FILE]
+"""
+import argparse
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'  # The format of the previous basicConfig set-up
+RECORD_BATCH = 1_000  # Records per timed batch; below the queue size, so none are dropped
+# What a LogRecord collects by default; configure_logging turns these off.
+RECORD_DEFAULTS = {"_srcfile": logging._srcfile, "logThreads": True, "logProcesses": True, "logMultiprocessing": True}
+
+
+def setups(agent, args, stream) -> dict:
+    def off():
+        agent.stop_logging()
+        reset(agent, logging.WARNING)
+
+    def plain_stream():
+        agent.stop_logging()
+        reset(agent, logging.INFO)
+        for name, value in RECORD_DEFAULTS.items():
+            setattr(logging, name, value)
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        logging.getLogger().addHandler(handler)
+
+    def queued(fmt: str, sample: str = "", levels: str = ""):
+        def setup():
+            reset(agent, logging.INFO)
+            agent.configure_logging(level="INFO", levels=levels, sample=sample, fmt=fmt, stream=stream)
+        return setup
+
+    return {
+        "off": off,
+        "stream": plain_stream,
+        "queue json": queued("json"),
+        "queue text": queued("text"),
+        f"sampled {args.sample:.0%}": queued("json", sample=f"timesheet.tools={args.sample}"),
+        "tools at WARNING": queued("json", levels="timesheet.tools=WARNING"),
+    }
+
+
+def reset(agent, level: int) -> None:
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.setLevel(level)
+    for logger in (agent.LOG, agent.TOOL_LOG, agent.DB_LOG, agent.MODEL_LOG, agent.HTTP_LOG):
+        logger.setLevel(logging.NOTSET)
+
+
+def tool_round(agent, calls: int) -> list:
+    """Seconds taken by each of `calls` calls of each tool."""
+    tools = (lambda: agent.tool_view_queries(agent.EMPLOYEE_ID),
+             lambda: agent.tool_manager_approval(agent.MANAGER_ID),
+             lambda: agent.tool_submit_timesheet(agent.EMPLOYEE_ID, 8, task="Logging benchmark"))
+    latencies = []
+    for _ in range(calls):
+        for tool in tools:
+            agent.RESULT_CACHE.invalidate()
+            started = time.perf_counter()
+            result = tool()
+            latencies.append(time.perf_counter() - started)
+            assert result["status"] == "success", result
+    # Drop the submitted sheets, so every set-up reads the same tables.
+    with agent.get_conn() as conn:
+        conn.execute("DELETE FROM timesheets WHERE task = 'Logging benchmark'")
+    return latencies
+
+
+def record_cost(agent, batches: int) -> float:
+    """Median seconds for one TOOL_LOG.info call on the calling thread, letting the writer catch up between batches."""
+    samples = []
+    for n in range(batches):
+        started = time.perf_counter()
+        for i in range(RECORD_BATCH):
+            agent.TOOL_LOG.info("Executing tool: %s for user_id: %s with hours: %s", "tool_submit_timesheet", agent.EMPLOYEE_ID, i)
+        samples.append((time.perf_counter() - started) / RECORD_BATCH)
+        drain(agent)
+    return statistics.median(samples)
+
+
+def drain(agent) -> None:
+    while agent.logging_stats()["queued"]:
+        time.sleep(0.001)
+
+
+def main(args, workdir: str) -> None:
+    os.environ["TIMESHEET_DB_PATH"] = os.path.join(workdir, "logging.db")
+    import agent  # Imported late so it opens the benchmark database.
+
+    agent.init_db()
+    with open(args.stream_to or os.path.join(workdir, "log.txt"), "a") as stream:
+        configurations = setups(agent, args, stream)
+        rounds = {name: [] for name in configurations}
+        counters = {name: {"written": 0, "dropped": 0, "sampled_out": 0} for name in configurations}
+        tool_round(agent, max(1, args.calls // 10))  # Warm-up: caches, prepared statements, the write path
+        for _ in range(args.rounds):
+            for name, setup in configurations.items():
+                setup()
+                before = dict(agent.logging_stats())
+                rounds[name].append(tool_round(agent, args.calls))
+                agent.stop_logging()  # Writes out the last batch, so the counters are complete
+                after = agent.logging_stats()
+                for key in counters[name]:
+                    counters[name][key] += after[key] - before[key]
+        per_record = {}
+        for name, setup in configurations.items():
+            setup()
+            per_record[name] = record_cost(agent, args.rounds)
+        agent.stop_logging()
+        reset(agent, logging.WARNING)
+
+    def summary(name: str) -> tuple:
+        """(p50 of all calls, median of the per-round means), in microseconds."""
+        return (statistics.median(latency for samples in rounds[name] for latency in samples) * 1e6,
+                statistics.median(statistics.fmean(samples) for samples in rounds[name]) * 1e6)
+
+    base_p50, base_mean = summary("off")
+    print(f"{args.calls} calls each of 3 tools per round, {args.rounds} rounds; 2 INFO records per tool call")
+    print(f"{'':<20}{'us per tool call':>34}")
+    print(f"{'set-up':<20}{'p50':>8}{'+':>8}{'mean':>9}{'+':>9}{'written':>9}{'sampled':>9}{'dropped':>9}{'us/record':>11}")
+    for name in rounds:
+        p50, mean = summary(name)
+        written = counters[name]["written"] if name not in ("off", "stream") else "-"
+        print(f"{name:<20}{p50:>8.1f}{p50 - base_p50:>+8.1f}{mean:>9.1f}{mean - base_mean:>+9.1f}{written:>9}"
+              f"{counters[name]['sampled_out']:>9}{counters[name]['dropped']:>9}{per_record[name] * 1e6:>11.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=300, help="Calls of each tool per round.")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--sample", type=float, default=0.05, help="Share of tool INFO records kept by the sampled set-up.")
+    parser.add_argument("--stream-to", help="Append log lines to this file (e.g. /dev/tty) instead of a temporary one.")
+    arguments = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix="timesheet_logging_")
+    try:
+        main(arguments, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
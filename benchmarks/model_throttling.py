@@ -0,0 +1,277 @@
+"""
+Drives Gemini calls against a local fake endpoint that throttles, with and without the model-call scheduler.
+
+Starts a fake Gemini API in a child process (`generateContent` and
+`streamGenerateContent`, answering after `--latency-ms`). It enforces its own
+quota of `--quota-rpm` requests per minute with a token bucket and answers
+429 RESOURCE_EXHAUSTED beyond it. It also fails `--error-rate` of requests with
+503 UNAVAILABLE. The real `Gemini` model class talks to it through `base_url`.
+
+The workload runs in two modes:
+
+- legacy: the previous set-up, with google-genai retrying on its own (5 attempts,
+  exp_base 7) and a FIFO cap of `--max-calls` concurrent calls;
+- scheduler: `agent.limit_model_calls` with a `ModelScheduler` sized to the same
+  quota and cap.
+
+Each run has `--sessions` sessions that each make `--calls` calls one after
+another. Each call is sent twice at once with probability `--duplicates`, like a
+client resubmitting. One greedy session fires `--greedy-calls` calls at once.
+For each mode the benchmark reports:
+
+- call latency for the ordinary sessions and for the greedy one;
+- failed calls;
+- requests that reached the endpoint, and how many got 429 or 503;
+- retries;
+- for the scheduler, coalesced calls and queue wait.
+
+Usage (from the repository root):
+    python -m benchmarks.model_throttling [--sessions 40] [--calls 5] [--quota-rpm 1200] [--max-calls 8] [--modes legacy,scheduler]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+MODEL = "gemini-2.5-flash-lite"
+
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else float("nan")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# --- Fake endpoint (child process) ---
+
+def serve_fake(args) -> None:
+    import uvicorn
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI()
+    bucket = {"tokens": float(args.quota_burst), "at": time.monotonic()}
+    counts = {"requests": 0, "served": 0, "throttled": 0, "unavailable": 0}
+    rng = random.Random(args.seed)
+
+    def admit() -> bool:
+        now = time.monotonic()
+        bucket["tokens"] = min(float(args.quota_burst), bucket["tokens"] + (now - bucket["at"]) * args.quota_rpm / 60)
+        bucket["at"] = now
+        if bucket["tokens"] < 1:
+            return False
+        bucket["tokens"] -= 1
+        return True
+
+    def error(code: int, status: str, message: str) -> JSONResponse:
+        return JSONResponse(status_code=code, content={"error": {"code": code, "message": message, "status": status}})
+
+    def reply(text: str) -> dict:
+        return {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {"promptTokenCount": 50, "candidatesTokenCount": 10, "totalTokenCount": 60},
+            "modelVersion": MODEL,
+        }
+
+    @app.post("/{version}/models/{target}")
+    async def generate(version: str, target: str, request: Request):
+        body = await request.json()
+        counts["requests"] += 1
+        if not admit():
+            counts["throttled"] += 1
+            return error(429, "RESOURCE_EXHAUSTED", "Quota exceeded for requests per minute.")
+        if rng.random() < args.error_rate:
+            counts["unavailable"] += 1
+            return error(503, "UNAVAILABLE", "The model is overloaded. Please try again later.")
+        await asyncio.sleep(args.latency_ms / 1000)
+        counts["served"] += 1
+        prompt = " ".join(part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", []))
+        text = f"Answer to: {prompt}"
+        if target.endswith(":streamGenerateContent"):
+            async def chunks():
+                for offset in range(0, len(text), 16):
+                    yield f"data: {json.dumps(reply(text[offset:offset + 16]))}\r\n\r\n"
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+        return reply(text)
+
+    @app.get("/stats")
+    async def stats() -> dict:
+        return counts
+
+    @app.post("/reset")
+    async def reset() -> dict:
+        counts.update(requests=0, served=0, throttled=0, unavailable=0)
+        bucket.update(tokens=float(args.quota_burst), at=time.monotonic())
+        return counts
+
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+# --- Client workload ---
+
+def build_model(agent, mode: str, args, base_url: str):
+    from google.genai import types
+    from google.adk.models.google_llm import Gemini
+
+    if mode == "legacy":
+        retry = types.HttpRetryOptions(attempts=5, exp_base=7, initial_delay=1, http_status_codes=[429, 500, 503, 504])
+        gemini = Gemini(model=MODEL, base_url=base_url, retry_options=retry)
+        return gemini, gemini, asyncio.Semaphore(args.max_calls), None
+    gemini = Gemini(model=MODEL, base_url=base_url)
+    scheduler = agent.ModelScheduler(rpm=args.quota_rpm, burst=args.quota_burst, max_concurrency=args.max_calls)
+    return gemini, agent.limit_model_calls(gemini, args.max_calls, scheduler), None, scheduler
+
+
+async def run_mode(agent, mode: str, args, base_url: str) -> dict:
+    import httpx
+    from google.genai import types
+    from google.adk.models.llm_request import LlmRequest
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        await client.post("/reset")
+    gemini, model, cap, scheduler = build_model(agent, mode, args, base_url)
+    rng = random.Random(args.seed)
+    latencies = {"session": [], "greedy": []}
+    failures = []
+    sent = 0
+
+    async def one_call(kind: str, user: str, text: str) -> None:
+        nonlocal sent
+        sent += 1
+        request = LlmRequest(model=MODEL, contents=[types.Content(role="user", parts=[types.Part(text=text)])],
+                             config=types.GenerateContentConfig(system_instruction=f"User ID: {user}"))
+        started = time.perf_counter()
+        try:
+            if cap is not None:
+                async with cap:
+                    async for _ in model.generate_content_async(request, stream=args.stream):
+                        pass
+            else:
+                async for _ in model.generate_content_async(request, stream=args.stream):
+                    pass
+            latencies[kind].append(time.perf_counter() - started)
+        except Exception as e:
+            failures.append(f"{type(e).__name__}: {str(e).strip().splitlines()[-1][:120]}")
+
+    async def session(index: int) -> None:
+        agent._MODEL_QUEUE_KEY.set(f"session-{index}")
+        for n in range(args.calls):
+            text = f"Session {index}, message {n}"
+            if rng.random() < args.duplicates:
+                await asyncio.gather(one_call("session", f"user-{index}", text), one_call("session", f"user-{index}", text))
+            else:
+                await one_call("session", f"user-{index}", text)
+
+    async def greedy() -> None:
+        agent._MODEL_QUEUE_KEY.set("greedy")
+        await asyncio.gather(*(one_call("greedy", "greedy", f"Greedy message {n}") for n in range(args.greedy_calls)))
+
+    started = time.perf_counter()
+    await asyncio.gather(greedy(), *(session(i) for i in range(args.sessions)))
+    elapsed = time.perf_counter() - started
+    await gemini.api_client.aio.aclose()  # Inside the loop; closing at garbage collection would outlive it.
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        upstream = (await client.get("/stats")).json()
+    stats = scheduler.stats() if scheduler else {}
+    return {
+        "mode": mode,
+        "seconds": elapsed,
+        "calls": sent,
+        "failed": len(failures),
+        "example_failure": failures[0] if failures else None,
+        "upstream": upstream,
+        "retries": stats.get("retries", upstream["requests"] - sent),
+        "coalesced": stats.get("coalesced", 0),
+        "p50_ms": percentile(latencies["session"], 0.5) * 1000,
+        "p95_ms": percentile(latencies["session"], 0.95) * 1000,
+        "max_ms": max(latencies["session"], default=float("nan")) * 1000,
+        "greedy_p50_ms": percentile(latencies["greedy"], 0.5) * 1000,
+        "wait_p50_ms": stats.get("wait_p50_ms"),
+        "wait_p95_ms": stats.get("wait_p95_ms"),
+        "limit": stats.get("limit"),
+    }
+
+
+def wait_for_endpoint(base_url: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The fake endpoint exited with code {process.returncode}.")
+        try:
+            httpx.get(f"{base_url}/stats", timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError("The fake endpoint did not start in time.")
+
+
+def main(args) -> None:
+    import logging
+
+    os.environ["GOOGLE_API_KEY"] = "fake"
+    import agent
+
+    logging.getLogger().setLevel(logging.WARNING)
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    endpoint = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.model_throttling", "--serve-fake", "--port", str(port),
+         "--quota-rpm", str(args.quota_rpm), "--quota-burst", str(args.quota_burst),
+         "--latency-ms", str(args.latency_ms), "--error-rate", str(args.error_rate), "--seed", str(args.seed)],
+        stdout=subprocess.DEVNULL)
+    try:
+        wait_for_endpoint(base_url, endpoint)
+        print(f"Fake endpoint: quota {args.quota_rpm:g} requests/min (burst {args.quota_burst}), "
+              f"{args.latency_ms:g} ms latency, {args.error_rate:.0%} 503s; {args.max_calls} concurrent calls; "
+              f"{args.sessions} sessions x {args.calls} calls, {args.duplicates:.0%} sent twice, "
+              f"plus {args.greedy_calls} at once from one session")
+        print(f"{'mode':<10}{'seconds':>8}{'calls':>7}{'failed':>7}{'upstream':>9}{'429':>6}{'503':>6}{'retries':>8}"
+              f"{'coalesced':>10}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'greedy p50':>11}{'wait p50/p95':>14}")
+        for mode in args.modes:
+            result = asyncio.run(run_mode(agent, mode, args, base_url))
+            upstream = result["upstream"]
+            wait = f"{result['wait_p50_ms']:.0f}/{result['wait_p95_ms']:.0f}" if result["wait_p50_ms"] is not None else "-"
+            print(f"{mode:<10}{result['seconds']:>8.1f}{result['calls']:>7}{result['failed']:>7}{upstream['requests']:>9}"
+                  f"{upstream['throttled']:>6}{upstream['unavailable']:>6}{result['retries']:>8}{result['coalesced']:>10}"
+                  f"{result['p50_ms']:>9.0f}{result['p95_ms']:>9.0f}{result['max_ms']:>9.0f}{result['greedy_p50_ms']:>11.0f}"
+                  f"{wait:>14}")
+            if result["example_failure"]:
+                print(f"{'':<10}e.g. {result['example_failure']}")
+    finally:
+        endpoint.terminate()
+        endpoint.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=40)
+    parser.add_argument("--calls", type=int, default=5, help="Calls per session, one after another.")
+    parser.add_argument("--greedy-calls", type=int, default=40, help="Calls the greedy session sends at once.")
+    parser.add_argument("--duplicates", type=float, default=0.2, help="Share of calls sent twice at once.")
+    parser.add_argument("--quota-rpm", type=float, default=1200, help="The endpoint's quota, and the scheduler's rate.")
+    parser.add_argument("--quota-burst", type=int, default=20)
+    parser.add_argument("--max-calls", type=int, default=8, help="Concurrent calls allowed by the client.")
+    parser.add_argument("--latency-ms", type=float, default=200, help="The endpoint's latency per served request.")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Share of requests failed with 503.")
+    parser.add_argument("--stream", action="store_true", help="Use streamGenerateContent, as the agent does.")
+    parser.add_argument("--modes", type=lambda value: value.split(","), default=["legacy", "scheduler"])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--serve-fake", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+    if arguments.serve_fake:
+        serve_fake(arguments)
+    else:
+        main(arguments)
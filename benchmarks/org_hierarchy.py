@@ -0,0 +1,226 @@
+"""
+Benchmarks org-wide (skip-level) queries on deep and wide org charts.
+
+Builds two org charts side by side in one database: a deep one (a binary tree
+of managers `--depth` levels down, each with a few employees) and a wide one
+(one director over `--wide-managers` managers with `--team-size` employees
+each), plus `--timesheets` timesheets across both. For the top of each chart,
+and for a manager half way down the deep one, it times three ways of getting
+an org's pending total with the first page of its pending sheets, and (the
+report columns) its 30-day hours report per employee:
+
+- loop: walk the tree one manager at a time, one query per manager (what the
+  direct-only queries require);
+- cte: one recursive CTE over `reportsTo` per request;
+- closure: the `scope='org'` queries over the trigger-maintained org_closure.
+
+It then times the trigger maintenance (median of `--repeat` runs): adding and
+removing an employee, moving a subtree to another manager and back, and a full
+rebuild of the closure.
+
+Usage (from the repository root):
+    python -m benchmarks.org_hierarchy [--depth 10] [--wide-managers 100] [--team-size 40] [--timesheets 500000]
+"""
+import argparse
+import datetime
+import logging
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+import reporting
+
+END_DATE = datetime.date(2025, 11, 28)
+DEEP_TEAM_SIZE = 3  # Employees under every manager of the deep chart
+
+LOOP_PENDING = ("SELECT t.id, t.employeeId, t.submittedAt FROM timesheets t "
+                "WHERE t.managerId = ? AND t.status = 'Pending'")
+LOOP_REPORTS = "SELECT id FROM user_profiles WHERE reportsTo = ? AND role = 'Manager'"
+CTE_SUBTREE = """
+    WITH RECURSIVE subtree (id) AS (
+        SELECT id FROM user_profiles WHERE reportsTo = ?
+        UNION ALL
+        SELECT p.id FROM user_profiles p JOIN subtree s ON p.reportsTo = s.id
+    )
+"""
+CTE_PENDING = CTE_SUBTREE + """
+    SELECT t.id, t.employeeId, t.submittedAt FROM subtree s
+    JOIN timesheets t ON t.employeeId = s.id AND t.status = 'Pending'
+    ORDER BY t.employeeId, t.submittedAt DESC, t.id DESC LIMIT ?
+"""
+CTE_COUNT = CTE_SUBTREE + """
+    SELECT COALESCE(SUM(c.entries), 0) FROM subtree s
+    JOIN employee_status_counts c ON c.employeeId = s.id AND c.status = 'Pending'
+"""
+# The same (employee, day) rows as reporting.build_report_query, for reporting.rollup_report.
+CTE_REPORT = CTE_SUBTREE + """
+    SELECT p.id, p.name, h.date, h.hours, h.entries FROM subtree s
+    JOIN user_profiles p ON p.id = s.id
+    LEFT JOIN hours_daily h ON h.employeeId = p.id AND h.date >= ? AND h.date <= ? AND h.status = 'Approved'
+    ORDER BY p.id
+"""
+
+
+def generate_org(depth: int, wide_managers: int, team_size: int) -> list:
+    """Returns the profiles of both charts, managers before their reports."""
+    profiles = [{"id": "deep-1", "name": "Deep 1", "role": "Manager", "reportsTo": None},
+                {"id": "wide-root", "name": "Wide Root", "role": "Manager", "reportsTo": None}]
+    # Deep chart: manager deep-n has managers deep-2n and deep-2n+1 (heap numbering).
+    for n in range(2, 2 ** depth):
+        profiles.append({"id": f"deep-{n}", "name": f"Deep {n}", "role": "Manager", "reportsTo": f"deep-{n // 2}"})
+    for n in range(1, 2 ** depth):
+        for e in range(DEEP_TEAM_SIZE):
+            profiles.append({"id": f"deep-{n}-e{e}", "name": f"Deep {n} E{e}", "role": "Employee",
+                             "reportsTo": f"deep-{n}"})
+    for m in range(wide_managers):
+        profiles.append({"id": f"wide-{m}", "name": f"Wide {m}", "role": "Manager", "reportsTo": "wide-root"})
+        for e in range(team_size):
+            profiles.append({"id": f"wide-{m}-e{e}", "name": f"Wide {m} E{e}", "role": "Employee",
+                             "reportsTo": f"wide-{m}"})
+    return profiles
+
+
+def load(agent, profiles: list, timesheets: int, rng: random.Random, workdir: str) -> None:
+    from benchmarks.synthetic_data import generate_timesheets, write_jsonl
+
+    profile_path = os.path.join(workdir, "profiles.jsonl")
+    timesheet_path = os.path.join(workdir, "timesheets.jsonl")
+    write_jsonl(profile_path, profiles)
+    write_jsonl(timesheet_path, generate_timesheets(profiles, timesheets, END_DATE, rng))
+    agent.bulk_import(profile_path, table="user_profiles")
+    agent.bulk_import(timesheet_path)
+
+
+def walk_org(conn, root: str):
+    """Yields every manager below `root`, one direct-reports query per manager."""
+    frontier = [row[0] for row in conn.execute(LOOP_REPORTS, (root,))]
+    yield root
+    while frontier:
+        manager = frontier.pop()
+        frontier += [row[0] for row in conn.execute(LOOP_REPORTS, (manager,))]
+        yield manager
+
+
+def loop_pending(agent, conn, root: str) -> int:
+    sheets = [sheet for manager in walk_org(conn, root) for sheet in conn.execute(LOOP_PENDING, (manager,))]
+    sheets.sort(key=lambda sheet: (sheet[1], sheet[2]))
+    return len(sheets)
+
+
+def loop_report(agent, conn, root: str, start: str, end: str) -> int:
+    return sum(1 for manager in walk_org(conn, root) for _ in reporting.team_hours_report(conn, start, end, "employee", manager))
+
+
+def cte_pending(agent, conn, root: str) -> int:
+    conn.execute(CTE_PENDING, (root, agent.DEFAULT_PAGE_SIZE + 1)).fetchall()
+    return conn.execute(CTE_COUNT, (root,)).fetchone()[0]
+
+
+def cte_report(agent, conn, root: str, start: str, end: str) -> int:
+    return sum(1 for _ in reporting.rollup_report(conn.execute(CTE_REPORT, (root, start, end)), "employee"))
+
+
+def closure_pending(agent, conn, root: str) -> int:
+    agent.get_timesheets_page(manager_id=root, status='Pending', with_employee_name=True,
+                              columns=agent.ORG_PENDING_SHEET_COLUMNS, scope="org")
+    return agent.get_status_count('Pending', manager_id=root, scope="org")
+
+
+def closure_report(agent, conn, root: str, start: str, end: str) -> int:
+    return sum(1 for _ in reporting.team_hours_report(conn, start, end, "employee", root, scope="org"))
+
+
+def timed(func, repeat: int) -> tuple:
+    """Returns (median milliseconds, last result) over `repeat` calls."""
+    samples, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000, result
+
+
+def main(args, workdir: str) -> None:
+    os.environ["TIMESHEET_DB_PATH"] = os.path.join(workdir, "org.db")
+    import agent  # Imported late so it opens the benchmark database.
+
+    logging.getLogger().setLevel(logging.WARNING)
+    conn = agent.get_conn()
+    profiles = generate_org(args.depth, args.wide_managers, args.team_size)
+    started = time.perf_counter()
+    load(agent, profiles, args.timesheets, random.Random(args.seed), workdir)
+    closure_rows = conn.execute("SELECT COUNT(*) FROM org_closure").fetchone()[0]
+    print(f"Loaded {len(profiles):,} people and {args.timesheets:,} timesheets in {time.perf_counter() - started:.1f}s; "
+          f"org_closure holds {closure_rows:,} rows")
+
+    start = (END_DATE - datetime.timedelta(days=29)).isoformat()
+    end = END_DATE.isoformat()
+    mid = f"deep-{2 ** (args.depth // 2)}"
+    roots = (("deep chart, top", "deep-1"), (f"deep chart, {mid}", mid), ("wide chart, top", "wide-root"))
+    print(f"{'':<22}{'':>15}{'pending (ms)':>28}{'report (ms)':>27}")
+    print(f"{'manager':<22}{'people':>8}{'levels':>7}{'sheets':>8}{'loop':>7}{'cte':>7}{'closure':>8}"
+          f"{'rows':>7}{'loop':>7}{'cte':>7}{'closure':>8}")
+    for label, root in roots:
+        people, levels = conn.execute("SELECT COUNT(*), MAX(depth) FROM org_closure WHERE ancestorId = ? AND depth > 0",
+                                      (root,)).fetchone()
+        pending = {name: timed(lambda func=func: func(agent, conn, root), args.repeat)
+                   for name, func in (("loop", loop_pending), ("cte", cte_pending), ("closure", closure_pending))}
+        report = {name: timed(lambda func=func: func(agent, conn, root, start, end), args.repeat)
+                  for name, func in (("loop", loop_report), ("cte", cte_report), ("closure", closure_report))}
+        # Every approach must agree on the pending total and the report size.
+        assert len({result for _, result in pending.values()}) == 1, pending
+        assert len({result for _, result in report.values()}) == 1, report
+        print(f"{label:<22}{people:>8,}{levels:>7}{pending['closure'][1]:>8,}" +
+              "".join(f"{pending[name][0]:>{width}.2f}" for name, width in (("loop", 7), ("cte", 7), ("closure", 8))) +
+              f"{report['closure'][1]:>7,}" +
+              "".join(f"{report[name][0]:>{width}.2f}" for name, width in (("loop", 7), ("cte", 7), ("closure", 8))))
+
+    # Trigger maintenance, each change in its own transaction.
+    def write(statement: str, params: tuple) -> None:
+        with conn:
+            conn.execute(statement, params)
+
+    moved, parent = mid, f"deep-{2 ** (args.depth // 2) // 2}"
+    subtree = conn.execute("SELECT COUNT(*) FROM org_closure WHERE ancestorId = ?", (moved,)).fetchone()[0]
+    steps = [
+        ("add an employee", "INSERT INTO user_profiles (id, name, role, reportsTo) VALUES ('bench-new', 'New', 'Employee', ?)", (mid,)),
+        ("remove an employee", "DELETE FROM user_profiles WHERE id = 'bench-new'", ()),
+        (f"move {subtree:,} people", "UPDATE user_profiles SET reportsTo = 'wide-root' WHERE id = ?", (moved,)),
+        (f"move {subtree:,} people back", "UPDATE user_profiles SET reportsTo = ? WHERE id = ?", (parent, moved)),
+    ]
+    samples = {label: [] for label, _, _ in steps}
+    for _ in range(args.repeat):
+        for label, statement, params in steps:
+            started = time.perf_counter()
+            write(statement, params)
+            samples[label].append(time.perf_counter() - started)
+    for label, seconds in samples.items():
+        print(f"{label:<32}{statistics.median(seconds) * 1000:>10.2f} ms")
+
+    def rebuild() -> None:
+        with conn:
+            conn.execute("BEGIN")
+            for statement in agent.org_closure_rebuild_statements():
+                conn.execute(statement)
+
+    print(f"{'rebuild org_closure':<32}{timed(rebuild, args.repeat)[0]:>10.2f} ms")
+    assert not agent.verify_aggregates(conn), "org_closure drifted from user_profiles"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--depth", type=int, default=10, help="Levels of managers in the deep chart.")
+    parser.add_argument("--wide-managers", type=int, default=100, help="Managers under the wide chart's director.")
+    parser.add_argument("--team-size", type=int, default=40, help="Employees per manager in the wide chart.")
+    parser.add_argument("--timesheets", type=int, default=500_000)
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per query; the median is reported.")
+    parser.add_argument("--seed", type=int, default=7)
+    arguments = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix="timesheet_org_")
+    try:
+        main(arguments, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
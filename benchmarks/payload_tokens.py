@@ -0,0 +1,81 @@
+"""
+Compares the token volume of full and compact tool results.
+
+For growing team sizes, seeds a manager's pending queue in a scratch database,
+calls `tool_manager_approval` and `tool_view_queries`, and measures the JSON
+payload the model would receive in each encoding (see `compact_tool_result`).
+Tokens are estimated offline, as the number of word and punctuation pieces in
+the JSON text, which tracks Gemini's tokenizer closely enough to compare the two
+encodings; bytes are reported as well.
+
+Usage (from the repository root):
+    python -m benchmarks.payload_tokens [--team-sizes 5,20,50,200] [--sheets-per-employee 3] [--detail-limit 10]
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from uuid import uuid4
+
+TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(payload: dict) -> int:
+    return len(TOKEN_PIECES.findall(json.dumps(payload, ensure_ascii=False)))
+
+
+def seed_team(agent, manager_id: str, team_size: int, sheets_per_employee: int) -> None:
+    conn = agent.get_conn()
+    now = time.strftime('%Y-%m-%dT%H:%M:%S')
+    with conn:
+        conn.execute("INSERT INTO user_profiles VALUES (?, ?, 'Manager', NULL)", (manager_id, f"Manager {manager_id}"))
+        for member in range(team_size):
+            employee_id = f"{manager_id}-employee-{member}"
+            conn.execute("INSERT INTO user_profiles VALUES (?, ?, 'Employee', ?)",
+                         (employee_id, f"Employee Number {member}", manager_id))
+            conn.executemany(
+                "INSERT INTO timesheets VALUES (?, ?, ?, ?, ?, ?, 'Pending', ?, NULL)",
+                [(str(uuid4()), employee_id, manager_id, f"2025-11-{day + 1:02d}", 7.5,
+                  "Implemented the reporting API endpoints and reviewed the related pull requests.", now)
+                 for day in range(sheets_per_employee)],
+            )
+
+
+def main(args) -> None:
+    import agent  # Imported late so it opens the scratch database.
+
+    logging.getLogger().setLevel(logging.WARNING)
+    agent.get_conn()
+    print(f"{'tool':<24}{'team':>6}{'sheets':>8}{'full tok':>10}{'compact tok':>13}{'saved':>8}{'full B':>9}{'compact B':>11}")
+    for team_size in args.team_sizes:
+        manager_id = f"bench-manager-{team_size}"
+        seed_team(agent, manager_id, team_size, args.sheets_per_employee)
+        employee_id = f"{manager_id}-employee-0"
+        calls = [
+            ("tool_manager_approval", agent.tool_manager_approval(manager_id, page_size=agent.MAX_PAGE_SIZE)),
+            ("tool_view_queries", agent.tool_view_queries(employee_id, page_size=args.sheets_per_employee)),
+        ]
+        for tool_name, full in calls:
+            compact = agent.compact_tool_result(tool_name, full, {}, detail_limit=args.detail_limit)
+            full_tokens, compact_tokens = estimate_tokens(full), estimate_tokens(compact)
+            rows = len(full.get('pending_sheets') or full.get('recent_submissions') or [])
+            print(f"{tool_name:<24}{team_size:>6}{rows:>8}{full_tokens:>10,}{compact_tokens:>13,}"
+                  f"{1 - compact_tokens / full_tokens:>8.0%}{len(json.dumps(full)):>9,}{len(json.dumps(compact)):>11,}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--team-sizes", type=lambda value: [int(size) for size in value.split(",")], default=[5, 20, 50, 200])
+    parser.add_argument("--sheets-per-employee", type=int, default=3)
+    parser.add_argument("--detail-limit", type=int, default=10, help="Sheets listed individually in the compact encoding.")
+    arguments = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix="timesheet_tokens_")
+    os.environ["TIMESHEET_DB_PATH"] = os.path.join(workdir, "tokens.db")
+    try:
+        main(arguments)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,92 @@
+"""
+Benchmarks the streaming payroll export on a production-scale dataset.
+
+Exports approved hours for the whole company over `--days` days ending at the
+dataset's last day, grouped by employee, by week and by day, to CSV and JSONL
+files. For each export it reports rows written, throughput and the peak
+Python memory, which stays flat however many rows are exported because rows
+are streamed from the cursor to the file. It then times `tool_team_hours_report`
+for a sample of managers.
+
+Without `--db`, a fresh dataset is generated with `benchmarks.synthetic_data`.
+
+Usage (from the repository root):
+    python -m benchmarks.report_export [--managers 2000] [--timesheets 2000000] [--days 365] [--db PATH]
+"""
+import argparse
+import datetime
+import logging
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import reporting
+
+
+def main(args, db_path: str, workdir: str) -> None:
+    build = not os.path.exists(db_path)
+    os.environ["TIMESHEET_DB_PATH"] = db_path
+    import agent  # Imported late so it opens the benchmark database.
+    from benchmarks.synthetic_data import build_dataset
+
+    logging.getLogger().setLevel(logging.WARNING)
+    conn = agent.get_conn()
+    if build:
+        print(f"Generating {args.managers:,} managers and {args.timesheets:,} timesheets into {db_path}...")
+        build_dataset(agent, args.managers, args.team_size, args.timesheets, args.seed)
+    last_day = conn.execute("SELECT MAX(date) FROM hours_daily").fetchone()[0]
+    end = datetime.date.fromisoformat(last_day)
+    start = (end - datetime.timedelta(days=args.days - 1)).isoformat()
+    source_rows = conn.execute("SELECT COUNT(*) FROM hours_daily WHERE status = 'Approved' AND date BETWEEN ? AND ?",
+                               (start, last_day)).fetchone()[0]
+    profiles = conn.execute("SELECT COUNT(*) FROM user_profiles").fetchone()[0]
+    print(f"Exporting {start} to {last_day}: {profiles:,} people, {source_rows:,} approved employee-days")
+
+    print(f"{'grouping':<10}{'format':<8}{'rows':>12}{'seconds':>9}{'rows/s':>11}{'MiB':>8}{'peak KiB':>10}")
+    for group_by in ("employee", "week", "day"):
+        for fmt in ("csv", "jsonl"):
+            path = os.path.join(workdir, f"export-{group_by}.{fmt}")
+            stats = reporting.export_report(conn, path, start, last_day, group_by=group_by)
+            # Peak memory in a second pass: tracemalloc slows every allocation.
+            tracemalloc.start()
+            reporting.export_report(conn, path, start, last_day, group_by=group_by)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{group_by:<10}{fmt:<8}{stats['rows']:>12,}{stats['seconds']:>9.2f}{stats['rows_per_second']:>11,}"
+                  f"{os.path.getsize(path) / 2**20:>8.1f}{peak / 1024:>10.1f}")
+            os.remove(path)
+
+    rng = random.Random(args.seed)
+    managers = [row[0] for row in conn.execute("SELECT id FROM user_profiles WHERE role = 'Manager' ORDER BY id")]
+    month_start = (end - datetime.timedelta(days=29)).isoformat()
+    for group_by in ("employee", "day"):
+        latencies = []
+        for manager in (rng.choice(managers) for _ in range(args.calls)):
+            started = time.perf_counter()
+            result = agent.tool_team_hours_report(manager, month_start, last_day, group_by)
+            latencies.append(time.perf_counter() - started)
+            assert result["status"] == "success", result
+        latencies.sort()
+        print(f"tool_team_hours_report (30 days, by {group_by}): p50 {statistics.median(latencies) * 1000:.2f} ms  "
+              f"p95 {latencies[int(0.95 * len(latencies))] * 1000:.2f} ms over {args.calls} managers")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", help="Reuse this database (generated on first use) so runs are comparable.")
+    parser.add_argument("--managers", type=int, default=2000)
+    parser.add_argument("--team-size", type=int, default=8)
+    parser.add_argument("--timesheets", type=int, default=2_000_000)
+    parser.add_argument("--days", type=int, default=365, help="Length of the exported range.")
+    parser.add_argument("--calls", type=int, default=200, help="Report tool calls per grouping.")
+    parser.add_argument("--seed", type=int, default=7)
+    arguments = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix="timesheet_export_")
+    try:
+        main(arguments, arguments.db or os.path.join(workdir, "export.db"), workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,92 @@
+"""
+Drives many concurrent sessions through the real Runner with the offline local model.
+
+Sets TIMESHEET_MODEL_BACKEND=local before importing the agent, so the Runner,
+session service, instruction provider and tool dispatch are the ones `agent.py`
+builds for production; only the model is replaced. Each session alternates
+employee and manager prompts that exercise every read tool plus submissions.
+Reports turns per second, turn latency percentiles, and how much of each turn
+was spent outside the model (our code plus ADK), both as wall time and as CPU.
+
+Usage (from the repository root):
+    python -m benchmarks.runner_throughput [--sessions 100] [--turns 5] [--latency-ms 0] [--stream]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+EMPLOYEE_PROMPTS = ("Show my dashboard", "Submit 8 hours for today", "How many hours this month?", "hello")
+MANAGER_PROMPTS = ("Any pending approvals?", "Review the pending timesheets", "Show my status summary")
+
+
+async def run_turn(agent, runner, run_config, user_id: str, session_id: str, text: str) -> float:
+    from google.genai import types
+
+    message = types.Content(role="user", parts=[types.Part(text=text)])
+    start = time.perf_counter()
+    async for _event in runner.run_async(user_id=user_id, session_id=session_id, new_message=message,
+                                         run_config=run_config):
+        pass
+    return time.perf_counter() - start
+
+
+async def run_session(agent, runner, run_config, profile: dict, index: int, turns: int) -> list:
+    session = await agent.get_session_service().create_session(
+        app_name=agent.APP_NAME, user_id=profile['id'], session_id=f"load-{index}",
+        state=agent.profile_state(profile),
+    )
+    prompts = MANAGER_PROMPTS if profile['role'] == 'Manager' else EMPLOYEE_PROMPTS
+    return [await run_turn(agent, runner, run_config, profile['id'], session.id, prompts[(index + turn) % len(prompts)])
+            for turn in range(turns)]
+
+
+async def main(args) -> None:
+    os.environ["TIMESHEET_MODEL_BACKEND"] = "local"
+    os.environ["TIMESHEET_LOCAL_MODEL_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["TIMESHEET_LOCAL_MODEL_CHUNK_DELAY_MS"] = str(args.chunk_delay_ms)
+    import agent  # Imported late so it picks up the backend and database settings.
+    from google.adk.agents.run_config import RunConfig, StreamingMode
+
+    logging.getLogger().setLevel(logging.WARNING)
+    runner = agent.get_runner()
+    model = agent.get_agent().model
+    run_config = RunConfig(streaming_mode=StreamingMode.SSE if args.stream else StreamingMode.NONE)
+    profiles = [agent.get_user_profile(agent.EMPLOYEE_ID), agent.get_user_profile(agent.MANAGER_ID)]
+
+    cpu_start, start = time.process_time(), time.perf_counter()
+    per_session = await asyncio.gather(*(
+        run_session(agent, runner, run_config, profiles[i % 2], i, args.turns) for i in range(args.sessions)))
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+
+    turns = [latency for session in per_session for latency in session]
+    ordered = sorted(turns)
+    outside = (sum(turns) - model.busy_seconds) / len(turns)
+    print(f"{len(turns):,} turns ({args.sessions} sessions x {args.turns}) in {elapsed:.2f}s: "
+          f"{len(turns) / elapsed:,.1f} turns/s, {model.calls:,} model calls")
+    print(f"turn latency p50 {statistics.median(ordered) * 1000:.1f} ms  p95 {ordered[int(0.95 * len(ordered))] * 1000:.1f} ms  "
+          f"p99 {ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))] * 1000:.1f} ms")
+    print(f"per turn: {model.busy_seconds / len(turns) * 1000:.2f} ms in the model, "
+          f"{outside * 1000:.2f} ms outside it (wall), {cpu / len(turns) * 1000:.2f} ms CPU")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=5, help="Turns per session.")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Simulated model latency per call.")
+    parser.add_argument("--chunk-delay-ms", type=float, default=0, help="Simulated delay between streamed chunks.")
+    parser.add_argument("--stream", action="store_true", help="Run with SSE streaming, so replies arrive in chunks.")
+    parser.add_argument("--db", help="Database to use; defaults to a fresh temporary one.")
+    arguments = parser.parse_args()
+    workdir = None if arguments.db else tempfile.mkdtemp(prefix="timesheet_runner_")
+    os.environ["TIMESHEET_DB_PATH"] = arguments.db or os.path.join(workdir, "runner.db")
+    try:
+        asyncio.run(main(arguments))
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
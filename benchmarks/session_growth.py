@@ -0,0 +1,76 @@
+"""
+Shows how prompt size and session memory grow over a long conversation.
+
+Runs the same long conversation through the real Runner with the offline local
+model, once on `InMemorySessionService` and once on `SqliteSessionService`.
+Every `--every` turns it prints the prompt tokens the model received (from the
+local model's usage metadata) and the size of the session the service holds
+(events and state, serialised as JSON). With the in-memory service both grow
+with every turn; with the SQLite service they level off once compaction starts.
+
+Usage (from the repository root):
+    python -m benchmarks.session_growth [--turns 200] [--every 20] [--history-limit 40]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+
+PROMPTS = ("Show my dashboard", "Submit 8 hours for today", "How many hours this month?", "hello")
+
+
+async def run_conversation(agent, session_service, turns: int, every: int) -> list:
+    """Returns (turn, prompt tokens, session bytes) samples for one long conversation."""
+    from google.adk.runners import Runner
+    from google.genai import types
+
+    runner = Runner(agent=agent.get_agent(), app_name=agent.APP_NAME, session_service=session_service)
+    profile = agent.get_user_profile(agent.EMPLOYEE_ID)
+    await session_service.create_session(app_name=agent.APP_NAME, user_id=profile['id'], session_id="growth",
+                                         state=agent.profile_state(profile))
+    samples = []
+    for turn in range(1, turns + 1):
+        message = types.Content(role="user", parts=[types.Part(text=PROMPTS[turn % len(PROMPTS)])])
+        prompt_tokens = 0
+        async for event in runner.run_async(user_id=profile['id'], session_id="growth", new_message=message):
+            if event.usage_metadata and event.usage_metadata.prompt_token_count:
+                prompt_tokens = max(prompt_tokens, event.usage_metadata.prompt_token_count)
+        if turn % every == 0:
+            session = await session_service.get_session(app_name=agent.APP_NAME, user_id=profile['id'],
+                                                        session_id="growth")
+            samples.append((turn, prompt_tokens, len(session.model_dump_json()), len(session.events)))
+    return samples
+
+
+async def main(args) -> None:
+    os.environ["TIMESHEET_MODEL_BACKEND"] = "local"
+    os.environ["TIMESHEET_SESSION_HISTORY_LIMIT"] = str(args.history_limit)
+    os.environ["TIMESHEET_FAST_PATH"] = "0"
+    import agent  # Imported late so it picks up the backend and database settings.
+    from google.adk.sessions import InMemorySessionService
+
+    logging.getLogger().setLevel(logging.WARNING)
+    results = {
+        "memory": await run_conversation(agent, InMemorySessionService(), args.turns, args.every),
+        "sqlite": await run_conversation(agent, agent.build_session_service(), args.turns, args.every),
+    }
+    print(f"{'turn':>6}{'memory tok':>12}{'memory KiB':>12}{'events':>8}{'sqlite tok':>12}{'sqlite KiB':>12}{'events':>8}")
+    for memory, sqlite in zip(results["memory"], results["sqlite"]):
+        print(f"{memory[0]:>6}{memory[1]:>12,}{memory[2] / 1024:>12.1f}{memory[3]:>8}"
+              f"{sqlite[1]:>12,}{sqlite[2] / 1024:>12.1f}{sqlite[3]:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--every", type=int, default=20, help="Print a sample every this many turns.")
+    parser.add_argument("--history-limit", type=int, default=40, help="Events kept per session by the SQLite store.")
+    arguments = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix="timesheet_sessions_")
+    os.environ["TIMESHEET_DB_PATH"] = os.path.join(workdir, "sessions.db")
+    try:
+        asyncio.run(main(arguments))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,143 @@
+"""
+Builds a production-scale synthetic dataset.
+
+The org chart is a tree expressed through `user_profiles.reportsTo`: a layer of
+directors, managers reporting to directors, and employees reporting to managers
+(team sizes vary around the requested average). Every timesheet is routed to
+the submitter's `reportsTo`, as the agent does, so managers submit to their
+directors too. Activity per person is heavy-tailed, and the status mix is
+skewed: old entries are almost all decided, while recent weeks hold most of the
+pending work. The same `--seed` always produces the same rows.
+
+Rows are written as JSONL and loaded with `agent.bulk_import`.
+
+Usage (from the repository root):
+    python -m benchmarks.synthetic_data --db /tmp/timesheet_synth.db [--managers 2000] [--team-size 8] [--timesheets 2000000]
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Dict, Iterator, List
+
+MANAGERS_PER_DIRECTOR = 25
+HISTORY_DAYS = 730  # Two years of timesheets, ending at --end-date
+MEAN_AGE_DAYS = 120  # Entry ages are exponential with this mean, capped at the history length
+RECENT_DAYS = 14  # Entries younger than this are mostly still pending
+# (Pending, Approved, Rejected) weights for recent and older entries.
+RECENT_STATUS_WEIGHTS = (0.70, 0.27, 0.03)
+OLDER_STATUS_WEIGHTS = (0.01, 0.95, 0.04)
+STATUSES = ('Pending', 'Approved', 'Rejected')
+TASKS = (
+    "Implemented API endpoint changes.", "Code review and pairing.", "Sprint planning and estimation.",
+    "Fixed production incident follow-ups.", "Wrote integration tests.", "Customer support escalation.",
+    "Updated deployment pipeline.", "Design document review.", "Database migration work.",
+    "Onboarding and documentation.",
+)
+
+
+def generate_profiles(managers: int, team_size: int, rng: random.Random) -> List[Dict[str, str]]:
+    """Returns directors, then managers, then employees, each with a `reportsTo` one level up."""
+    profiles = []
+    directors = max(1, -(-managers // MANAGERS_PER_DIRECTOR))
+    for d in range(directors):
+        profiles.append({"id": f"director-{d}", "name": f"Director {d}", "role": "Manager", "reportsTo": None})
+    employee = 0
+    for m in range(managers):
+        manager_id = f"manager-{m}"
+        profiles.append({"id": manager_id, "name": f"Manager {m}", "role": "Manager",
+                         "reportsTo": f"director-{m % directors}"})
+        for _ in range(max(1, round(rng.gauss(team_size, team_size / 3)))):
+            profiles.append({"id": f"employee-{employee}", "name": f"Employee {employee}", "role": "Employee",
+                             "reportsTo": manager_id})
+            employee += 1
+    return profiles
+
+
+def generate_timesheets(profiles: List[Dict[str, str]], count: int, end_date: datetime.date,
+                        rng: random.Random, history_days: int = HISTORY_DAYS,
+                        mean_age_days: float = MEAN_AGE_DAYS) -> Iterator[Dict[str, object]]:
+    """Yields `count` timesheets from everyone with a manager, heavy-tailed per submitter."""
+    submitters = [p for p in profiles if p["reportsTo"]]
+    # Pareto weights: a minority of people log most of the entries.
+    weights = [rng.paretovariate(1.5) for _ in submitters]
+    chosen = rng.choices(submitters, weights=weights, k=count)
+    for index, profile in enumerate(chosen):
+        age = min(int(rng.expovariate(1 / mean_age_days)), history_days - 1)
+        day = end_date - datetime.timedelta(days=age)
+        status_weights = RECENT_STATUS_WEIGHTS if age < RECENT_DAYS else OLDER_STATUS_WEIGHTS
+        status = rng.choices(STATUSES, weights=status_weights)[0]
+        submitted = f"{day.isoformat()}T{rng.randint(15, 19):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+        decided = None
+        if status != 'Pending':
+            decided = f"{(day + datetime.timedelta(days=rng.randint(1, 4))).isoformat()}T10:00:00"
+        yield {
+            "id": f"synth-{index}",
+            "employeeId": profile["id"],
+            "managerId": profile["reportsTo"],
+            "date": day.isoformat(),
+            "hours": round(min(12.0, max(0.5, rng.gauss(7.5, 1.5))), 1),
+            "task": rng.choice(TASKS),
+            "status": status,
+            "submittedAt": submitted,
+            "approvedAt": decided,
+        }
+
+
+def write_jsonl(path: str, rows) -> None:
+    with open(path, "w") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+
+
+def build_dataset(agent, managers: int, team_size: int, timesheets: int, seed: int = 7,
+                  end_date: datetime.date = datetime.date(2025, 11, 28), history_days: int = HISTORY_DAYS,
+                  mean_age_days: float = MEAN_AGE_DAYS) -> Dict[str, int]:
+    """Generates the dataset and loads it into the agent's database. Returns row counts."""
+    rng = random.Random(seed)
+    profiles = generate_profiles(managers, team_size, rng)
+    workdir = tempfile.mkdtemp(prefix="timesheet_synth_")
+    profile_path = os.path.join(workdir, "profiles.jsonl")
+    timesheet_path = os.path.join(workdir, "timesheets.jsonl")
+    try:
+        write_jsonl(profile_path, profiles)
+        write_jsonl(timesheet_path, generate_timesheets(profiles, timesheets, end_date, rng, history_days, mean_age_days))
+        agent.bulk_import(profile_path, table="user_profiles", on_conflict="ignore")
+        agent.bulk_import(timesheet_path, on_conflict="ignore")
+    finally:
+        for path in (profile_path, timesheet_path):
+            if os.path.exists(path):
+                os.remove(path)
+        os.rmdir(workdir)
+    return {
+        "directors": sum(1 for p in profiles if p["id"].startswith("director-")),
+        "managers": managers,
+        "employees": sum(1 for p in profiles if p["role"] == "Employee"),
+        "timesheets": timesheets,
+    }
+
+
+def main(args) -> None:
+    os.environ["TIMESHEET_DB_PATH"] = args.db
+    import agent  # Imported late so it opens the target database.
+
+    agent.get_conn()
+    start = time.perf_counter()
+    counts = build_dataset(agent, args.managers, args.team_size, args.timesheets, args.seed)
+    print(f"Built {counts['directors']:,} directors, {counts['managers']:,} managers, {counts['employees']:,} employees "
+          f"and {counts['timesheets']:,} timesheets in {time.perf_counter() - start:.1f}s into {args.db}")
+    rows = agent.get_conn().execute("SELECT status, COUNT(*) FROM timesheets GROUP BY status ORDER BY status").fetchall()
+    print("Status mix: " + ", ".join(f"{status} {n:,}" for status, n in rows))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", required=True, help="Database file to create or extend.")
+    parser.add_argument("--managers", type=int, default=2000)
+    parser.add_argument("--team-size", type=int, default=8, help="Average number of direct reports per manager.")
+    parser.add_argument("--timesheets", type=int, default=2_000_000)
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
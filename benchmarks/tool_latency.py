@@ -0,0 +1,167 @@
+"""
+Measures tool-level latency on a production-scale dataset.
+
+Calls `get_timesheets`, `tool_view_queries`, `tool_manager_approval` and
+`tool_update_timesheet_status` directly (no agent, no model) for a fixed,
+seeded sample of users, and reports p50/p95/p99 latency, SQL statements per
+call and peak Python memory per call. The result cache is cleared before every
+call so each one reaches the database; pass `--warm-cache` to measure cache hits
+instead.
+
+Without `--db`, a fresh dataset is generated with `benchmarks.synthetic_data`.
+With `--db`, an existing database is reused, so repeated runs on different
+commits measure the same rows. Pass `--record FILE` to append the results as a
+JSON line tagged with the current git commit.
+
+Usage (from the repository root):
+    python -m benchmarks.tool_latency [--managers 2000] [--timesheets 2000000] [--db PATH] [--calls 500] [--record benchmarks/tool_latency.jsonl]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.import_time import git_commit
+
+
+MEMORY_CALLS = 50  # Calls in the (slower) tracemalloc pass
+
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure(agent, name: str, calls: list, warm_cache: bool, memory_calls: list = None) -> dict:
+    """
+    Runs each zero-argument callable in `calls` and summarises latency, statements and memory.
+
+    Peak memory is measured on `memory_calls` (default: the first MEMORY_CALLS of
+    `calls`); tools that change the data need fresh calls for that pass.
+    """
+    conn = agent.get_conn()
+    statements = 0
+
+    def count_statement(_sql):
+        nonlocal statements
+        statements += 1
+
+    latencies = []
+    conn.set_trace_callback(count_statement)
+    try:
+        for call in calls:
+            if not warm_cache:
+                agent.RESULT_CACHE.invalidate()
+            start = time.perf_counter()
+            call()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        conn.set_trace_callback(None)
+
+    # Peak memory is measured in a separate, shorter pass: tracemalloc slows every allocation.
+    peaks = []
+    for call in memory_calls if memory_calls is not None else calls[:MEMORY_CALLS]:
+        if not warm_cache:
+            agent.RESULT_CACHE.invalidate()
+        tracemalloc.start()
+        call()
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    result = {
+        "tool": name,
+        "calls": len(calls),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "statements_per_call": round(statements / len(calls), 2),
+        "peak_kib": round(max(peaks) / 1024, 1),
+    }
+    print(f"{name:<30} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms  "
+          f"{result['statements_per_call']:6.2f} stmts/call  peak {result['peak_kib']:8.1f} KiB")
+    return result
+
+
+def main(args, db_path: str) -> None:
+    build = not os.path.exists(db_path)
+    os.environ["TIMESHEET_DB_PATH"] = db_path
+    import agent  # Imported late so it opens the benchmark database.
+    from benchmarks.synthetic_data import build_dataset
+
+    logging.getLogger().setLevel(logging.WARNING)  # Tool calls log every invocation at INFO.
+    conn = agent.get_conn()
+    if build:
+        print(f"Generating {args.managers:,} managers and {args.timesheets:,} timesheets into {db_path}...")
+        build_dataset(agent, args.managers, args.team_size, args.timesheets, args.seed)
+    dataset = {
+        "profiles": conn.execute("SELECT COUNT(*) FROM user_profiles").fetchone()[0],
+        "timesheets": conn.execute("SELECT COUNT(*) FROM timesheets").fetchone()[0],
+    }
+    print(f"Dataset: {dataset['profiles']:,} profiles, {dataset['timesheets']:,} timesheets")
+
+    rng = random.Random(args.seed)
+    employees = [row[0] for row in conn.execute("SELECT id FROM user_profiles WHERE role = 'Employee' ORDER BY id")]
+    managers = [row[0] for row in conn.execute("SELECT id FROM user_profiles WHERE role = 'Manager' ORDER BY id")]
+    sample_employees = [rng.choice(employees) for _ in range(args.calls)]
+    sample_managers = [rng.choice(managers) for _ in range(args.calls)]
+    # One distinct pending sheet per update call. They are set back to Pending afterwards,
+    # so a reused database offers the same sheets to the next run.
+    pending = conn.execute(
+        "SELECT t.managerId, t.id FROM timesheets t JOIN user_profiles p ON p.id = t.managerId "
+        "WHERE t.status = 'Pending' AND p.role = 'Manager' ORDER BY t.submittedAt DESC, t.id LIMIT ?",
+        ((args.calls + MEMORY_CALLS) * 4,)).fetchall()
+    updates = rng.sample(pending, min(args.calls + MEMORY_CALLS, len(pending)))
+
+    def approve(manager, sheet):
+        return lambda: agent.tool_update_timesheet_status(manager, sheet, 'Approved')
+
+    results = [
+        measure(agent, "get_timesheets", [
+            lambda user=user: agent.get_timesheets(user_id=user, limit=agent.DEFAULT_PAGE_SIZE)
+            for user in sample_employees], args.warm_cache),
+        measure(agent, "tool_view_queries", [
+            lambda user=user: agent.tool_view_queries(user) for user in sample_employees], args.warm_cache),
+        measure(agent, "tool_manager_approval", [
+            lambda manager=manager: agent.tool_manager_approval(manager) for manager in sample_managers], args.warm_cache),
+        measure(agent, "tool_update_timesheet_status",
+                [approve(*update) for update in updates[MEMORY_CALLS:]], args.warm_cache,
+                memory_calls=[approve(*update) for update in updates[:MEMORY_CALLS]]),
+    ]
+    with conn:
+        conn.executemany("UPDATE timesheets SET status = 'Pending', approvedAt = NULL WHERE id = ?",
+                         [(sheet,) for _, sheet in updates])
+
+    if args.record:
+        record = {"commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "dataset": dataset,
+                  "seed": args.seed, "warm_cache": args.warm_cache, "results": results}
+        with open(args.record, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"Recorded to {args.record}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", help="Reuse this database (generated on first use) so runs are comparable.")
+    parser.add_argument("--managers", type=int, default=2000)
+    parser.add_argument("--team-size", type=int, default=8)
+    parser.add_argument("--timesheets", type=int, default=2_000_000)
+    parser.add_argument("--calls", type=int, default=500, help="Calls per tool.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--warm-cache", action="store_true", help="Keep the result cache between calls.")
+    parser.add_argument("--record", help="Append the results as a JSON line to this file.")
+    arguments = parser.parse_args()
+    if arguments.db:
+        main(arguments, arguments.db)
+    else:
+        workdir = tempfile.mkdtemp(prefix="timesheet_latency_")
+        try:
+            main(arguments, os.path.join(workdir, "latency.db"))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,163 @@
+"""
+Approved-hours reports for the timesheet agent.
+
+Approved hours per employee over a date range, from the hours_daily aggregate
+table. One SQL statement streams (employee, day) rows in employee order;
+generators roll them up by employee, day or week (starting Monday, clipped to
+the range) and write them as CSV or JSONL. So a company-wide export holds one
+employee's days at a time, never the whole result.
+
+This module only needs the standard library and a connection to the agent's
+database: agent.py passes its connection in, and uses it for
+`tool_team_hours_report` and the `export` command.
+"""
+import csv
+import functools
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+ORG_SCOPES = ("direct", "org")  # Direct reports only, or everyone below the manager
+REPORT_GROUPINGS = ("employee", "day", "week")
+REPORT_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "employee": ("employee_id", "employee_name", "hours", "entries", "days"),
+    "day": ("employee_id", "employee_name", "date", "hours", "entries"),
+    "week": ("employee_id", "employee_name", "week_start", "hours", "entries"),
+}
+REPORT_MAX_DAYS = 400  # Longest range the report tool accepts (exports are unlimited)
+REPORT_TOOL_ROW_LIMIT = 200  # Rows the report tool returns; totals still cover every row
+EXPORT_PROGRESS_ROWS = 10_000  # Rows between export progress callbacks
+
+def build_report_query(manager_id: Optional[str] = None, scope: str = "direct") -> str:
+    """
+    Returns the statement streaming approved hours per (employee, day), ordered by employee.
+
+    Every employee is included, with a single row of NULLs if they have no
+    approved hours in the range. With `manager_id`, only that manager's direct
+    reports, or with scope 'org' everyone below them in the reporting
+    hierarchy. Parameters: start date, end date[, manager ID].
+    """
+    if scope not in ORG_SCOPES:
+        raise ValueError(f"Invalid scope '{scope}'. Must be one of {', '.join(ORG_SCOPES)}.")
+    if manager_id is not None and scope == "org":
+        # The closure's primary key yields the subtree in employee ID order.
+        return """
+            SELECT p.id, p.name, h.date, h.hours, h.entries
+            FROM org_closure c
+            JOIN user_profiles p ON p.id = c.descendantId
+            LEFT JOIN hours_daily h
+                ON h.employeeId = p.id AND h.date >= ? AND h.date <= ? AND h.status = 'Approved'
+            WHERE c.ancestorId = ? AND c.depth > 0
+            ORDER BY c.descendantId
+        """
+    query = """
+        SELECT p.id, p.name, h.date, h.hours, h.entries
+        FROM user_profiles p
+        LEFT JOIN hours_daily h
+            ON h.employeeId = p.id AND h.date >= ? AND h.date <= ? AND h.status = 'Approved'
+    """
+    if manager_id is not None:
+        query += " WHERE p.reportsTo = ?"
+    # Days are sorted per employee by rollup_report; sorting them here would need a temporary B-tree.
+    return query + " ORDER BY p.id"
+
+def report_day_rows(conn: sqlite3.Connection, start_date: str, end_date: str, manager_id: Optional[str] = None,
+                    scope: str = "direct") -> Iterator[tuple]:
+    """Yields (employee ID, name, date, hours, entries) rows straight from the cursor."""
+    params = [start_date, end_date] + ([manager_id] if manager_id is not None else [])
+    yield from conn.execute(build_report_query(manager_id, scope), params)
+
+@functools.lru_cache(maxsize=1024)
+def week_start(day: str) -> str:
+    """Returns the Monday of the week containing `day` (YYYY-MM-DD)."""
+    date = datetime.strptime(day, '%Y-%m-%d')
+    return (date - timedelta(days=date.weekday())).strftime('%Y-%m-%d')
+
+def rollup_report(rows: Iterable[tuple], group_by: str = "employee") -> Iterator[Dict[str, Any]]:
+    """Turns report_day_rows() output into one dict per employee, per employee-day or per employee-week."""
+    if group_by not in REPORT_GROUPINGS:
+        raise ValueError(f"Invalid grouping '{group_by}'. Must be one of {', '.join(REPORT_GROUPINGS)}.")
+    for (employee_id, name), employee_rows in itertools.groupby(rows, key=lambda row: (row[0], row[1])):
+        # One employee's days at a time: at most one row per day of the range.
+        days = sorted((row for row in employee_rows if row[2] is not None), key=lambda row: row[2])
+        if group_by == "employee":
+            yield {"employee_id": employee_id, "employee_name": name, "hours": round(sum(row[3] for row in days), 2),
+                   "entries": sum(row[4] for row in days), "days": len(days)}
+        elif group_by == "day":
+            for row in days:
+                yield {"employee_id": employee_id, "employee_name": name, "date": row[2],
+                       "hours": round(row[3], 2), "entries": row[4]}
+        else:
+            for week, week_rows in itertools.groupby(days, key=lambda row: week_start(row[2])):
+                week_rows = list(week_rows)
+                yield {"employee_id": employee_id, "employee_name": name, "week_start": week,
+                       "hours": round(sum(row[3] for row in week_rows), 2), "entries": sum(row[4] for row in week_rows)}
+
+def team_hours_report(conn: sqlite3.Connection, start_date: str, end_date: str, group_by: str = "employee",
+                      manager_id: Optional[str] = None, scope: str = "direct") -> Iterator[Dict[str, Any]]:
+    """
+    Streams approved hours between two dates (inclusive) for a manager's team, or everyone without `manager_id`.
+
+    The team is the manager's direct reports, or everyone below them with scope 'org'.
+    """
+    return rollup_report(report_day_rows(conn, start_date, end_date, manager_id, scope), group_by)
+
+def validate_report_range(start_date: Any, end_date: Any, max_days: Optional[int] = None) -> Optional[str]:
+    """Returns an error message if the dates are not an ordered YYYY-MM-DD range of at most `max_days` days."""
+    try:
+        start = datetime.strptime(str(start_date), '%Y-%m-%d')
+        end = datetime.strptime(str(end_date), '%Y-%m-%d')
+    except ValueError:
+        return "Dates must use the YYYY-MM-DD format."
+    if end < start:
+        return "The end date must not be before the start date."
+    if max_days is not None and (end - start).days + 1 > max_days:
+        return f"The range can span at most {max_days} days."
+    return None
+
+def export_report(conn: sqlite3.Connection, output: str, start_date: str, end_date: str, group_by: str = "employee",
+                  manager_id: Optional[str] = None, fmt: Optional[str] = None,
+                  progress: Optional[Callable[[int, float], None]] = None, scope: str = "direct") -> Dict[str, Any]:
+    """
+    Streams a report to a CSV or JSONL file ('-' for stdout).
+
+    The format is taken from the file extension unless `fmt` is given. `progress`
+    is called with (rows written, seconds elapsed) every EXPORT_PROGRESS_ROWS rows.
+    `scope` applies with `manager_id`, as for team_hours_report.
+
+    Returns:
+        {"rows": int, "seconds": float, "rows_per_second": int}
+    """
+    error = validate_report_range(start_date, end_date)
+    if error:
+        raise ValueError(error)
+    fmt = fmt or os.path.splitext(output)[1].lstrip('.').lower() or "csv"
+    if fmt not in ("csv", "jsonl"):
+        raise ValueError(f"Unsupported export format '{fmt}'. Use .csv or .jsonl.")
+    if scope not in ORG_SCOPES:
+        raise ValueError(f"Invalid scope '{scope}'. Must be one of {', '.join(ORG_SCOPES)}.")
+    rows = team_hours_report(conn, start_date, end_date, group_by, manager_id, scope)
+    start, written = time.perf_counter(), 0
+    out = sys.stdout if output == "-" else open(output, "w", newline="" if fmt == "csv" else None)
+    try:
+        if fmt == "csv":
+            writer = csv.DictWriter(out, fieldnames=REPORT_COLUMNS[group_by])
+            writer.writeheader()
+            write = writer.writerow
+        else:
+            write = lambda row: out.write(json.dumps(row) + "\n")
+        for row in rows:
+            write(row)
+            written += 1
+            if progress and written % EXPORT_PROGRESS_ROWS == 0:
+                progress(written, time.perf_counter() - start)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    seconds = time.perf_counter() - start
+    return {"rows": written, "seconds": round(seconds, 3), "rows_per_second": int(written / seconds) if seconds else written}
@@ -0,0 +1,17 @@
+"""
+Points the agent at a fresh database in a temporary directory before any test imports it.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_WORKDIR = tempfile.mkdtemp(prefix="timesheet_tests_")
+os.environ["TIMESHEET_DB_PATH"] = os.path.join(_WORKDIR, "tests.db")
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_WORKDIR, ignore_errors=True)
@@ -0,0 +1,14 @@
+"""
+Interleaved sessions on one Runner must each see only their own user context.
+"""
+import asyncio
+import os
+
+import agent
+from benchmarks.concurrent_sessions import run_sessions
+
+
+def test_interleaved_sessions_do_not_leak_user_context():
+    assert agent.DB_NAME == os.environ["TIMESHEET_DB_PATH"]
+    _, leaks = asyncio.run(run_sessions(agent, 100))
+    assert leaks == []
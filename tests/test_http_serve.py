@@ -0,0 +1,18 @@
+"""
+The HTTP front-end trusts X-Timesheet-User, so it must not bind a reachable address by accident.
+"""
+import pytest
+
+import agent
+
+
+@pytest.mark.parametrize("host", ["127.0.0.1", "127.0.0.2", "::1", "localhost"])
+def test_loopback_hosts(host):
+    assert agent.is_loopback_host(host)
+
+
+@pytest.mark.parametrize("host", ["0.0.0.0", "::", "10.0.0.5", "portal.example.com"])
+def test_serve_refuses_a_non_loopback_host_without_opt_in(host):
+    assert not agent.is_loopback_host(host)
+    with pytest.raises(ValueError, match="--allow-remote"):
+        agent.serve(host, allow_remote=False)
@@ -0,0 +1,48 @@
+"""
+Logging counters stay exact under concurrent loggers, and stop_logging undoes configure_logging's global settings.
+"""
+import io
+import logging
+import threading
+
+import agent
+
+THREADS = 8
+RECORDS_PER_THREAD = 2_000
+
+
+def test_every_record_is_counted_once_across_threads():
+    stream = io.StringIO()
+    before = agent.logging_stats()
+    agent.configure_logging(level="INFO", sample="timesheet.tools=0.25", fmt="json", stream=stream)
+    try:
+        def log_records():
+            for index in range(RECORDS_PER_THREAD):
+                agent.TOOL_LOG.info("record %s", index)
+
+        threads = [threading.Thread(target=log_records) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        agent.stop_logging()
+        logging.getLogger().handlers.clear()
+    after = agent.logging_stats()
+
+    counted = {key: after[key] - before[key] for key in ("written", "dropped", "sampled_out")}
+    assert sum(counted.values()) == THREADS * RECORDS_PER_THREAD
+    assert counted["written"] + counted["dropped"] == THREADS * RECORDS_PER_THREAD // 4
+    assert counted["written"] == stream.getvalue().count("\n")
+
+
+def test_stop_logging_restores_record_collection():
+    settings = ("_srcfile", "logThreads", "logProcesses", "logMultiprocessing")
+    original = {name: getattr(logging, name) for name in settings}
+    agent.configure_logging(stream=io.StringIO())
+    try:
+        assert logging._srcfile is None and not logging.logThreads
+    finally:
+        agent.stop_logging()
+        logging.getLogger().handlers.clear()
+    assert {name: getattr(logging, name) for name in settings} == original
@@ -0,0 +1,55 @@
+"""
+Keyset paging must reach every matching sheet, including imported ones without a submission time.
+"""
+import json
+import sqlite3
+
+import pytest
+
+import agent
+
+
+def import_pending_sheets(tmp_path, count: int) -> None:
+    """Imports `count` pending sheets for the demo employee, half of them without submittedAt."""
+    path = tmp_path / "sheets.jsonl"
+    with open(path, "w") as f:
+        for index in range(count):
+            sheet = {"id": f"paging-{tmp_path.name}-{index}", "employeeId": agent.EMPLOYEE_ID, "managerId": agent.MANAGER_ID,
+                     "date": f"2025-12-{index % 28 + 1:02d}", "hours": 8, "status": "Pending"}
+            if index % 2:
+                sheet["submittedAt"] = f"{sheet['date']}T17:00:00Z"
+            f.write(json.dumps(sheet) + "\n")
+    agent.bulk_import(str(path))
+
+
+@pytest.mark.parametrize("scope", ["direct", "org"])
+def test_walking_every_page_sees_every_pending_sheet(tmp_path, scope):
+    import_pending_sheets(tmp_path, 25)
+    seen = []
+    page_token = None
+    while True:
+        result = agent.tool_manager_approval(agent.MANAGER_ID, page_size=4, page_token=page_token, scope=scope)
+        assert result["status"] == "success", result
+        seen.extend(sheet["id"] for sheet in result["pending_sheets"])
+        page_token = result["next_page_token"]
+        if not page_token:
+            break
+    assert len(seen) == len(set(seen)) == result["total_pending"]
+
+
+def test_migration_gives_sheets_without_submitted_at_their_work_date(tmp_path, monkeypatch):
+    conn = sqlite3.connect(tmp_path / "upgrade.db", isolation_level=None)
+    monkeypatch.setattr(agent, "SCHEMA_MIGRATIONS", agent.SCHEMA_MIGRATIONS[:8])
+    agent.migrate_db(conn)
+    conn.execute("INSERT INTO timesheets (id, employeeId, date, hours, status) VALUES ('old', 'e', '2025-01-02', 8, 'Pending')")
+    monkeypatch.undo()
+
+    assert agent.migrate_db(conn) == len(agent.SCHEMA_MIGRATIONS)
+    assert conn.execute("SELECT submittedAt FROM all_timesheets WHERE id = 'old'").fetchone() == ('2025-01-02',)
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO timesheets (id, employeeId, date, hours, status) VALUES ('new', 'e', '2025-01-03', 8, 'Pending')")
+
+
+def test_page_token_with_a_null_position_is_rejected():
+    with pytest.raises(ValueError):
+        agent.decode_page_token(agent.encode_page_token(None, "ts-1"))